@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "connectly_project.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup; serves the realtime event stream next to the Django app
+from posts import realtime  # noqa: E402
+
+application = realtime.route(django_application)
+
+# Queue a warm-up of active users' feeds for this fresh process (WARM_FEEDS_ON_STARTUP)
+from posts.warming import warm_on_startup  # noqa: E402
+
+warm_on_startup()
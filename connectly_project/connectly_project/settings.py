@@ -73,6 +73,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'posts.middleware.DisableCSRFMiddleware',  # Add this at the top
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.CompressionMiddleware',  # Before anything that reads or changes the body
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -146,10 +147,20 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 PASSWORD_HASHERS = [
-    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'users.hashers.TunedArgon2PasswordHasher',
     'django.contrib.auth.hashers.PBKDF2PasswordHasher',
 ]
 
+# Argon2 cost parameters - run `manage.py calibrate_hasher` to pick values for this host
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 102400))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 8))
+
+# Login hashing runs in a bounded process pool (0 = hash on the request thread)
+PASSWORD_HASH_POOL_SIZE = int(os.getenv('PASSWORD_HASH_POOL_SIZE', 2))
+PASSWORD_HASH_MAX_PENDING = 8     # Logins allowed to wait for a pool slot
+PASSWORD_HASH_QUEUE_TIMEOUT = 2   # Seconds to wait before answering 503
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -180,7 +191,7 @@ CSRF_COOKIE_SECURE = False
 # Adjust REST_FRAMEWORK settings to allow browsing
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',     # JWT auth
+        'users.authentication.StatelessRoleJWTAuthentication',           # JWT auth (role claims, cached user lookup)
         'rest_framework.authentication.BasicAuthentication',             # Add Basic auth
         'rest_framework.authentication.SessionAuthentication',           # Session auth
     ),
@@ -191,11 +202,16 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
     
     # Add throttling settings
-    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'posts.throttling.AnonTokenBucketThrottle',
+        'posts.throttling.UserTokenBucketThrottle',
+    ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '20/minute',  # Anonymous users
         'user': '40/minute',  # Authenticated users
         'auth': '5/minute',   # Authentication attempts
+        'bulk_like': '10/minute',    # Bulk like operations
+        'bulk_follow': '10/minute',  # Bulk follow operations
     },
 }
 
@@ -220,8 +236,8 @@ SWAGGER_SETTINGS = {
 
 # Authentication Backends
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
-    'allauth.account.auth_backends.AuthenticationBackend',
+    'users.backends.PooledModelBackend',
+    'users.backends.PooledAuthenticationBackend',
 ]
 
 AUTH_USER_MODEL = 'users.CustomUser'
@@ -284,6 +300,59 @@ CACHES = {
 # Change the session engine to use the database instead of cache
 SESSION_ENGINE = "django.contrib.sessions.backends.db"
 
+# Seconds an authenticated user stays in the in-process auth cache
+AUTH_USER_CACHE_TTL = 30
+
+# Cache values (posts.codec) are zlib-compressed from this many bytes and not stored above the limit
+CACHE_COMPRESS_MIN_SIZE = 1024
+CACHE_MAX_ENTRY_SIZE = 1024 * 1024
+
+# Most-read cache keys tracked per process for the cache metrics (posts.cache_metrics)
+CACHE_HOT_KEYS = 100
+
+# Circuit breaker around the cache (posts.circuit): a call fails if it errors or takes longer than SLOW_MS;
+# the cache is skipped for COOLDOWN seconds once ERROR_RATE of recent calls failed
+CACHE_BREAKER_ERROR_RATE = 0.5
+CACHE_BREAKER_SLOW_MS = 250
+CACHE_BREAKER_COOLDOWN = 10
+
+# Seconds a serialized post/user stays in the write-through object cache
+OBJECT_CACHE_TTL = 900
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+
+# Pub/sub used by the realtime event stream (posts.realtime); RedisBroker shares events across workers
+REALTIME_BROKER = os.getenv('REALTIME_BROKER', 'posts.realtime.LocalBroker')
+REALTIME_REDIS_URL = os.getenv('REALTIME_REDIS_URL', 'redis://localhost:6379/0')
+
+# Notifications are queued in memory and written in batches (posts.notifications); 0 writes each one at commit
+NOTIFICATION_FLUSH_DELAY = 1.0
+NOTIFICATION_BATCH_SIZE = 500
+
+# Where deferred jobs run (posts.jobs): 'db' with manage.py run_jobs workers, 'local' threads, or 'immediate'
+JOB_BACKEND = os.getenv('JOB_BACKEND', 'local')
+JOB_LOCAL_WORKERS = 2
+
+# Posts per cached feed block (posts.windows); pages of any size are sliced from these
+FEED_BLOCK_SIZE = 50
+
+# Share of API requests whose queries are fingerprinted for manage.py audit_indexes (posts.profiling)
+QUERY_PROFILE_SAMPLE_RATE = float(os.getenv('QUERY_PROFILE_SAMPLE_RATE', '0'))
+QUERY_PROFILE_FLUSH_INTERVAL = 60
+
+# Feed warming (posts.warming): how many active users to remember, and how fast to warm them
+WARM_FEEDS_ON_STARTUP = os.getenv('WARM_FEEDS_ON_STARTUP', 'true').lower() == 'true'
+WARM_STARTUP_LOCK_TTL = 300
+WARM_ACTIVE_USERS = 5000
+WARM_WORKERS = 4
+WARM_RATE = 50
+
+# Rows per post in the sharded like counter; more shards spread writes on hot posts
+LIKE_COUNTER_SHARDS = int(os.getenv('LIKE_COUNTER_SHARDS', 8))
+# Rows per dashboard total and time bucket, for the same reason
+STAT_COUNTER_SHARDS = int(os.getenv('STAT_COUNTER_SHARDS', 8))
+
 # Configure API-based authentication flow
 REST_USE_JWT = True
 
@@ -307,6 +376,8 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.RoleTokenRefreshSerializer',
     'TOKEN_TYPE_CLAIM': 'token_type',
 
     'JTI_CLAIM': 'jti',
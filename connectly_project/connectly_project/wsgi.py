@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "connectly_project.settings")
 
 application = get_wsgi_application()
+
+# Queue a warm-up of active users' feeds for this fresh process (WARM_FEEDS_ON_STARTUP)
+from posts.warming import warm_on_startup  # noqa: E402
+
+warm_on_startup()
@@ -0,0 +1,253 @@
+"""
+What the cache is doing, per key prefix.
+
+Every CacheHelper / SafeCacheHelper call (and so every ``query_cache``,
+object cache and feed block access) goes through ``track``, which records
+per key prefix (see posts.codec.prefix_of):
+
+- hits, misses, writes, deletes and errors, and calls skipped because the
+  cache circuit was open (posts.circuit),
+- call latency: total, max, and a histogram to estimate percentiles from.
+
+Keys that are read are also fed to a Space-Saving sketch, which keeps the
+CACHE_HOT_KEYS most frequent keys in bounded memory. A reported count may be
+too high by at most the key's ``error``, never too low.
+
+Numbers are kept per process. While a process is busy, a timer thread
+copies its snapshot (with the byte counts from posts.codec) to the cache
+every PUBLISH_INTERVAL seconds, so ``collect()``, used by the admin
+endpoint and ``manage.py cache_stats``, can merge all processes that
+published within PUBLISH_TTL.
+"""
+import os
+import socket
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock, Timer
+
+from django.conf import settings
+from django.db import connection
+
+from . import codec
+from .circuit import CacheUnavailable, breaker, cache
+
+HOT_KEYS = 100
+PUBLISH_INTERVAL = 30
+PUBLISH_TTL = 600
+PROCESSES_KEY = 'cache-metrics:processes'
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000, float('inf'))
+
+
+class SpaceSaving:
+    """Top-k heavy hitters: at most ``capacity`` counters, the smallest one is reused for new keys"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}  # key -> [count, error]
+
+    def add(self, key, count=1):
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [count, 0]
+        else:
+            victim = min(self.counters, key=lambda k: self.counters[k][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[key] = [floor + count, floor]
+
+    def top(self, n=None):
+        ranked = sorted(self.counters.items(), key=lambda item: -item[1][0])[:n]
+        return [{'key': key, 'count': count, 'error': error} for key, (count, error) in ranked]
+
+    def merge(self, entries):
+        for entry in entries:
+            counter = self.counters.setdefault(entry['key'], [0, 0])
+            counter[0] += entry['count']
+            counter[1] += entry['error']
+        if len(self.counters) > self.capacity:
+            self.counters = dict(sorted(self.counters.items(), key=lambda item: -item[1][0])[:self.capacity])
+
+
+def _new_prefix():
+    return {
+        'hits': 0, 'misses': 0, 'writes': 0, 'deletes': 0, 'errors': 0, 'skipped': 0,
+        'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'latency': [0] * len(LATENCY_BUCKETS),
+    }
+
+
+class Call:
+    """Outcome of one tracked cache call, filled in by the caller"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.deletes = 0
+
+    def found(self, hits, misses=0):
+        self.hits += hits
+        self.misses += misses
+
+
+class CacheMetrics:
+    def __init__(self, hot_keys=None):
+        self._hot_keys = hot_keys
+        self._lock = Lock()
+        self._timer = None
+        self.reset()
+
+    @property
+    def hot_key_capacity(self):
+        return self._hot_keys or getattr(settings, 'CACHE_HOT_KEYS', HOT_KEYS)
+
+    def reset(self):
+        with self._lock:
+            self.prefixes = defaultdict(_new_prefix)
+            self.hot = SpaceSaving(self.hot_key_capacity)
+
+    @contextmanager
+    def track(self, keys, reads=False):
+        """
+        Time the cache call in the block and count what it did under the
+        prefix of its first key. Reads feed the hot-key sketch. Errors are
+        counted and re-raised.
+        """
+        call = Call()
+        start = time.perf_counter()
+        error = skipped = False
+        try:
+            yield call
+        except CacheUnavailable:
+            skipped = True
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            prefix = codec.prefix_of(keys[0]) if keys else ''
+            with self._lock:
+                counts = self.prefixes[prefix]
+                counts['calls'] += 1
+                counts['total_ms'] += elapsed
+                counts['max_ms'] = max(counts['max_ms'], elapsed)
+                counts['latency'][bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+                counts['hits'] += call.hits
+                counts['misses'] += call.misses
+                counts['writes'] += call.writes
+                counts['deletes'] += call.deletes
+                counts['errors'] += error
+                counts['skipped'] += skipped
+                if reads:
+                    for key in keys:
+                        self.hot.add(key)
+                if self._timer is None:
+                    self._timer = Timer(PUBLISH_INTERVAL, self._publish_in_background)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'prefixes': {prefix: dict(counts, latency=list(counts['latency']))
+                             for prefix, counts in self.prefixes.items()},
+                'hot_keys': self.hot.top(),
+                'bytes': codec.raw_usage(),
+                'breaker': breaker.stats(),
+            }
+
+    def publish(self):
+        """Share this process's snapshot through the cache (not itself tracked)"""
+        name = process_name()
+        try:
+            cache.set(f"cache-metrics:{name}", self.snapshot(), timeout=PUBLISH_TTL)
+            processes = cache.get(PROCESSES_KEY) or []
+            if name not in processes:
+                cache.set(PROCESSES_KEY, (processes + [name])[-100:], timeout=None)
+        except Exception:
+            pass
+
+    def _publish_in_background(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.publish()
+        finally:
+            connection.close()
+
+
+def process_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+metrics = CacheMetrics()
+
+
+def percentile(histogram, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of calls"""
+    total = sum(histogram)
+    if not total:
+        return None
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS, histogram):
+        seen += count
+        if seen >= total * fraction:
+            return bound if bound != float('inf') else None
+    return None
+
+
+def summarize(snapshot, top=None):
+    """Ratios, averages and percentiles for a snapshot"""
+    usage = codec.stats(snapshot['bytes'])
+    prefixes = {}
+    for prefix, counts in sorted(snapshot['prefixes'].items()):
+        lookups = counts['hits'] + counts['misses']
+        prefixes[prefix] = {
+            'hits': counts['hits'],
+            'misses': counts['misses'],
+            'hit_ratio': round(counts['hits'] / lookups, 4) if lookups else None,
+            'writes': counts['writes'],
+            'deletes': counts['deletes'],
+            'errors': counts['errors'],
+            'skipped': counts['skipped'],
+            'calls': counts['calls'],
+            'avg_ms': round(counts['total_ms'] / counts['calls'], 3) if counts['calls'] else None,
+            'p95_ms': percentile(counts['latency'], 0.95),
+            'max_ms': round(counts['max_ms'], 3),
+            'bytes': usage.get(prefix),
+        }
+    return {'prefixes': prefixes, 'hot_keys': snapshot['hot_keys'][:top]}
+
+
+def collect(top=20):
+    """Summary of every process that published recently, including this one"""
+    merged = defaultdict(_new_prefix)
+    merged_bytes = defaultdict(lambda: defaultdict(int))
+    hot = SpaceSaving(metrics.hot_key_capacity)
+    snapshots = {process_name(): metrics.snapshot()}
+    try:
+        names = cache.get(PROCESSES_KEY) or []
+        published = cache.get_many([f"cache-metrics:{name}" for name in names if name != process_name()])
+        snapshots.update((key.split(':', 1)[1], snapshot) for key, snapshot in published.items())
+    except Exception:
+        pass
+    for snapshot in snapshots.values():
+        for prefix, counts in snapshot['prefixes'].items():
+            target = merged[prefix]
+            for field in ('hits', 'misses', 'writes', 'deletes', 'errors', 'skipped', 'calls', 'total_ms'):
+                target[field] += counts[field]
+            target['max_ms'] = max(target['max_ms'], counts['max_ms'])
+            target['latency'] = [a + b for a, b in zip(target['latency'], counts['latency'])]
+        for prefix, counts in snapshot['bytes'].items():
+            for field, value in counts.items():
+                merged_bytes[prefix][field] += value
+        hot.merge(snapshot['hot_keys'])
+    summary = summarize({'prefixes': merged, 'hot_keys': hot.top(), 'bytes': merged_bytes}, top)
+    summary['processes'] = len(snapshots)
+    summary['breakers'] = {name: snapshot.get('breaker') for name, snapshot in snapshots.items()}
+    return summary
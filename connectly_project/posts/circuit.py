@@ -0,0 +1,169 @@
+"""
+Circuit breaker in front of the cache.
+
+Code that reads or writes the cache already falls back to the database when
+a call fails, but each failing call first waits for the backend's timeout;
+during an outage every request pays that wait, several times over. ``cache``
+here wraps the default cache: while the backend keeps failing, calls fail at
+once with CacheUnavailable instead, and the existing fallbacks take over.
+
+The breaker looks at the last WINDOW calls. A call counts as failed when it
+raises or takes longer than CACHE_BREAKER_SLOW_MS (its result is still
+used). Errors that are a normal answer from a healthy backend, such as the
+ValueError ``incr`` and ``decr`` raise for a missing key, are passed on
+without being counted. Once at least MIN_CALLS calls are in the window and
+the failed share reaches CACHE_BREAKER_ERROR_RATE, the breaker opens: calls
+are skipped for CACHE_BREAKER_COOLDOWN seconds. After that one call at a time is let
+through as a probe; a good probe closes the breaker, a failed one opens it
+for another cooldown.
+
+State is per process and reported by the cache metrics (posts.cache_metrics).
+"""
+import logging
+import time
+from collections import deque
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+WINDOW = 20
+MIN_CALLS = 10
+ERROR_RATE = 0.5
+SLOW_MS = 250
+COOLDOWN = 10
+
+# Backend methods that go through the breaker; anything else is passed through as is
+GUARDED = frozenset([
+    'get', 'set', 'add', 'delete', 'get_many', 'set_many', 'delete_many', 'delete_pattern',
+    'incr', 'decr', 'touch', 'has_key', 'get_or_set',
+])
+
+# Errors a healthy backend raises as an answer, by method name
+MISSING_KEY_ERRORS = {
+    'incr': ValueError,
+    'decr': ValueError,
+}
+
+
+class CacheUnavailable(Exception):
+    """Raised instead of calling the cache while the breaker is open"""
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.outcomes = deque(maxlen=WINDOW)
+            self.opened_at = None
+            self.probing = False
+            self.trips = 0
+            self.skipped = 0
+
+    @staticmethod
+    def setting(name, default):
+        return getattr(settings, f'CACHE_BREAKER_{name}', default)
+
+    def allow(self):
+        """Whether a call may go to the backend now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.setting('COOLDOWN', COOLDOWN):
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.skipped += 1
+            return False
+
+    def record(self, ok, elapsed_ms):
+        failed = not ok or elapsed_ms > self.setting('SLOW_MS', SLOW_MS)
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    logger.warning("Cache circuit closed")
+                return
+            if self.state != CLOSED:
+                return
+            self.outcomes.append(failed)
+            if (len(self.outcomes) >= MIN_CALLS
+                    and sum(self.outcomes) >= len(self.outcomes) * self.setting('ERROR_RATE', ERROR_RATE)):
+                self._open()
+
+    def release(self):
+        """End a call that neither succeeded nor failed; a pending probe is retried"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+
+    def _open(self):
+        if self.state != OPEN:
+            logger.warning("Cache circuit opened; skipping the cache for %ss", self.setting('COOLDOWN', COOLDOWN))
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self.outcomes.clear()
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow():
+            raise CacheUnavailable("Cache circuit is open")
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            if isinstance(exc, MISSING_KEY_ERRORS.get(getattr(func, '__name__', None), ())):
+                self.release()
+            else:
+                self.record(False, (time.perf_counter() - start) * 1000)
+            raise
+        self.record(True, (time.perf_counter() - start) * 1000)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'recent_calls': len(self.outcomes),
+                'recent_failures': sum(self.outcomes),
+                'trips': self.trips,
+                'skipped_calls': self.skipped,
+            }
+
+
+breaker = CircuitBreaker()
+
+
+class GuardedCache:
+    """A cache alias whose data calls go through the breaker"""
+
+    def __init__(self, alias='default', circuit=None):
+        self.alias = alias
+        self.circuit = circuit or breaker
+
+    def __getattr__(self, name):
+        attr = getattr(caches[self.alias], name)
+        if name not in GUARDED:
+            return attr
+
+        def guarded(*args, **kwargs):
+            return self.circuit.call(attr, *args, **kwargs)
+        return guarded
+
+
+cache = GuardedCache()
@@ -0,0 +1,201 @@
+"""
+How values are stored in the cache.
+
+Everything CacheHelper / SafeCacheHelper stores is encoded here instead of
+being handed to the backend as an object:
+
+- values are pickled with the highest protocol, behind a two-byte header;
+- encodings of at least CACHE_COMPRESS_MIN_SIZE bytes are zlib-compressed,
+  when that saves at least a tenth;
+- encodings larger than CACHE_MAX_ENTRY_SIZE are not stored at all (and the
+  key is dropped, so an older value cannot be served in its place).
+
+Model instances pickle with their ``_state``, the Django version and the
+class path, for every row. ``pack_rows`` turns a list of instances from one
+queryset into plain tuples: the model, the loaded field names and the
+annotations once, then one tuple of values per row, with ``select_related``
+rows nested the same way. ``unpack_rows`` rebuilds the instances with
+``Model.from_db``, as a query would. Feed blocks (posts.windows) are stored
+this way.
+
+Bytes written and read, and how many entries were compressed or rejected,
+are counted per key prefix (``feed``, ``newsfeed``, ``post``, ``qc``, ...)
+in this process; see ``stats()``.
+"""
+import logging
+import pickle
+import re
+import zlib
+from collections import defaultdict
+from threading import Lock
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+PICKLED = b'\xccP'
+COMPRESSED = b'\xccZ'
+
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 1
+MAX_ENTRY_SIZE = 1024 * 1024
+
+_VERSION_PREFIX = re.compile(r'^v\d+:')
+_ROWS = 'rows'
+
+_lock = Lock()
+_usage = defaultdict(lambda: {
+    'writes': 0, 'bytes_written': 0, 'uncompressed_bytes': 0, 'compressed': 0,
+    'rejected': 0, 'reads': 0, 'bytes_read': 0,
+})
+
+
+def prefix_of(key):
+    """The part of a key usage is reported under: 'v3:feed:user-1:...' -> 'feed'"""
+    return _VERSION_PREFIX.sub('', key, count=1).split(':', 1)[0]
+
+
+def encode(key, value):
+    """Bytes to store for value, or None if the entry is over the size limit"""
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    size = len(data)
+    header = PICKLED
+    if size >= getattr(settings, 'CACHE_COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE):
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        if len(compressed) <= size * 0.9:
+            data, header = compressed, COMPRESSED
+    encoded = header + data
+
+    limit = getattr(settings, 'CACHE_MAX_ENTRY_SIZE', MAX_ENTRY_SIZE)
+    with _lock:
+        usage = _usage[prefix_of(key)]
+        if limit and len(encoded) > limit:
+            usage['rejected'] += 1
+        else:
+            usage['writes'] += 1
+            usage['bytes_written'] += len(encoded)
+            usage['uncompressed_bytes'] += size
+            usage['compressed'] += header == COMPRESSED
+    if limit and len(encoded) > limit:
+        logger.warning("Not caching %s: %d bytes is over the %d byte limit", key, len(encoded), limit)
+        return None
+    return encoded
+
+
+def decode(key, data):
+    """The value stored as data; values not written by encode are returned as they are"""
+    if not isinstance(data, bytes) or data[:2] not in (PICKLED, COMPRESSED):
+        return data
+    with _lock:
+        usage = _usage[prefix_of(key)]
+        usage['reads'] += 1
+        usage['bytes_read'] += len(data)
+    body = data[2:]
+    if data[:2] == COMPRESSED:
+        body = zlib.decompress(body)
+    return pickle.loads(body)
+
+
+def _shape(instance):
+    """(loaded field attnames in model order, annotation names, select_related names)"""
+    opts = instance._meta
+    loaded = instance.__dict__
+    fields = tuple(f.attname for f in opts.concrete_fields if f.attname in loaded)
+    attnames = {f.attname for f in opts.concrete_fields}
+    extras = tuple(sorted(name for name in loaded if not name.startswith('_') and name not in attnames))
+    related = tuple(sorted(instance._state.fields_cache))
+    return fields, extras, related
+
+
+def _forward_relations(model):
+    return {f.name for f in model._meta.concrete_fields if f.is_relation}
+
+
+def _pack(instances):
+    """(header, rows) for instances of one model and shape, or None if they differ"""
+    first = next((instance for instance in instances if instance is not None), None)
+    if first is None:
+        return (None, (), (), ()), [None] * len(instances)
+    model = type(first)
+    fields, extras, related = _shape(first)
+    if not set(related) <= _forward_relations(model):
+        # Reverse one-to-one caches and the like are left to pickle
+        return None
+    nested = {}
+    for name in related:
+        packed = _pack([None if instance is None else instance._state.fields_cache.get(name)
+                        for instance in instances])
+        if packed is None:
+            return None
+        nested[name] = packed
+    rows = []
+    for index, instance in enumerate(instances):
+        if instance is None:
+            rows.append(None)
+            continue
+        if (type(instance) is not model or _shape(instance) != (fields, extras, related)
+                or getattr(instance, '_prefetched_objects_cache', None)):
+            return None
+        loaded = instance.__dict__
+        rows.append((
+            tuple(loaded[name] for name in fields),
+            tuple(loaded[name] for name in extras),
+            tuple(nested[name][1][index] for name in related),
+        ))
+    headers = tuple(nested[name][0] for name in related)
+    return (model._meta.label, fields, extras, tuple(zip(related, headers))), rows
+
+
+def pack_rows(instances):
+    """A compact form of a list of model instances; lists that cannot be packed are returned as they are"""
+    instances = list(instances)
+    packed = _pack(instances) if instances else None
+    if packed is None:
+        return instances
+    return (_ROWS, packed[0], packed[1])
+
+
+def _unpack(header, row):
+    if row is None:
+        return None
+    label, fields, extras, related = header
+    model = apps.get_model(label)
+    values, extra_values, related_rows = row
+    instance = model.from_db(DEFAULT_DB_ALIAS, fields, values)
+    for name, value in zip(extras, extra_values):
+        setattr(instance, name, value)
+    for (name, related_header), related_row in zip(related, related_rows):
+        model._meta.get_field(name).set_cached_value(instance, _unpack(related_header, related_row))
+    return instance
+
+
+def unpack_rows(packed):
+    """The list of model instances pack_rows was given"""
+    if not (isinstance(packed, tuple) and packed and packed[0] == _ROWS):
+        return packed
+    _, header, rows = packed
+    return [_unpack(header, row) for row in rows]
+
+
+def raw_usage():
+    """Byte counters per key prefix, without the derived ratios"""
+    with _lock:
+        return {prefix: dict(counts) for prefix, counts in _usage.items()}
+
+
+def stats(usage=None):
+    """Cache bytes per key prefix written and read by this process (or in the given raw counters)"""
+    usage = {prefix: dict(counts) for prefix, counts in (usage or raw_usage()).items()}
+    for counts in usage.values():
+        written = counts['bytes_written']
+        counts['compression_ratio'] = (round(counts['uncompressed_bytes'] / written, 2)
+                                       if written else None)
+        counts['avg_entry_bytes'] = written // counts['writes'] if counts['writes'] else None
+    return usage
+
+
+def reset_stats():
+    with _lock:
+        _usage.clear()
@@ -0,0 +1,115 @@
+"""
+Negotiated response compression (zstd, brotli, gzip).
+
+CompressionMiddleware compresses responses above COMPRESSION_MIN_SIZE with
+the best encoding the client accepts. brotli and zstd are used when the
+``brotli`` / ``zstandard`` packages are installed; gzip always works.
+
+Views that cache rendered pages can store every encoding next to the page
+(see ``precompress`` and ``PrecompressedResponse``); the middleware then
+serves the stored bytes instead of compressing the same page on each hit.
+"""
+import gzip
+
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MIN_SIZE = 1024
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/x-ndjson',
+    'image/svg+xml',
+)
+
+
+def _gzip(data, level):
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# encoding -> (compress function, level per response, level when precompressing)
+ENCODERS = {'gzip': (_gzip, 6, 9)}
+if brotli is not None:
+    ENCODERS['br'] = (_brotli, 5, 9)
+if zstandard is not None:
+    ENCODERS['zstd'] = (_zstd, 3, 10)
+
+# Preferred first when the client rates several encodings equally
+PREFERENCE = ('zstd', 'br', 'gzip')
+
+
+def min_size():
+    return getattr(settings, 'COMPRESSION_MIN_SIZE', MIN_SIZE)
+
+
+def negotiate(accept_encoding, available=None):
+    """Pick the encoding to use for an Accept-Encoding header, or None"""
+    available = ENCODERS if available is None else available
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    best, best_q = None, 0.0
+    for encoding in PREFERENCE:
+        if encoding not in available:
+            continue
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding, precompressing=False):
+    func, level, precompress_level = ENCODERS[encoding]
+    return func(data, precompress_level if precompressing else level)
+
+
+def precompress(data):
+    """Return {encoding: bytes} for every available encoding, or {} for small bodies"""
+    if len(data) < min_size():
+        return {}
+    return {encoding: compress(data, encoding, precompressing=True) for encoding in ENCODERS}
+
+
+def is_compressible(content_type):
+    return (content_type or '').split(';')[0].strip().lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class PrecompressedResponse(HttpResponse):
+    """A response that carries ready-made compressed variants of its content"""
+
+    def __init__(self, content, variants, content_type='application/json', **kwargs):
+        super().__init__(content, content_type=content_type, **kwargs)
+        self.precompressed = variants
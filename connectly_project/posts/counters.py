@@ -0,0 +1,90 @@
+"""
+Sharded like counters.
+
+A single like_count column on a viral post makes every like wait for the same
+row lock. Each post instead has up to LIKE_COUNTER_SHARDS PostLikeCounterShard
+rows: a write adds to one shard picked at random, so concurrent likes on the
+same post usually touch different rows, and a read sums the shards.
+``manage.py compact_like_counters`` periodically folds a post's shards back
+into one row, and with ``--rebuild`` recounts from the Like table to correct
+drift (likes removed by cascades are not subtracted here).
+"""
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import PostLikeCounterShard
+
+
+def shard_count():
+    return max(1, getattr(settings, 'LIKE_COUNTER_SHARDS', 8))
+
+
+def _add(post_id, shard, delta):
+    lookup = {'post_id': post_id, 'shard': shard}
+    if PostLikeCounterShard.objects.filter(**lookup).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            PostLikeCounterShard.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Another writer created the shard first
+        PostLikeCounterShard.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def add_likes(post_id, delta=1):
+    """Add delta to a random shard of a post's like counter"""
+    if delta:
+        _add(post_id, random.randrange(shard_count()), delta)
+
+
+def add_likes_many(post_ids, delta=1):
+    """Add delta per occurrence of each post id (e.g. after a bulk like)"""
+    for post_id, times in Counter(post_ids).items():
+        add_likes(post_id, delta * times)
+
+
+def like_counts(post_ids):
+    """Return {post_id: like count} for the given posts in one query"""
+    counts = dict.fromkeys(post_ids, 0)
+    counts.update(
+        PostLikeCounterShard.objects.filter(post_id__in=post_ids)
+        .values('post_id').annotate(total=Sum('count'))
+        .values_list('post_id', 'total')
+    )
+    return counts
+
+
+def like_count(post_id):
+    return like_counts([post_id])[post_id]
+
+
+def like_count_expression(outer_ref='pk'):
+    """Subquery summing a post's shards, for .annotate(like_count=...)"""
+    total = (PostLikeCounterShard.objects.filter(post_id=OuterRef(outer_ref))
+             .values('post_id').annotate(total=Sum('count')).values('total'))
+    return Coalesce(Subquery(total), Value(0))
+
+
+def compact(post_id, actual=None):
+    """
+    Fold a post's shards into shard 0, optionally replacing the total with a
+    recounted value. Returns the stored total.
+    """
+    with transaction.atomic():
+        shards = list(PostLikeCounterShard.objects.select_for_update()
+                      .filter(post_id=post_id).order_by('shard'))
+        total = sum(shard.count for shard in shards) if actual is None else actual
+        if len(shards) == 1 and shards[0].shard == 0 and shards[0].count == total:
+            return total
+        # Only the rows read above; shards created since are left for the next compaction
+        PostLikeCounterShard.objects.filter(pk__in=[shard.pk for shard in shards if shard.shard != 0]).delete()
+        if shards and shards[0].shard == 0:
+            PostLikeCounterShard.objects.filter(pk=shards[0].pk).update(count=total)
+        elif total:
+            _add(post_id, 0, total)
+    return total
@@ -0,0 +1,411 @@
+"""
+Bulk NDJSON / CSV import for users, posts, follows and likes.
+
+Rows are streamed from the input and handled a batch at a time: each batch is
+validated with a handful of set-based queries (id translation, existing
+usernames, existing likes/follows), passwords are hashed in a process pool,
+and the rows are written with a single ``bulk_create`` inside one transaction.
+Model signals do not fire for bulk writes, so the dashboard totals are
+adjusted per batch (run ``reconcile_stats`` afterwards to rebuild the series).
+
+Ids in the source are never reused. Every imported user and post is recorded
+in ImportIdMap (namespace ``<source>:<dataset>``), and foreign keys in later
+files (``author_id``, ``user_id``, ``post_id``, ``follower_id``, ``followed_id``,
+as written by ``export_data``) are translated through it. Rows whose source id
+is already mapped are skipped, so an interrupted import can simply be re-run.
+"""
+import csv
+import gzip
+import io
+import json
+import sys
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users import hashing
+from users.models import CustomUser
+from . import stats
+from . import counters
+from . import viewer_state
+from .models import Post, Like, Follow, ImportIdMap
+
+BATCH_SIZE = 5000
+
+# Keep at most this many rejected rows for the report
+MAX_ERRORS = 100
+
+FORMATS = ('ndjson', 'csv')
+
+
+def open_input(path):
+    """Open a path (or '-' for stdin) for text reading, decompressing .gz files"""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def guess_format(path):
+    return 'csv' if path.removesuffix('.gz').endswith('.csv') else 'ndjson'
+
+
+def read_rows(stream, fmt='ndjson'):
+    """Yield (line_number, row dict) from an NDJSON or CSV stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Empty CSV cells mean "not given"
+            yield reader.line_num, {key: value for key, value in row.items() if value != ''}
+        return
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ImportRowError(f"invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ImportRowError("expected a JSON object")
+            continue
+        yield line_number, row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class ImportRowError(Exception):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line_number, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line_number, message))
+
+
+@contextmanager
+def preserve_timestamps(model):
+    """
+    Let bulk_create keep the created_at values given in the source instead of
+    auto_now_add stamping every imported row with the import time
+    """
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def tune_transaction():
+    """Cheaper commits for bulk batches: losing the last batch on a crash only means re-running"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL synchronous_commit TO OFF")
+
+
+def source_id(row):
+    value = row.get('id')
+    return None if value is None else str(value)
+
+
+class Importer:
+    """
+    Base importer for one dataset. Subclasses list the model, the foreign keys
+    to translate (field -> dataset) and build model instances from rows.
+    """
+    dataset = None
+    model = None
+    foreign_keys = {}
+    stats_metric = None
+    maps_ids = False
+
+    def __init__(self, source='default', batch_size=BATCH_SIZE, hash_pool=None):
+        self.source = source
+        self.batch_size = batch_size
+        self.hash_pool = hash_pool
+        self.result = ImportResult()
+
+    def namespace(self, dataset=None):
+        return f"{self.source}:{dataset or self.dataset}"
+
+    def run(self, rows, progress=None):
+        for batch in batched(rows, self.batch_size):
+            self.import_batch(batch)
+            if progress:
+                progress(self.result)
+        return self.result
+
+    def lookup_ids(self, dataset, source_ids):
+        """Translate a set of source ids for a dataset in one query"""
+        if not source_ids:
+            return {}
+        return dict(ImportIdMap.objects.filter(
+            namespace=self.namespace(dataset), source_id__in=source_ids
+        ).values_list('source_id', 'target_id'))
+
+    def import_batch(self, batch):
+        result = self.result
+        result.read += len(batch)
+        rows = []
+        for line_number, row in batch:
+            if isinstance(row, ImportRowError):
+                result.reject(line_number, str(row))
+                continue
+            rows.append((line_number, row))
+
+        # Rows already imported by an earlier run
+        if self.maps_ids:
+            mapped = self.lookup_ids(self.dataset, {source_id(row) for _, row in rows} - {None})
+            fresh = [(line_number, row) for line_number, row in rows if source_id(row) not in mapped]
+            result.skipped += len(rows) - len(fresh)
+            rows = fresh
+
+        # Translate every foreign key with one query per referenced dataset
+        translations = {}
+        for field, dataset in self.foreign_keys.items():
+            wanted = {str(row[field]) for _, row in rows if row.get(field) is not None}
+            translations[field] = self.lookup_ids(dataset, wanted)
+
+        candidates = []
+        for line_number, row in rows:
+            try:
+                resolved = {}
+                for field, dataset in self.foreign_keys.items():
+                    value = row.get(field)
+                    if value is None:
+                        raise ImportRowError(f"missing {field}")
+                    target = translations[field].get(str(value))
+                    if target is None:
+                        raise ImportRowError(f"{field} {value} was not imported")
+                    resolved[field] = target
+                candidates.append((line_number, row, self.build(row, resolved)))
+            except ImportRowError as e:
+                result.reject(line_number, str(e))
+
+        candidates = self.validate_batch(candidates)
+        if not candidates:
+            return
+        self.prepare(candidates)
+
+        objs = [obj for _, _, obj in candidates]
+        with transaction.atomic():
+            tune_transaction()
+            with preserve_timestamps(self.model):
+                self.write(objs)
+            if self.maps_ids:
+                ImportIdMap.objects.bulk_create([
+                    ImportIdMap(namespace=self.namespace(), source_id=source_id(row), target_id=obj.pk)
+                    for _, row, obj in candidates if source_id(row) is not None
+                ], batch_size=self.batch_size)
+            if self.stats_metric:
+                stats.increment(self.stats_metric, len(objs))
+            self.after_write(objs)
+        result.created += len(objs)
+
+    def write(self, objs):
+        if self.maps_ids and not connection.features.can_return_rows_from_bulk_insert:
+            # The id map needs the new primary keys
+            for obj in objs:
+                obj.save(force_insert=True)
+            return
+        self.model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def build(self, row, resolved):
+        raise NotImplementedError
+
+    def after_write(self, objs):
+        """Maintain derived data that bulk_create's missing signals would not"""
+
+    def validate_batch(self, candidates):
+        """Drop (and report) candidates that cannot be inserted; returns the rest"""
+        return candidates
+
+    def prepare(self, candidates):
+        """Last step before writing, e.g. hashing passwords"""
+
+    def created_at(self, row):
+        value = row.get('created_at')
+        if value is None:
+            return None
+        parsed = parse_datetime(str(value))
+        if parsed is None:
+            raise ImportRowError(f"invalid created_at {value!r}")
+        return parsed
+
+    def stamp(self, obj, row):
+        obj.created_at = self.created_at(row) or timezone.now()
+        return obj
+
+
+class UserImporter(Importer):
+    dataset = 'users'
+    model = CustomUser
+    stats_metric = 'users'
+    maps_ids = True
+    roles = {choice for choice, _ in CustomUser.ROLE_CHOICES}
+
+    def build(self, row, resolved):
+        username = str(row.get('username') or '').strip()
+        if not username or len(username) > 150:
+            raise ImportRowError("username is required (at most 150 characters)")
+        email = str(row.get('email') or '').strip()
+        if email and '@' not in email:
+            raise ImportRowError(f"invalid email {email!r}")
+        role = row.get('role', 'user')
+        if role not in self.roles:
+            raise ImportRowError(f"invalid role {role!r}")
+        user = CustomUser(
+            username=username,
+            email=email,
+            first_name=str(row.get('first_name') or '')[:150],
+            last_name=str(row.get('last_name') or '')[:150],
+            role=role,
+        )
+        if row.get('date_joined'):
+            joined = parse_datetime(str(row['date_joined']))
+            if joined is None:
+                raise ImportRowError(f"invalid date_joined {row['date_joined']!r}")
+            user.date_joined = joined
+        # Plain passwords are hashed in prepare(); existing hashes are kept as they are
+        user.password = row.get('password_hash') or ''
+        user._plain_password = row.get('password') if not user.password else None
+        return user
+
+    def validate_batch(self, candidates):
+        unique = []
+        seen = set()
+        for line_number, row, user in candidates:
+            if user.username in seen:
+                self.result.reject(line_number, f"duplicate username {user.username!r} in input")
+            else:
+                seen.add(user.username)
+                unique.append((line_number, row, user))
+        taken = set(CustomUser.objects.filter(username__in=seen).values_list('username', flat=True))
+        valid = []
+        for line_number, row, user in unique:
+            if user.username in taken:
+                self.result.reject(line_number, f"username {user.username!r} already exists")
+            else:
+                valid.append((line_number, row, user))
+        return valid
+
+    def prepare(self, candidates):
+        users = [user for _, _, user in candidates]
+        plain = [user for user in users if user._plain_password]
+        hashes = hashing.make_passwords([user._plain_password for user in plain], pool=self.hash_pool)
+        for user, encoded in zip(plain, hashes):
+            user.password = encoded
+        for user in users:
+            if not user.password:
+                user.set_unusable_password()
+                continue
+            try:
+                identify_hasher(user.password)
+            except ValueError:
+                # Unknown hash format: keep the account but require a reset
+                user.set_unusable_password()
+
+
+class PostImporter(Importer):
+    dataset = 'posts'
+    model = Post
+    foreign_keys = {'author_id': 'users'}
+    stats_metric = 'posts'
+    maps_ids = True
+    privacies = {choice for choice, _ in Post.PRIVACY_CHOICES}
+
+    def build(self, row, resolved):
+        content = row.get('content')
+        if not content:
+            raise ImportRowError("content is required")
+        privacy = row.get('privacy', 'public')
+        if privacy not in self.privacies:
+            raise ImportRowError(f"invalid privacy {privacy!r}")
+        return self.stamp(Post(author_id=resolved['author_id'], content=content, privacy=privacy), row)
+
+
+class PairImporter(Importer):
+    """Likes and follows: skip pairs that already exist instead of failing the batch"""
+    pair = ()
+
+    def validate_batch(self, candidates):
+        first, second = self.pair
+        unique = []
+        seen = set()
+        for line_number, row, obj in candidates:
+            key = (getattr(obj, first), getattr(obj, second))
+            if key in seen:
+                self.result.skipped += 1
+                continue
+            seen.add(key)
+            unique.append((line_number, row, obj))
+        if not unique:
+            return unique
+        existing = set(self.model.objects.filter(**{
+            f"{first}__in": {key[0] for key in seen},
+            f"{second}__in": {key[1] for key in seen},
+        }).values_list(first, second))
+        valid = [candidate for candidate in unique
+                 if (getattr(candidate[2], first), getattr(candidate[2], second)) not in existing]
+        self.result.skipped += len(unique) - len(valid)
+        return valid
+
+
+class FollowImporter(PairImporter):
+    dataset = 'follows'
+    model = Follow
+    foreign_keys = {'follower_id': 'users', 'followed_id': 'users'}
+    pair = ('follower_id', 'followed_id')
+
+    def build(self, row, resolved):
+        if resolved['follower_id'] == resolved['followed_id']:
+            raise ImportRowError("users cannot follow themselves")
+        return self.stamp(Follow(**resolved), row)
+
+    def after_write(self, objs):
+        viewer_state.add_many([(follow.follower_id, follow.followed_id) for follow in objs], viewer_state.FOLLOWS)
+
+
+class LikeImporter(PairImporter):
+    dataset = 'likes'
+    model = Like
+    foreign_keys = {'user_id': 'users', 'post_id': 'posts'}
+    stats_metric = 'likes'
+    pair = ('user_id', 'post_id')
+
+    def build(self, row, resolved):
+        return self.stamp(Like(**resolved), row)
+
+    def after_write(self, objs):
+        counters.add_likes_many([like.post_id for like in objs])
+        viewer_state.add_many([(like.user_id, like.post_id) for like in objs], viewer_state.LIKES)
+
+
+IMPORTERS = {
+    'users': UserImporter,
+    'posts': PostImporter,
+    'follows': FollowImporter,
+    'likes': LikeImporter,
+}
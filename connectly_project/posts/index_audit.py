@@ -0,0 +1,267 @@
+"""
+Index recommendations from profiled queries (see posts.profiling).
+
+For each captured fingerprint, the example SQL is read for the predicates on
+its main table:
+
+- equality and IN predicates become the leading index columns,
+- range predicates and ORDER BY columns follow, in that order,
+- an equality with a constant on a field with choices (``privacy``,
+  ``status``) becomes a partial index condition instead of a column,
+  e.g. public posts ordered by time,
+- when the WHERE clause has ORs, only the condition and ORDER BY columns
+  are used, since no single composite serves every branch,
+- on PostgreSQL, the few other selected columns are added with INCLUDE so
+  the index covers the query.
+
+A recommendation is dropped when an existing index starts with the same
+columns. Sizes are estimated from the planner's row count (or COUNT) and the
+column widths. Separately, indexes whose columns are a prefix of another
+index or unique constraint on the same table are reported as redundant:
+every write pays for them and no read needs them.
+
+Replaying runs EXPLAIN on the stored example, with placeholder values for
+the parameters the profiler redacted, to show the plan the query gets today.
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import connection, models
+
+from . import profiling
+from .models import QueryFingerprint
+from .pagination import planner_row_estimate
+
+# Bytes per index entry besides the key: row pointer and entry header
+ENTRY_OVERHEAD = 16
+# Pages are not kept full
+FILL_OVERHEAD = 1.3
+
+_WHERE = re.compile(r' WHERE (.*?)(?: GROUP BY | ORDER BY | LIMIT |$)')
+_ORDER = re.compile(r' ORDER BY (.*?)(?: LIMIT |$)')
+
+
+@dataclass
+class Recommendation:
+    model: type
+    fields: list
+    condition: dict = field(default_factory=dict)
+    include: list = field(default_factory=list)
+    fingerprints: list = field(default_factory=list)
+    total_ms: float = 0.0
+    estimated_bytes: int = None
+
+    @property
+    def name(self):
+        digest = hashlib.md5(repr((self.fields, sorted(self.condition.items()), self.include)).encode()).hexdigest()
+        return f"{self.model._meta.db_table[:12]}_{self.fields[0].lstrip('-')[:6]}_{digest[:6]}_idx"
+
+    def index(self):
+        kwargs = {'fields': self.fields, 'name': self.name}
+        if self.condition:
+            kwargs['condition'] = models.Q(**self.condition)
+        if self.include:
+            kwargs['include'] = self.include
+        return models.Index(**kwargs)
+
+    def code(self):
+        parts = [f"fields={self.fields!r}", f"name={self.name!r}"]
+        if self.condition:
+            parts.append("condition=models.Q(" + ", ".join(f"{k}={v!r}" for k, v in self.condition.items()) + ")")
+        if self.include:
+            parts.append(f"include={self.include!r}")
+        return f"models.Index({', '.join(parts)})"
+
+
+def models_by_table():
+    return {model._meta.db_table: model for model in apps.get_models()}
+
+
+def field_for_column(model, column):
+    for model_field in model._meta.concrete_fields:
+        if model_field.column == column:
+            return model_field
+    return None
+
+
+def existing_indexes(table):
+    """[(name, columns, unique)] for a table's indexes and unique constraints, partial ones left out"""
+    model = models_by_table().get(table)
+    partial = {
+        index.name for index in (model._meta.indexes + model._meta.constraints if model else [])
+        if getattr(index, 'condition', None) is not None
+    }
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [
+        (name, info['columns'], bool(info['unique'] or info['primary_key']))
+        for name, info in constraints.items()
+        if (info['index'] or info['unique'] or info['primary_key']) and info['columns'] and name not in partial
+    ]
+
+
+def redundant_indexes(app_labels=('posts', 'users')):
+    """[(table, name, columns, covered_by)] for non-unique indexes that another index makes unnecessary"""
+    found = []
+    tables = sorted(model._meta.db_table for model in apps.get_models() if model._meta.app_label in app_labels)
+    for table in tables:
+        indexes = existing_indexes(table)
+        for name, columns, unique in indexes:
+            if unique:
+                continue
+            for other, other_columns, other_unique in indexes:
+                if other == name or other_columns[:len(columns)] != columns:
+                    continue
+                # Of two identical plain indexes, only report the one sorting last
+                if other_columns == columns and not other_unique and other > name:
+                    continue
+                found.append((table, name, columns, other))
+                break
+    return found
+
+
+def parse(sql, params=None):
+    """(table, equal columns, constants {column: value}, range columns, order [(column, desc)], selected, has_or)"""
+    table_match = re.search(r' FROM "(\w+)"', sql)
+    if not table_match:
+        return None
+    table = table_match.group(1)
+    ref = rf'"{table}"\."(\w+)"'
+    where = _WHERE.search(sql)
+    where_sql = where.group(1) if where else ''
+    where_start = where.start(1) if where else 0
+
+    equal, constants, ranges = [], {}, []
+    for match in re.finditer(ref + r' (=|IN \(|<=|>=|<|>) ?(%s)?', where_sql):
+        column, operator = match.group(1), match.group(2)
+        if operator in ('=', 'IN ('):
+            if column not in equal:
+                equal.append(column)
+            if operator == '=' and match.group(3) and params is not None:
+                position = sql[:where_start + match.start(3)].count('%s')
+                if position < len(params):
+                    constants[column] = params[position]
+        elif column not in ranges:
+            ranges.append(column)
+
+    order = []
+    order_match = _ORDER.search(sql)
+    if order_match:
+        order = [(column, direction == 'DESC')
+                 for column, direction in re.findall(ref + r' (ASC|DESC)', order_match.group(1))]
+    select = sql[:table_match.start()]
+    selected = list(dict.fromkeys(re.findall(ref, select)))
+    return table, equal, constants, ranges, order, selected, ' OR ' in where_sql
+
+
+def recommend_for(sql, params=None):
+    """A Recommendation for one query, or None when it has nothing to index on"""
+    parsed = parse(sql, params)
+    if parsed is None:
+        return None
+    table, equal, constants, ranges, order, selected, has_or = parsed
+    model = models_by_table().get(table)
+    if model is None:
+        return None
+
+    condition = {}
+    for column, value in constants.items():
+        model_field = field_for_column(model, column)
+        if model_field is not None and model_field.choices and not isinstance(value, (list, dict)):
+            condition[model_field.name] = value
+    keys = [] if has_or else [c for c in equal if field_for_column(model, c) and
+                              field_for_column(model, c).name not in condition]
+    keys += [c for c in ranges if c not in keys]
+    directions = {}
+    for column, desc in order:
+        if column not in keys:
+            keys.append(column)
+            directions[column] = desc
+    if not keys:
+        return None
+
+    names = []
+    for column in keys:
+        model_field = field_for_column(model, column)
+        if model_field is None:
+            return None
+        names.append(('-' if directions.get(column) else '') + model_field.name)
+    include = []
+    if connection.vendor == 'postgresql':
+        extra = [c for c in selected if c not in keys and c != model._meta.pk.column]
+        if extra and len(extra) <= 4:
+            include = [field_for_column(model, c).name for c in extra if field_for_column(model, c)]
+    return Recommendation(model, names, condition, include)
+
+
+def is_covered(recommendation):
+    """Whether an existing index already starts with the recommended columns"""
+    opts = recommendation.model._meta
+    columns = [opts.get_field(name.lstrip('-')).column for name in recommendation.fields]
+    if len(columns) > 1 and columns[-1] == opts.pk.column:
+        # A trailing primary key only breaks ties in the ordering
+        columns = columns[:-1]
+    condition_columns = [opts.get_field(name).column for name in recommendation.condition]
+    for _, existing, _ in existing_indexes(opts.db_table):
+        if existing[:len(columns)] == columns:
+            return True
+        # An index on (condition column, ...) serves the partial index's rows as well
+        if condition_columns and existing[:len(condition_columns) + len(columns)] == condition_columns + columns:
+            return True
+    return False
+
+
+def column_width(model_field):
+    if isinstance(model_field, (models.BooleanField, models.SmallIntegerField)):
+        return 2
+    if isinstance(model_field, models.CharField):
+        return min(model_field.max_length or 32, 32)
+    if isinstance(model_field, (models.TextField, models.JSONField)):
+        return 64
+    return 8
+
+
+def estimate_size(recommendation):
+    """Approximate index size in bytes"""
+    model = recommendation.model
+    rows = planner_row_estimate(model)
+    if rows is None:
+        rows = model._default_manager.count()
+    if recommendation.condition and rows:
+        total = model._default_manager.count()
+        if total:
+            rows = rows * model._default_manager.filter(**recommendation.condition).count() / total
+    names = [name.lstrip('-') for name in recommendation.fields] + recommendation.include
+    width = sum(column_width(model._meta.get_field(name)) for name in names) + ENTRY_OVERHEAD
+    return int(rows * width * FILL_OVERHEAD)
+
+
+def explain(sql, params=None):
+    """The plan the database picks for a query today, one line per step"""
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix} {sql}", profiling.placeholders(params) or None)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def audit(limit=50):
+    """
+    Recommendations for the most expensive captured fingerprints, merged by
+    index and sorted by the query time they would serve
+    """
+    merged = {}
+    for entry in QueryFingerprint.objects.order_by('-total_ms')[:limit]:
+        if not entry.sample_sql.lstrip().upper().startswith('SELECT'):
+            continue
+        recommendation = recommend_for(entry.sample_sql, entry.sample_params)
+        if recommendation is None or is_covered(recommendation):
+            continue
+        recommendation = merged.setdefault(recommendation.name, recommendation)
+        recommendation.fingerprints.append(entry)
+        recommendation.total_ms += entry.total_ms
+    recommendations = sorted(merged.values(), key=lambda r: -r.total_ms)
+    for recommendation in recommendations:
+        recommendation.estimated_bytes = estimate_size(recommendation)
+    return recommendations
@@ -0,0 +1,208 @@
+"""
+Deferred work that should not hold up a response.
+
+Functions decorated with ``@job`` keep working when called directly, and gain
+``.delay(*args, **kwargs)`` to run later instead. Arguments must be JSON
+serializable. Jobs are defined in posts.tasks.
+
+JOB_BACKEND picks where delayed jobs run:
+
+- 'db' stores a Job row in the caller's transaction, so the job exists
+  exactly when the data it works on does. ``manage.py run_jobs`` workers claim
+  rows by priority. A claim hides the row for the job's visibility timeout;
+  if the worker dies, the row becomes claimable again afterwards.
+- 'local' runs jobs on a small in-process thread pool after commit. Nothing
+  survives a restart; meant for development and single-process deployments.
+- 'immediate' runs jobs synchronously after commit (tests).
+
+Failed jobs are retried with exponential backoff up to ``max_attempts``. Rows
+that exhaust their attempts stay in the table with status 'failed' and the
+last error; finished jobs are deleted.
+"""
+import itertools
+import logging
+import queue
+import traceback
+from datetime import timedelta
+from threading import Lock, Thread, Timer
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FAILED = 'failed'
+
+BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 3600
+
+registry = {}
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying after the given number of attempts"""
+    return min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+
+
+class Task:
+    def __init__(self, func, name, priority, max_attempts, visibility_timeout):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, priority=None, **kwargs):
+        """Run the job later on the configured backend"""
+        backend = getattr(settings, 'JOB_BACKEND', 'local')
+        priority = self.priority if priority is None else priority
+        if backend == 'db':
+            Job.objects.create(name=self.name, args=list(args), kwargs=kwargs, priority=priority,
+                               max_attempts=self.max_attempts, run_after=timezone.now())
+        elif backend == 'local':
+            transaction.on_commit(lambda: local_pool.submit(self, args, kwargs, priority))
+        elif backend == 'immediate':
+            transaction.on_commit(lambda: run_inline(self, args, kwargs))
+        else:
+            raise ValueError(f"Unknown JOB_BACKEND {backend!r}")
+
+    def __repr__(self):
+        return f"<Task {self.name}>"
+
+
+def job(func=None, *, name=None, priority=0, max_attempts=3, visibility_timeout=300):
+    """Register a function as a job; usable as ``@job`` or ``@job(priority=...)``"""
+    def register(func):
+        task = Task(func, name or f"{func.__module__}.{func.__name__}", priority, max_attempts, visibility_timeout)
+        registry[task.name] = task
+        return task
+    return register(func) if func is not None else register
+
+
+def run_inline(task, args, kwargs):
+    for attempt in range(1, task.max_attempts + 1):
+        try:
+            task.func(*args, **kwargs)
+            return True
+        except Exception:
+            logger.exception("Job %s failed (attempt %d/%d)", task.name, attempt, task.max_attempts)
+    return False
+
+
+class LocalPool:
+    """Priority queue served by daemon threads, started on first use"""
+
+    def __init__(self):
+        self.queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._lock = Lock()
+        self._threads = []
+
+    def submit(self, task, args, kwargs, priority, attempt=1):
+        self._start()
+        self.queue.put((-priority, next(self._counter), task, args, kwargs, attempt))
+
+    def _start(self):
+        with self._lock:
+            if not self._threads:
+                for _ in range(getattr(settings, 'JOB_LOCAL_WORKERS', 2)):
+                    thread = Thread(target=self._work, daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            neg_priority, _, task, args, kwargs, attempt = self.queue.get()
+            try:
+                task.func(*args, **kwargs)
+            except Exception:
+                logger.exception("Job %s failed (attempt %d/%d)", task.name, attempt, task.max_attempts)
+                if attempt < task.max_attempts:
+                    retry = Timer(backoff(attempt), self.submit, (task, args, kwargs, -neg_priority, attempt + 1))
+                    retry.daemon = True
+                    retry.start()
+            finally:
+                connection.close()
+
+
+local_pool = LocalPool()
+
+
+class Worker:
+    """Claims and runs Job rows for the 'db' backend"""
+
+    def __init__(self, names=None, batch=10):
+        self.names = names
+        self.batch = batch
+
+    def claim(self):
+        """Claim the next due job, or return None"""
+        now = timezone.now()
+        due = Job.objects.filter(Q(status=QUEUED) | Q(status=RUNNING), run_after__lte=now)
+        if self.names:
+            due = due.filter(name__in=self.names)
+        candidates = due.order_by('-priority', 'run_after', 'id').values_list('id', 'name', 'status', 'run_after')
+        for job_id, name, status, run_after in candidates[:self.batch]:
+            task = registry.get(name)
+            timeout = task.visibility_timeout if task else 300
+            # Only one worker's conditional update can match the row as it was read
+            claimed = Job.objects.filter(id=job_id, status=status, run_after=run_after).update(
+                status=RUNNING, run_after=now + timedelta(seconds=timeout), attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return Job.objects.get(id=job_id)
+        return None
+
+    def execute(self, job_row):
+        task = registry.get(job_row.name)
+        if task is None:
+            self.fail(job_row, f"Unknown job {job_row.name!r}")
+            return False
+        if job_row.attempts > job_row.max_attempts:
+            # Claimed again after a worker died mid-run on its last attempt
+            self.fail(job_row, job_row.last_error or "Visibility timeout expired on the last attempt")
+            return False
+        try:
+            task.func(*job_row.args, **job_row.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning("Job %s #%s failed (attempt %d/%d)", job_row.name, job_row.id,
+                           job_row.attempts, job_row.max_attempts)
+            if job_row.attempts >= job_row.max_attempts:
+                self.fail(job_row, error)
+            else:
+                Job.objects.filter(id=job_row.id).update(
+                    status=QUEUED, last_error=error,
+                    run_after=timezone.now() + timedelta(seconds=backoff(job_row.attempts)),
+                )
+            return False
+        Job.objects.filter(id=job_row.id).delete()
+        return True
+
+    def fail(self, job_row, error):
+        Job.objects.filter(id=job_row.id).update(status=FAILED, last_error=error)
+
+    def run_once(self):
+        """Run one due job; return False when there was nothing to do"""
+        job_row = self.claim()
+        if job_row is None:
+            return False
+        self.execute(job_row)
+        return True
+
+    def drain(self):
+        """Run due jobs until none are left; return how many ran"""
+        count = 0
+        while self.run_once():
+            count += 1
+        return count
@@ -0,0 +1,83 @@
+import os
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db.migrations import Migration, AddIndex
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from posts import index_audit
+from posts.models import QueryFingerprint
+
+
+def human_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Command(BaseCommand):
+    help = ("Recommend composite, partial and covering indexes for the most expensive profiled queries "
+            "(QUERY_PROFILE_SAMPLE_RATE), and list indexes made redundant by others")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help="How many of the costliest fingerprints to read")
+        parser.add_argument('--replay', action='store_true',
+                            help="Show the current plan (EXPLAIN) of each query behind a recommendation")
+        parser.add_argument('--migration', action='store_true',
+                            help="Write a migration adding the recommended indexes to each app")
+
+    def handle(self, *args, **options):
+        if not QueryFingerprint.objects.exists():
+            self.stdout.write("No query fingerprints captured yet; set QUERY_PROFILE_SAMPLE_RATE to profile requests")
+        recommendations = index_audit.audit(limit=options['limit'])
+        if recommendations:
+            self.stdout.write(self.style.MIGRATE_HEADING("Recommended indexes"))
+        for recommendation in recommendations:
+            self.stdout.write(
+                f"{recommendation.model._meta.label}: {recommendation.code()}\n"
+                f"  serves {len(recommendation.fingerprints)} queries, {recommendation.total_ms:.0f}ms profiled, "
+                f"~{human_size(recommendation.estimated_bytes)}"
+            )
+            if options['replay']:
+                for entry in recommendation.fingerprints:
+                    self.stdout.write(f"  {entry.sql[:160]}")
+                    try:
+                        plan = index_audit.explain(entry.sample_sql, entry.sample_params)
+                    except Exception as e:
+                        plan = [f"could not replay: {e}"]
+                    for line in plan:
+                        self.stdout.write(f"    {line}")
+
+        redundant = index_audit.redundant_indexes()
+        if redundant:
+            self.stdout.write(self.style.MIGRATE_HEADING("Redundant indexes"))
+        for table, name, columns, covered_by in redundant:
+            self.stdout.write(f"{table}.{name} ({', '.join(columns)}) is covered by {covered_by}")
+
+        if not recommendations and not redundant:
+            self.stdout.write(self.style.SUCCESS("No index changes recommended"))
+        if options['migration'] and recommendations:
+            self.write_migrations(recommendations)
+
+    def write_migrations(self, recommendations):
+        by_app = defaultdict(list)
+        for recommendation in recommendations:
+            by_app[recommendation.model._meta.app_label].append(recommendation)
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        for app_label, app_recommendations in by_app.items():
+            leaves = loader.graph.leaf_nodes(app_label)
+            number = max((int(name.split('_')[0]) for _, name in leaves if name[:4].isdigit()), default=0) + 1
+            migration = Migration(f"{number:04d}_index_audit", app_label)
+            migration.dependencies = leaves
+            migration.operations = [
+                AddIndex(model_name=r.model._meta.model_name, index=r.index()) for r in app_recommendations
+            ]
+            writer = MigrationWriter(migration)
+            os.makedirs(os.path.dirname(writer.path), exist_ok=True)
+            with open(writer.path, 'w') as f:
+                f.write(writer.as_string())
+            self.stdout.write(self.style.SUCCESS(f"Wrote {writer.path}"))
+        self.stdout.write("Add the same models.Index entries to each model's Meta.indexes so that "
+                          "makemigrations does not remove them again.")
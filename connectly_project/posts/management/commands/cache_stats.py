@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts import cache_metrics
+
+
+class Command(BaseCommand):
+    help = "Show cache hit rates, latency, bytes and hot keys per key prefix, merged across running processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help="How many hot keys to list")
+        parser.add_argument('--json', action='store_true', help="Print the raw summary as JSON")
+
+    def handle(self, *args, **options):
+        summary = cache_metrics.collect(top=options['top'])
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        self.stdout.write(f"Processes reporting: {summary['processes']}")
+        for name, breaker in summary['breakers'].items():
+            if breaker:
+                self.stdout.write(f"  {name}: circuit {breaker['state']}, {breaker['trips']} trips, "
+                                  f"{breaker['skipped_calls']} calls skipped")
+        self.stdout.write(f"{'prefix':<16}{'hits':>9}{'misses':>9}{'ratio':>8}{'errors':>8}"
+                          f"{'avg ms':>9}{'p95 ms':>9}{'avg bytes':>11}")
+        for prefix, row in summary['prefixes'].items():
+            ratio = f"{row['hit_ratio']:.1%}" if row['hit_ratio'] is not None else '-'
+            avg_bytes = (row['bytes'] or {}).get('avg_entry_bytes') or '-'
+            self.stdout.write(f"{prefix or '-':<16}{row['hits']:>9}{row['misses']:>9}{ratio:>8}{row['errors']:>8}"
+                              f"{row['avg_ms'] or 0:>9.2f}{row['p95_ms'] or '-':>9}{avg_bytes:>11}")
+        if summary['hot_keys']:
+            self.stdout.write("Hot keys (count, maximum overcount):")
+            for entry in summary['hot_keys']:
+                self.stdout.write(f"  {entry['count']:>8}  +{entry['error']:<6} {entry['key']}")
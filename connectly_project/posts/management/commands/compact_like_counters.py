@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts import counters
+from posts.models import Post, Like, PostLikeCounterShard
+from posts.utils import BatchProcessor
+
+
+class Command(BaseCommand):
+    help = "Fold sharded like counters into one row per post, optionally recounting from the likes table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recount every post's likes instead of summing its shards")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Worker threads for --rebuild (defaults to the CPU count)")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuilt = BatchProcessor.process_in_parallel(
+                Post.objects.only('pk'), self.rebuild_batch,
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                checkpoint="compact-like-counters",
+            )
+            self.stdout.write(self.style.SUCCESS(f"Recounted likes for {rebuilt} posts"))
+            return
+
+        sharded = (PostLikeCounterShard.objects.values('post_id')
+                   .annotate(shards=Count('id')).filter(shards__gt=1)
+                   .values_list('post_id', flat=True))
+        compacted = 0
+        for post_id in sharded.iterator(chunk_size=options['batch_size']):
+            counters.compact(post_id)
+            compacted += 1
+        self.stdout.write(self.style.SUCCESS(f"Compacted like counters for {compacted} posts"))
+
+    def rebuild_batch(self, posts):
+        post_ids = [post.pk for post in posts]
+        actual = dict.fromkeys(post_ids, 0)
+        actual.update(Like.objects.filter(post_id__in=post_ids)
+                      .values('post_id').annotate(total=Count('id'))
+                      .values_list('post_id', 'total'))
+        for post_id, total in actual.items():
+            counters.compact(post_id, actual=total)
+        return len(post_ids)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exporters
+from posts.tasks import write_export
+
+
+class Command(BaseCommand):
+    help = "Stream one or more datasets to a file (or stdout) as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('datasets', nargs='+', choices=list(exporters.DATASETS))
+        parser.add_argument('--format', dest='fmt', choices=exporters.FORMATS, default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help="Compress the output")
+        parser.add_argument('--output', help="File to write (defaults to stdout)")
+        parser.add_argument('--user-id', type=int, default=None,
+                            help="Only export rows belonging to this user")
+        parser.add_argument('--defer', action='store_true',
+                            help="Queue the export as a background job (requires --output)")
+
+    def handle(self, *args, **options):
+        try:
+            stream = exporters.export_stream(options['datasets'], options['fmt'],
+                                             user_id=options['user_id'], compress=options['gzip'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['defer']:
+            if not options['output']:
+                raise CommandError("--defer needs --output")
+            write_export.delay(options['datasets'], options['output'], fmt=options['fmt'],
+                               user_id=options['user_id'], compress=options['gzip'])
+            self.stderr.write(f"Queued export to {options['output']}")
+            return
+
+        if not options['output']:
+            # self.stdout expects text; write bytes straight to the underlying buffer
+            out = getattr(self.stdout._out, 'buffer', None)
+            if out is None:
+                for chunk in stream:
+                    self.stdout.write(chunk.decode('utf-8', errors='replace'), ending='')
+                return
+            for chunk in stream:
+                out.write(chunk)
+            out.flush()
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as f:
+            for chunk in stream:
+                f.write(chunk)
+                written += len(chunk)
+        self.stderr.write(f"Wrote {written} bytes to {options['output']}")
@@ -0,0 +1,65 @@
+import random
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from rest_framework.exceptions import NotFound
+
+from posts import warming
+from posts import windows
+from posts.pagination import page_params
+from users.models import CustomUser
+
+# (page, page_size) query strings as clients send them, roughly weighted by how often
+REQUEST_MIX = [
+    ('1', '10'), ('1', '10'), ('1', '10'), ('1', '010'), ('1', '20'), ('1', '25'),
+    ('1', '11'), ('2', '10'), ('2', '20'), ('3', '10'), ('1', '50'), ('2', '15'),
+]
+
+
+class Command(BaseCommand):
+    help = ("Replay a mix of feed page requests and compare the hit rate of per-page cache keys "
+            "with that of the cached feed blocks")
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int,
+                            help="Users to replay (defaults to the recently active ones)")
+        parser.add_argument('--users', type=int, default=20, help="How many users when none are given")
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or warming.tracker.recent(options['users'])
+        if not user_ids:
+            user_ids = list(CustomUser.objects.order_by('id').values_list('id', flat=True)[:options['users']])
+        users = {user.id: user for user in CustomUser.objects.filter(id__in=user_ids)}
+        if not users:
+            self.stdout.write("No users to replay")
+            return
+
+        rng = random.Random(options['seed'])
+        requests = [(rng.choice(list(users)), *rng.choice(REQUEST_MIX)) for _ in range(options['requests'])]
+
+        # Per-page keys: one entry per raw (user, page, page_size), as the feeds used to be cached
+        seen = set()
+        legacy_hits = 0
+        for request in requests:
+            legacy_hits += request in seen
+            seen.add(request)
+
+        before = windows.newsfeed_window.stats()
+        for user_id, page, page_size in requests:
+            query = SimpleNamespace(query_params=QueryDict(f"page={page}&page_size={page_size}"))
+            try:
+                windows.newsfeed_window.page(users[user_id], *page_params(query))
+            except NotFound:
+                pass  # past the end of this user's feed
+        after = windows.newsfeed_window.stats()
+        hits = after['hits'] - before['hits']
+        lookups = hits + after['misses'] - before['misses']
+
+        total = len(requests)
+        self.stdout.write(f"{total} requests from {len(users)} users")
+        self.stdout.write(f"  per-page keys: {legacy_hits} hits, {legacy_hits / total:.1%} hit rate")
+        self.stdout.write(f"  feed blocks:   {hits} of {lookups} block reads hit, "
+                          f"{hits / lookups if lookups else 0:.1%} hit rate")
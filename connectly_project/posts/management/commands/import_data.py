@@ -0,0 +1,62 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importers
+from users import hashing
+
+
+class Command(BaseCommand):
+    help = "Bulk import users, posts, follows or likes from NDJSON or CSV (import users first, then posts)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(importers.IMPORTERS))
+        parser.add_argument('path', help="Input file (.ndjson, .csv, optionally .gz) or - for stdin")
+        parser.add_argument('--format', dest='fmt', choices=importers.FORMATS, default=None,
+                            help="Input format (guessed from the file name by default)")
+        parser.add_argument('--source', default='default',
+                            help="Name of the source system; ids are translated per source")
+        parser.add_argument('--batch-size', type=int, default=importers.BATCH_SIZE)
+        parser.add_argument('--hash-workers', type=int, default=None,
+                            help="Processes for password hashing (defaults to the CPU count; "
+                                 "0 uses the shared login pool)")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['fmt'] or importers.guess_format(path)
+        if path != '-' and not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+
+        pool = None
+        workers = options['hash_workers']
+        if options['dataset'] == 'users' and workers != 0:
+            pool = hashing.make_pool(workers or os.cpu_count() or 1)
+
+        importer = importers.IMPORTERS[options['dataset']](
+            source=options['source'], batch_size=options['batch_size'], hash_pool=pool
+        )
+        start = time.monotonic()
+
+        def progress(result):
+            elapsed = time.monotonic() - start
+            self.stdout.write(
+                f"  {result.read} read, {result.created} created in {elapsed:.1f}s "
+                f"({result.read / max(elapsed, 1e-6):.0f} rows/s)"
+            )
+
+        try:
+            with importers.open_input(path) as stream:
+                result = importer.run(importers.read_rows(stream, fmt), progress=progress)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        for line_number, message in result.errors:
+            self.stderr.write(f"line {line_number}: {message}")
+        if result.rejected > len(result.errors):
+            self.stderr.write(f"... and {result.rejected - len(result.errors)} more rejected rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['dataset']}: {result.created} created, {result.skipped} skipped, "
+            f"{result.rejected} rejected of {result.read} rows"
+        ))
@@ -0,0 +1,46 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Run deferred jobs stored by the 'db' job backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Worker threads")
+        parser.add_argument('--once', action='store_true',
+                            help="Run the jobs that are due now, then exit")
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help="Seconds to wait when no job is due")
+        parser.add_argument('--name', action='append', dest='names',
+                            help="Only run jobs with this name (repeatable)")
+
+    def handle(self, *args, **options):
+        worker = Worker(names=options['names'])
+        if options['once']:
+            ran = worker.drain()
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} jobs"))
+            return
+
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+        def loop():
+            try:
+                while not stop.is_set():
+                    if not worker.run_once():
+                        stop.wait(options['poll'])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=loop) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Running jobs with {len(threads)} workers; Ctrl+C to stop after the current jobs")
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import warming
+
+
+class Command(BaseCommand):
+    help = "Precompute the first feed blocks of recently active users (e.g. right after a deploy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int,
+                            help="Users to warm (defaults to the recently active ones)")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Warm at most this many of the most recently active users")
+        parser.add_argument('--refresh', action='store_true',
+                            help="Recompute blocks that are already cached")
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--rate', type=float, default=None, help="Users per second")
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or warming.tracker.recent(options['limit'])
+        computed = warming.warm(user_ids, refresh=options['refresh'],
+                                workers=options['workers'], rate=options['rate'])
+        self.stdout.write(self.style.SUCCESS(f"Warmed {computed} blocks for {len(user_ids)} users"))
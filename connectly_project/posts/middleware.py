@@ -1,7 +1,10 @@
 from django.core.exceptions import PermissionDenied
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.cache import patch_vary_headers
 import time
 import logging
+from . import compression
+from . import profiling
 
 logger = logging.getLogger('api.performance')
 
@@ -24,11 +27,18 @@ class PerformanceMiddleware:
         # Start timer
         start_time = time.time()
         
-        # Process the request
-        response = self.get_response(request)
+        # Process the request, recording query fingerprints for a sample of API requests
+        profiled = request.path.startswith('/api/') and profiling.sampled()
+        if profiled:
+            with profiling.profiler.profile():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
         
         # Calculate request duration
         duration = time.time() - start_time
+        if profiled:
+            profiling.profiler.flush_if_due()
         
         # Log slow requests (over 0.5 seconds)
         if duration > 0.5 and request.path.startswith('/api/'):
@@ -42,6 +52,45 @@ class PerformanceMiddleware:
         
         return response
 
+class CompressionMiddleware:
+    """
+    Compress responses above COMPRESSION_MIN_SIZE with the best encoding the
+    client accepts (zstd, br or gzip). Responses that carry precompressed
+    variants are served from those instead of being compressed again.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        
+        if (response.streaming or response.has_header('Content-Encoding')
+                or response.status_code != 200
+                or not compression.is_compressible(response.get('Content-Type'))):
+            return response
+        
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < compression.min_size():
+            return response
+        
+        encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        
+        precompressed = getattr(response, 'precompressed', None) or {}
+        content = precompressed.get(encoding) or compression.compress(response.content, encoding)
+        if len(content) >= len(response.content):
+            return response
+        
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # The compressed body is a different representation; keep conditional requests working
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
 class DisableCSRFMiddleware:
     """Completely disable CSRF for all requests - USE FOR TESTING ONLY"""
     
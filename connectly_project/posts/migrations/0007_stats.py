@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:24
+
+from django.db import migrations, models
+
+
+def seed_totals(apps, schema_editor):
+    """Start the running totals from the current row counts"""
+    StatCounter = apps.get_model("posts", "StatCounter")
+    sources = {
+        "users": apps.get_model("users", "CustomUser"),
+        "posts": apps.get_model("posts", "Post"),
+        "comments": apps.get_model("posts", "Comment"),
+        "likes": apps.get_model("posts", "Like"),
+    }
+    for name, model in sources.items():
+        StatCounter.objects.update_or_create(name=name, defaults={"value": model.objects.count()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0006_alter_like_options"),
+        ("users", "0003_customuser_role_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StatBucket",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50)),
+                ("granularity", models.CharField(choices=[("hour", "Hour"), ("day", "Day")], max_length=4)),
+                ("bucket_start", models.DateTimeField()),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("name", "granularity", "bucket_start")},
+            },
+        ),
+        migrations.RunPython(seed_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0007_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BatchCheckpoint",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=100)),
+                ("shard", models.PositiveIntegerField()),
+                ("lower_pk", models.BigIntegerField()),
+                ("upper_pk", models.BigIntegerField()),
+                ("last_pk", models.BigIntegerField(blank=True, null=True)),
+                ("processed", models.BigIntegerField(default=0)),
+                ("done", models.BooleanField(default=False)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "unique_together": {("name", "shard")},
+            },
+        ),
+    ]
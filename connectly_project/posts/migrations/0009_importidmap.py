@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_batchcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportIdMap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(max_length=100)),
+                ('source_id', models.CharField(max_length=64)),
+                ('target_id', models.BigIntegerField()),
+            ],
+            options={
+                'unique_together': {('namespace', 'source_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_counts(apps, schema_editor):
+    """Seed shard 0 of every liked post with its current like count"""
+    Like = apps.get_model('posts', 'Like')
+    PostLikeCounterShard = apps.get_model('posts', 'PostLikeCounterShard')
+    counts = Like.objects.values('post_id').annotate(total=models.Count('id')).values_list('post_id', 'total')
+    PostLikeCounterShard.objects.bulk_create(
+        (PostLikeCounterShard(post_id=post_id, shard=0, count=total) for post_id, total in counts.iterator()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_importidmap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostLikeCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='like_counter_shards', to='posts.post')),
+            ],
+            options={
+                'unique_together': {('post', 'shard')},
+            },
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:17
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, unique=True)),
+                ('sql', models.TextField()),
+                ('sample_sql', models.TextField()),
+                ('sample_params', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('calls', models.BigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('last_seen', models.DateTimeField()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='posts_comme_post_id_06cfd5_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='posts_comme_author__a503ad_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='posts_follo_followe_5565c2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='posts_follo_followe_48a380_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='like',
+            name='posts_like_post_id_db9889_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='like',
+            name='posts_like_user_id_842d1b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_post_author__19d68b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_post_privacy_cbb391_idx',
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.post'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='follower',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='likes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='recipient',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='postlikecountershard',
+            name='post',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='like_counter_shards', to='posts.post'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_at'], name='posts_comme_post_id_7929fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created_at'], name='posts_post_author__f8ea20_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['privacy', '-created_at'], name='posts_post_privacy_37b119_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def drop_sample_params(apps, schema_editor):
+    """Parameters stored before redaction may hold session keys and emails"""
+    QueryFingerprint = apps.get_model('posts', 'QueryFingerprint')
+    QueryFingerprint.objects.exclude(sample_params=None).update(sample_params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_sample_params, migrations.RunPython.noop),
+    ]
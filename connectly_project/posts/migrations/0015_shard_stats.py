@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_redact_sample_params'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='statbucket',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='statbucket',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='statcounter',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='statcounter',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='statbucket',
+            unique_together={('name', 'granularity', 'bucket_start', 'shard')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='statcounter',
+            unique_together={('name', 'shard')},
+        ),
+    ]
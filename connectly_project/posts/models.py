@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from users.models import CustomUser
 
 class Post(models.Model):
@@ -9,7 +10,8 @@ class Post(models.Model):
         ('private', 'Private'),
     ]
 
-    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Indexed by (author, created_at) below instead of on its own
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     content = models.TextField()
     privacy = models.CharField(max_length=10, choices=PRIVACY_CHOICES, default='public')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -20,15 +22,17 @@ class Post(models.Model):
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['author']),
+            # A user's posts, newest first (profiles, newsfeed)
+            models.Index(fields=['author', '-created_at']),
             models.Index(fields=['created_at']),
-            models.Index(fields=['privacy']),
+            # Public posts, newest first (general feed)
+            models.Index(fields=['privacy', '-created_at']),
         ]
 
 class Comment(models.Model):
     content = models.TextField()
     author = models.ForeignKey(CustomUser, related_name='comments', on_delete=models.CASCADE)
-    post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     parent = models.ForeignKey('self', null=True, blank=True, related_name='replies', on_delete=models.CASCADE)
     
@@ -38,37 +42,191 @@ class Comment(models.Model):
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['post']),
-            models.Index(fields=['author']),
+            # A post's comments, newest first; also serves lookups by post
+            models.Index(fields=['post', '-created_at']),
             models.Index(fields=['created_at']),
         ]
 
 class Like(models.Model):
-    user = models.ForeignKey(CustomUser, related_name='likes', on_delete=models.CASCADE)
+    # Lookups by user use the unique (user, post) index
+    user = models.ForeignKey(CustomUser, related_name='likes', on_delete=models.CASCADE, db_index=False)
     post = models.ForeignKey(Post, related_name='likes', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         unique_together = ('user', 'post')
-        indexes = [
-            models.Index(fields=['post']),
-            models.Index(fields=['user']),
-        ]
     
     def __str__(self):
         return f"{self.user.username} likes {self.post}"
 
 class Follow(models.Model):
-    follower = models.ForeignKey(CustomUser, related_name='following', on_delete=models.CASCADE)
+    # Lookups by follower use the unique (follower, followed) index
+    follower = models.ForeignKey(CustomUser, related_name='following', on_delete=models.CASCADE, db_index=False)
     followed = models.ForeignKey(CustomUser, related_name='followers', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         unique_together = ('follower', 'followed')
+    
+    def __str__(self):
+        return f"{self.follower.username} follows {self.followed.username}"
+
+class StatCounter(models.Model):
+    """One shard of a running total maintained incrementally (see posts.stats)"""
+    name = models.CharField(max_length=50)
+    shard = models.PositiveSmallIntegerField(default=0)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('name', 'shard')
+    
+    def __str__(self):
+        return f"{self.name}#{self.shard} = {self.value}"
+
+class StatBucket(models.Model):
+    """Time-bucketed counter, e.g. posts per hour or active users per day"""
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    name = models.CharField(max_length=50)
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    shard = models.PositiveSmallIntegerField(default=0)
+    value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('name', 'granularity', 'bucket_start', 'shard')
+    
+    def __str__(self):
+        return f"{self.name}/{self.granularity} @ {self.bucket_start:%Y-%m-%d %H:%M}#{self.shard} = {self.value}"
+
+class BatchCheckpoint(models.Model):
+    """Resume point for one pk-range shard of a BatchProcessor run"""
+    name = models.CharField(max_length=100)
+    shard = models.PositiveIntegerField()
+    lower_pk = models.BigIntegerField()
+    upper_pk = models.BigIntegerField()
+    last_pk = models.BigIntegerField(null=True, blank=True)
+    processed = models.BigIntegerField(default=0)
+    done = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('name', 'shard')
+    
+    def __str__(self):
+        return f"{self.name}#{self.shard} at {self.last_pk} ({self.processed} processed)"
+
+class ImportIdMap(models.Model):
+    """Translation from an id in an imported source to the row created for it"""
+    namespace = models.CharField(max_length=100)
+    source_id = models.CharField(max_length=64)
+    target_id = models.BigIntegerField()
+    
+    class Meta:
+        unique_together = ('namespace', 'source_id')
+    
+    def __str__(self):
+        return f"{self.namespace}:{self.source_id} -> {self.target_id}"
+
+class PostLikeCounterShard(models.Model):
+    """One of several rows whose sum is a post's like count (see posts.counters)"""
+    # Lookups by post use the unique (post, shard) index
+    post = models.ForeignKey(Post, related_name='like_counter_shards', on_delete=models.CASCADE, db_index=False)
+    shard = models.PositiveSmallIntegerField()
+    count = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('post', 'shard')
+    
+    def __str__(self):
+        return f"post {self.post_id} shard {self.shard} = {self.count}"
+
+class Notification(models.Model):
+    """
+    One inbox entry. Unread likes and comments on the same post, and unread
+    follows, are aggregated into a single entry (see posts.notifications).
+    """
+    VERB_CHOICES = [
+        ('like', 'Like'),
+        ('comment', 'Comment'),
+        ('follow', 'Follow'),
+    ]
+    
+    # Indexed by the (recipient, ...) composites below
+    recipient = models.ForeignKey(CustomUser, related_name='notifications', on_delete=models.CASCADE, db_index=False)
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES)
+    post = models.ForeignKey(Post, null=True, blank=True, related_name='+', on_delete=models.CASCADE)
+    # Most recent actor, and the most recent distinct actors newest first
+    actor = models.ForeignKey(CustomUser, null=True, related_name='+', on_delete=models.SET_NULL)
+    actor_ids = models.JSONField(default=list)
+    actor_count = models.PositiveIntegerField(default=1)
+    read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField()
+    
+    class Meta:
         indexes = [
-            models.Index(fields=['follower']),
-            models.Index(fields=['followed']),
+            models.Index(fields=['recipient', '-updated_at', '-id']),
+            models.Index(fields=['recipient', 'read', 'verb']),
         ]
     
     def __str__(self):
-        return f"{self.follower.username} follows {self.followed.username}"
+        return f"{self.verb} x{self.actor_count} for {self.recipient_id}"
+
+class InboxCounter(models.Model):
+    """Number of unread notifications for a user, kept up to date on write"""
+    user = models.OneToOneField(CustomUser, primary_key=True, related_name='inbox_counter', on_delete=models.CASCADE)
+    unread = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+class Job(models.Model):
+    """A unit of deferred work for the database job backend (see posts.jobs)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Queued: earliest start (retry backoff). Running: when the claim expires and another worker may retry it
+    run_after = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} [{self.status}, attempt {self.attempts}/{self.max_attempts}]"
+
+class QueryFingerprint(models.Model):
+    """
+    A query shape seen by the query profiler (see posts.profiling): its SQL
+    with parameters left out, one example with redacted parameters to replay,
+    and how often and how long it ran.
+    """
+    fingerprint = models.CharField(max_length=32, unique=True)
+    sql = models.TextField()
+    sample_sql = models.TextField()
+    sample_params = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    calls = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    last_seen = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.fingerprint}: {self.calls} calls, {self.total_ms:.0f}ms"
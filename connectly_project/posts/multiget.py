@@ -0,0 +1,68 @@
+"""
+Batch reads by id (``GET /posts/?ids=1,2,3``, ``GET /users/?ids=...``).
+
+Objects come from the per-object caches in posts.object_cache: a batch reads
+every key with one ``get_many``, loads the misses with one ``id__in`` query
+and stores them with one ``set_many``. Visibility rules are then applied to
+the whole batch in memory.
+"""
+from rest_framework import serializers
+
+from .object_cache import post_objects, user_objects
+from .permissions import can_view_post
+from .serializers import UserSerializer
+
+MAX_IDS = 100
+
+
+def parse_ids(value, limit=MAX_IDS):
+    """Parse "1,2,3" into a list of unique ids in request order"""
+    ids = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            object_id = int(part)
+        except ValueError:
+            raise serializers.ValidationError({'ids': [f"Invalid id: {part!r}"]})
+        if object_id not in ids:
+            ids.append(object_id)
+    if not ids:
+        raise serializers.ValidationError({'ids': ["Provide at least one id"]})
+    if len(ids) > limit:
+        raise serializers.ValidationError({'ids': [f"At most {limit} ids can be requested at once"]})
+    return ids
+
+
+def batch_response(ids, found):
+    """Results in request order; ids that are missing or hidden are listed without saying which"""
+    return {
+        'results': [found[object_id] for object_id in ids if object_id in found],
+        'missing': [object_id for object_id in ids if object_id not in found],
+    }
+
+
+def get_posts(user, ids, fields=None):
+    found = post_objects.get_many(ids)
+    visible = {
+        post_id: payload for post_id, payload in found.items()
+        if can_view_post(user, payload['privacy'], payload['author'])
+    }
+    if fields is not None:
+        keep = set(fields) | {'id'}
+        visible = {
+            post_id: {name: value for name, value in payload.items() if name in keep}
+            for post_id, payload in visible.items()
+        }
+    return batch_response(ids, visible)
+
+
+def get_users(ids):
+    # The cache holds the detail payload; list the same fields as the user list
+    listed = [name for name in UserSerializer.Meta.fields if name != 'password']
+    found = {
+        user_id: {name: payload[name] for name in listed if name in payload}
+        for user_id, payload in user_objects.get_many(ids).items()
+    }
+    return batch_response(ids, found)
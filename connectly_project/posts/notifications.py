@@ -0,0 +1,197 @@
+"""
+Notification inbox: likes, comments and follows addressed to a user.
+
+The write paths only call ``notify``, which queues the event in memory after
+the transaction commits; nothing is read or written on the request. A
+background timer flushes the queue every NOTIFICATION_FLUSH_DELAY seconds (or
+as soon as NOTIFICATION_BATCH_SIZE events are waiting) and writes the whole
+batch at once:
+
+- one query resolves the recipients of like/comment events (post authors),
+- unread entries for the same (recipient, verb, post) absorb new events, so
+  a burst becomes "alice and 41 others liked your post",
+- new entries are inserted with one bulk_create, merged ones updated with
+  one bulk_update,
+- each recipient's InboxCounter gets ``unread = unread + n`` in one UPDATE
+  per distinct n.
+
+Actors are deduplicated against the newest MAX_ACTORS actors of an entry, so
+liking, unliking and liking again does not count twice. Unlikes and
+unfollows do not retract notifications. Deleting a post cascades to its
+entries; the unread ones are taken off their recipients' counters first.
+Events still queued when a process dies are lost.
+"""
+import atexit
+import logging
+from collections import OrderedDict, defaultdict
+from threading import Lock, Thread, Timer
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Notification, InboxCounter, Post
+
+logger = logging.getLogger(__name__)
+
+LIKE = 'like'
+COMMENT = 'comment'
+FOLLOW = 'follow'
+
+# Distinct actors remembered per entry, for deduplication and display
+MAX_ACTORS = 50
+
+FLUSH_DELAY = 1.0
+BATCH_SIZE = 500
+
+
+def notify(verb, actor_id, recipient_id=None, post_id=None):
+    """
+    Queue a notification once the current transaction commits. Likes and
+    comments may leave recipient_id out; the post's author is looked up when
+    the batch is written.
+    """
+    event = (verb, actor_id, recipient_id, post_id, timezone.now())
+    transaction.on_commit(lambda: buffer.add(event))
+
+
+def write(events):
+    """Aggregate and store a batch of events; return the number of entries created"""
+    missing = {post_id for verb, _, recipient_id, post_id, _ in events if recipient_id is None and post_id}
+    authors = dict(Post.objects.filter(id__in=missing).values_list('id', 'author_id')) if missing else {}
+
+    # (recipient, verb, post) -> [actor ids oldest first, latest time]
+    groups = OrderedDict()
+    for verb, actor_id, recipient_id, post_id, when in events:
+        recipient_id = recipient_id if recipient_id is not None else authors.get(post_id)
+        if recipient_id is None or recipient_id == actor_id:
+            continue
+        group = groups.setdefault((recipient_id, verb, post_id if verb != FOLLOW else None), [[], when])
+        if actor_id in group[0]:
+            group[0].remove(actor_id)
+        group[0].append(actor_id)
+        group[1] = max(group[1], when)
+    if not groups:
+        return 0
+
+    with transaction.atomic():
+        recipients = {recipient_id for recipient_id, _, _ in groups}
+        posts = {post_id for _, _, post_id in groups if post_id is not None}
+        existing = {
+            (entry.recipient_id, entry.verb, entry.post_id): entry
+            for entry in Notification.objects.filter(
+                Q(post_id__in=posts) | Q(post__isnull=True),
+                recipient_id__in=recipients, read=False, verb__in={verb for _, verb, _ in groups},
+            ).order_by('updated_at')
+        }
+
+        created, updated = [], []
+        for key, (actors, when) in groups.items():
+            newest_first = actors[::-1]
+            entry = existing.get(key)
+            if entry is None:
+                recipient_id, verb, post_id = key
+                created.append(Notification(
+                    recipient_id=recipient_id, verb=verb, post_id=post_id, actor_id=newest_first[0],
+                    actor_ids=newest_first[:MAX_ACTORS], actor_count=len(actors), updated_at=when,
+                ))
+                continue
+            fresh = [actor_id for actor_id in newest_first if actor_id not in entry.actor_ids]
+            entry.actor_count += len(fresh)
+            entry.actor_ids = (newest_first + [a for a in entry.actor_ids if a not in newest_first])[:MAX_ACTORS]
+            entry.actor_id = newest_first[0]
+            entry.updated_at = max(entry.updated_at, when)
+            updated.append(entry)
+
+        Notification.objects.bulk_create(created)
+        Notification.objects.bulk_update(updated, ['actor', 'actor_ids', 'actor_count', 'updated_at'])
+
+        new_unread = defaultdict(int)
+        for entry in created:
+            new_unread[entry.recipient_id] += 1
+        add_unread(new_unread)
+    return len(created)
+
+
+def add_unread(deltas):
+    """Apply {user_id: delta} to the unread counters"""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    InboxCounter.objects.bulk_create([InboxCounter(user_id=user_id) for user_id in deltas], ignore_conflicts=True)
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        InboxCounter.objects.filter(user_id__in=user_ids).update(unread=F('unread') + delta)
+
+
+def forget_post(post_id):
+    """Take a post's unread entries off their recipients' counters before the entries are deleted"""
+    unread = (Notification.objects.filter(post_id=post_id, read=False)
+              .values('recipient_id').annotate(n=Count('id')).values_list('recipient_id', 'n'))
+    add_unread({recipient_id: -n for recipient_id, n in unread})
+
+
+def unread_count(user_id):
+    return InboxCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first() or 0
+
+
+def mark_read(user_id, ids=None):
+    """Mark some (or all) of a user's notifications read; return how many changed"""
+    entries = Notification.objects.filter(recipient_id=user_id, read=False)
+    if ids is not None:
+        entries = entries.filter(id__in=ids)
+    with transaction.atomic():
+        marked = entries.update(read=True)
+        add_unread({user_id: -marked})
+    return marked
+
+
+class NotificationBuffer:
+    """Events waiting to be written, flushed by a timer thread"""
+
+    def __init__(self):
+        self.events = []
+        self._lock = Lock()
+        self._timer = None
+
+    def add(self, event):
+        delay = getattr(settings, 'NOTIFICATION_FLUSH_DELAY', FLUSH_DELAY)
+        if not delay:
+            # No background writer configured: write now
+            write([event])
+            return
+        with self._lock:
+            self.events.append(event)
+            full = len(self.events) >= getattr(settings, 'NOTIFICATION_BATCH_SIZE', BATCH_SIZE)
+            if full:
+                Thread(target=self._flush_in_background, daemon=True).start()
+            elif self._timer is None:
+                self._timer = Timer(delay, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write every queued event; return how many were written"""
+        with self._lock:
+            events, self.events = self.events, []
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        if events:
+            write(events)
+        return len(events)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not write notifications")
+        finally:
+            connection.close()
+
+
+buffer = NotificationBuffer()
+atexit.register(buffer.flush)
@@ -0,0 +1,113 @@
+"""
+Write-through cache of serialized posts and users.
+
+Detail views (PostDetailView, UserProfileView, CurrentUserView) and the
+``?ids=`` batch reads are answered from one cache entry per object
+(CacheHelper.get_post_key / get_user_key). Misses are loaded with a single
+``id__in`` query and stored with ``set_many``.
+
+Saves and deletes go through model signals (see posts.signals): the entry is
+dropped at once and, after the transaction commits, a save writes the fresh
+payload back so the next read is a hit. Post payloads include the author's
+username, which is refreshed when the post is saved or its entry expires.
+"""
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+
+from users.models import CustomUser
+from users.serializers import UserDetailSerializer
+from .models import Post
+from .serializers import PostSerializer
+from .utils import CacheHelper
+
+
+class ObjectCache:
+    def __init__(self, name, model, key_func, serializer_class, select_related=()):
+        self.name = name
+        self.model = model
+        self.key_func = key_func
+        self.serializer_class = serializer_class
+        self.select_related = select_related
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def timeout(self):
+        return getattr(settings, 'OBJECT_CACHE_TTL', 900)
+
+    def serialize(self, instance):
+        return self.serializer_class(instance).data
+
+    def load(self, ids):
+        queryset = self.model.objects.filter(pk__in=ids)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        return {instance.pk: self.serialize(instance) for instance in queryset}
+
+    def get_many(self, ids):
+        """Return {id: payload} for the ids that exist, loading misses in one query"""
+        keys = {self.key_func(object_id): object_id for object_id in ids}
+        try:
+            cached = CacheHelper.get_many(list(keys))
+        except Exception:
+            cached = {}
+        found = {keys[key]: payload for key, payload in cached.items()}
+
+        missing = [object_id for object_id in ids if object_id not in found]
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            loaded = self.load(missing)
+            found.update(loaded)
+            try:
+                CacheHelper.set_many({self.key_func(object_id): payload for object_id, payload in loaded.items()},
+                                     timeout=self.timeout())
+            except Exception:
+                pass
+        return found
+
+    def get(self, object_id):
+        """Return the payload for one object, or None if it does not exist"""
+        return self.get_many([object_id]).get(object_id)
+
+    def write(self, instance):
+        """Store the current state of a saved instance"""
+        try:
+            CacheHelper.set(self.key_func(instance.pk), self.serialize(instance), timeout=self.timeout())
+        except Exception:
+            pass
+
+    def delete(self, object_id):
+        try:
+            CacheHelper.delete(self.key_func(object_id))
+        except Exception:
+            pass
+
+    def saved(self, instance):
+        """Drop the entry now and write it back once the change is committed"""
+        self.delete(instance.pk)
+        transaction.on_commit(lambda: self.write(instance))
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+
+
+post_objects = ObjectCache('posts', Post, CacheHelper.get_post_key, PostSerializer, select_related=('author',))
+user_objects = ObjectCache('users', CustomUser, CacheHelper.get_user_key, UserDetailSerializer)
+
+OBJECT_CACHES = (post_objects, user_objects)
+
+
+def stats():
+    """Hit ratios of every object cache in this process"""
+    return {object_cache.name: object_cache.stats() for object_cache in OBJECT_CACHES}
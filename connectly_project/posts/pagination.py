@@ -0,0 +1,224 @@
+from collections import OrderedDict
+import hashlib
+from math import ceil
+
+from django.conf import settings
+from django.core.paginator import Paginator, Page, EmptyPage, PageNotAnInteger
+from django.db import connection
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from .circuit import cache
+
+
+def planner_row_estimate(model):
+    """
+    Return the planner's row estimate for a model's table, or None if the
+    database has no statistics for it (sqlite needs ANALYZE to fill sqlite_stat1)
+    """
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+                estimates = [int(row[0].split()[0]) for row in cursor.fetchall() if row[0]]
+                return max(estimates) if estimates else None
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+    except Exception:
+        return None
+    return None
+
+
+def cached_count(queryset, timeout=None):
+    """COUNT(*) a queryset, reusing the result for identical queries for a short while"""
+    timeout = timeout or getattr(settings, 'PAGINATION_COUNT_CACHE_TTL', 60)
+    sql, params = queryset.query.sql_with_params()
+    key = "count:" + hashlib.md5(f"{sql}|{params!r}".encode()).hexdigest()
+    try:
+        count = cache.get(key)
+    except Exception:
+        count = None
+    if count is None:
+        count = queryset.count()
+        try:
+            cache.set(key, count, timeout=timeout)
+        except Exception:
+            pass
+    return count
+
+
+def estimated_count(queryset):
+    """
+    Cheapest usable count for a queryset: the maintained stats total or planner
+    statistics for unfiltered tables, otherwise a cached exact count
+    """
+    if not queryset.query.where and not queryset.query.distinct:
+        from .stats import total_for_model
+        maintained = total_for_model(queryset.model)
+        if maintained is not None:
+            return maintained
+        estimate = planner_row_estimate(queryset.model)
+        if estimate is not None and estimate >= getattr(settings, 'PAGINATION_ESTIMATE_MIN_ROWS', 10000):
+            return estimate
+    return cached_count(queryset)
+
+
+class CountlessPage(Page):
+    has_more = False
+
+    def has_next(self):
+        return self.has_more
+
+
+class CountlessPaginator(Paginator):
+    """
+    Paginator that never counts. It fetches one row past the page to learn
+    whether a next page exists.
+    """
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        page = CountlessPage(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    @property
+    def count(self):
+        return None
+
+    @property
+    def num_pages(self):
+        # Unknown; 0 keeps DRF from rendering page controls
+        return 0
+
+
+class CountingPaginator(CountlessPaginator):
+    """
+    Paginator whose count comes from a cheaper strategy than COUNT(*) per
+    request. That count may be stale or estimated, so pages are fetched as
+    CountlessPaginator does and the count is only reported: it never turns a
+    real page into a 404 or cuts rows off the last one. A count lower than
+    the rows already seen is raised to match them.
+    """
+    count_mode = 'cached'
+
+    def page(self, number):
+        page = super().page(number)
+        seen = (page.number - 1) * self.per_page + len(page.object_list) + page.has_more
+        if self.count < seen:
+            self.count = seen
+        return page
+
+    @cached_property
+    def count(self):
+        if self.count_mode == 'estimated':
+            return estimated_count(self.object_list)
+        return cached_count(self.object_list)
+
+    @property
+    def num_pages(self):
+        if self.count == 0 and not self.allow_empty_first_page:
+            return 0
+        return ceil(max(1, self.count - self.orphans) / self.per_page)
+
+
+class CachedCountPaginator(CountingPaginator):
+    count_mode = 'cached'
+
+
+class EstimatedCountPaginator(CountingPaginator):
+    count_mode = 'estimated'
+
+
+class StandardResultsPagination(PageNumberPagination):
+    """
+    Page number pagination with selectable count strategies.
+
+    count_mode controls how ``count``/``total_pages`` are computed:
+    'exact' runs COUNT(*), 'cached' reuses a recent COUNT(*) of the same query,
+    'estimated' uses maintained totals or planner statistics for unfiltered tables.
+    Clients can pass ``exact=false`` to skip counting altogether; ``count`` and
+    ``total_pages`` are then left out of the response.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_mode = 'exact'
+    count_query_param = 'exact'
+    paginators = {
+        'exact': Paginator,
+        'cached': CachedCountPaginator,
+        'estimated': EstimatedCountPaginator,
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.include_count = request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0', 'no')
+        if self.include_count:
+            self.django_paginator_class = self.paginators[self.count_mode]
+        else:
+            self.django_paginator_class = CountlessPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        fields = []
+        if self.include_count:
+            fields.append(('count', self.page.paginator.count))
+        fields += [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('current_page', self.page.number),
+        ]
+        if self.include_count:
+            fields.append(('total_pages', self.page.paginator.num_pages))
+        fields.append(('results', data))
+        return Response(OrderedDict(fields))
+
+
+def page_params(request, pagination_class=StandardResultsPagination):
+    """
+    Canonical (page, page_size) ints for views that paginate cached data
+    themselves. ``page_size=010`` and ``page_size=10`` are the same page;
+    sizes are clamped to the paginator's max_page_size and anything
+    unparsable falls back to its default, as DRF does. Invalid pages are 404.
+    """
+    try:
+        page = int(request.query_params.get('page', 1))
+    except (TypeError, ValueError):
+        raise NotFound("Invalid page.")
+    if page < 1:
+        raise NotFound("Invalid page.")
+    return page, pagination_class().get_page_size(request)
+
+
+class CachedCountPagination(StandardResultsPagination):
+    count_mode = 'cached'
+
+
+class EstimatedCountPagination(StandardResultsPagination):
+    count_mode = 'estimated'
+
+
+class InboxPagination(CursorPagination):
+    """Keyset paging over a user's notifications, most recently active first"""
+    ordering = ('-updated_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
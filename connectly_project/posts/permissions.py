@@ -1,5 +1,21 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+def can_view_post(user, privacy, author_id):
+    """
+    Whether user may see a post with the given privacy and author. Works from
+    plain values so batches can be checked without loading authors.
+    """
+    # Admin and moderators can see all posts
+    if user and (user.role in ['admin', 'moderator'] or user.is_superuser):
+        return True
+    
+    # Public posts are visible to all authenticated users
+    if privacy == 'public':
+        return True
+    
+    # Private posts are only visible to the owner
+    return author_id == user.id
+
 class IsAdminUser(BasePermission):
     """
     Allow access only to admin users.
@@ -39,13 +55,5 @@ class IsPostOwnerOrPublic(BasePermission):
     Allow access to post based on privacy setting.
     """
     def has_object_permission(self, request, view, obj):
-        # Admin and moderators can see all posts
-        if request.user and (request.user.role in ['admin', 'moderator'] or request.user.is_superuser):
-            return True
-        
-        # Public posts are visible to all authenticated users
-        if obj.privacy == 'public':
-            return True
-        
-        # Private posts are only visible to the owner
-        return obj.author == request.user
+        # Compare author_id so the author row is never fetched just for this check
+        return can_view_post(request.user, obj.privacy, obj.author_id)
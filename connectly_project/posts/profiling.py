@@ -0,0 +1,182 @@
+"""
+Query fingerprints captured from live traffic.
+
+PerformanceMiddleware profiles a QUERY_PROFILE_SAMPLE_RATE share of API
+requests (0 turns profiling off). Every query those requests run is reduced
+to a fingerprint: Django's SQL with its placeholders, ``IN`` lists collapsed
+and LIMIT/OFFSET blanked, so that all pages of the same feed query
+count as one. Calls and time per fingerprint are summed in memory, with one
+example of the SQL kept for replaying. Parameter values are not stored, since
+they carry session keys, usernames, emails and password hashes: each one is
+reduced to its type, except strings that are a model field choice (such as
+``privacy='public'``), which the index audit needs for partial indexes.
+Replays fill the types back in with placeholder values.
+
+At most every QUERY_PROFILE_FLUSH_INTERVAL seconds the totals are added to
+the QueryFingerprint table, which ``manage.py audit_indexes`` reads.
+"""
+import datetime
+import hashlib
+import logging
+import random
+import re
+import time
+import uuid
+from decimal import Decimal
+from threading import Lock
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 0.0
+FLUSH_INTERVAL = 60
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_LIMIT = re.compile(r'\bLIMIT \d+(?: OFFSET \d+)?')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    sql = _SPACE.sub(' ', sql.strip())
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _LIMIT.sub('LIMIT ?', sql)
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()
+
+
+# Stored shape of a parameter -> placeholder used when replaying it
+PLACEHOLDERS = {
+    'str': lambda: '',
+    'bytes': lambda: b'',
+    'int': lambda: 0,
+    'float': lambda: 0.0,
+    'decimal': lambda: Decimal(0),
+    'uuid': lambda: uuid.UUID(int=0),
+    'datetime': timezone.now,
+    'date': lambda: timezone.now().date(),
+    'time': lambda: datetime.time(),
+}
+_SHAPES = [
+    # bool before int, datetime before date: they are subclasses
+    (bool, None), (int, 'int'), (float, 'float'), (str, 'str'), (bytes, 'bytes'), (Decimal, 'decimal'),
+    (uuid.UUID, 'uuid'), (datetime.datetime, 'datetime'), (datetime.date, 'date'), (datetime.time, 'time'),
+]
+_choice_values = None
+
+
+def choice_values():
+    """String values of every model field with choices"""
+    global _choice_values
+    if _choice_values is None:
+        _choice_values = frozenset(
+            value for model in apps.get_models() for model_field in model._meta.concrete_fields
+            if model_field.choices for value, _ in model_field.flatchoices if isinstance(value, str)
+        )
+    return _choice_values
+
+
+def redact(params):
+    """
+    params as a JSON-storable list with their values left out: each one becomes
+    {'redacted': type}, except None, booleans and choice strings. None if a
+    parameter has a type that cannot be replayed.
+    """
+    if params is None:
+        return None
+    redacted = []
+    for param in params:
+        if param is None or (isinstance(param, str) and param in choice_values()):
+            redacted.append(param)
+            continue
+        for kind, shape in _SHAPES:
+            if isinstance(param, kind):
+                redacted.append(param if shape is None else {'redacted': shape})
+                break
+        else:
+            return None
+    return redacted
+
+
+def placeholders(params):
+    """Stored params with every redacted value replaced by a placeholder of its type"""
+    if params is None:
+        return None
+    return [
+        PLACEHOLDERS[param['redacted']]() if isinstance(param, dict) and 'redacted' in param else param
+        for param in params
+    ]
+
+
+def sampled():
+    rate = getattr(settings, 'QUERY_PROFILE_SAMPLE_RATE', SAMPLE_RATE)
+    return rate > 0 and random.random() < rate
+
+
+class QueryProfiler:
+    def __init__(self):
+        self.entries = {}  # fingerprint -> [normalized sql, sample sql, sample params, calls, total ms]
+        self._lock = Lock()
+        self._flushed_at = time.monotonic()
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, None if many else params, (time.perf_counter() - start) * 1000)
+
+    def record(self, sql, params, elapsed_ms):
+        key = fingerprint(sql)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [normalize(sql), sql, redact(params), 0, 0.0]
+            entry[3] += 1
+            entry[4] += elapsed_ms
+
+    def profile(self):
+        """Context manager recording the queries run on this thread's connection"""
+        return connection.execute_wrapper(self)
+
+    def flush_if_due(self):
+        interval = getattr(settings, 'QUERY_PROFILE_FLUSH_INTERVAL', FLUSH_INTERVAL)
+        with self._lock:
+            due = time.monotonic() - self._flushed_at >= interval
+            if due:
+                self._flushed_at = time.monotonic()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Add the recorded totals to QueryFingerprint; returns the number of fingerprints written"""
+        from .models import QueryFingerprint
+
+        with self._lock:
+            entries, self.entries = self.entries, {}
+        if not entries:
+            return 0
+        now = timezone.now()
+        try:
+            QueryFingerprint.objects.bulk_create([
+                QueryFingerprint(fingerprint=key, sql=sql, sample_sql=sample_sql, sample_params=params, last_seen=now)
+                for key, (sql, sample_sql, params, _, _) in entries.items()
+            ], ignore_conflicts=True)
+            for key, (_, _, _, calls, total_ms) in entries.items():
+                QueryFingerprint.objects.filter(fingerprint=key).update(
+                    calls=F('calls') + calls, total_ms=F('total_ms') + total_ms, last_seen=now,
+                )
+        except Exception:
+            logger.warning("Could not store query fingerprints", exc_info=True)
+            return 0
+        return len(entries)
+
+
+profiler = QueryProfiler()
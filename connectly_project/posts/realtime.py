@@ -0,0 +1,351 @@
+"""
+Push delivery of feed changes over Server-Sent Events.
+
+Clients open ``GET /api/posts/stream/`` (served from connectly_project/asgi.py,
+outside the Django URLconf) and receive small delta events instead of polling
+NewsFeedView:
+
+    event: post     {"id", "author", "author_username", "privacy", "created_at"}
+    event: comment  {"id", "post", "author", "created_at"}
+    event: like     {"post", "delta"}
+    event: follow   {"user", "following"}
+    event: resync   {}   the client fell behind; refetch the feed once
+
+Events are published to channels: ``author:<id>`` for public posts and the
+activity on them, ``user:<id>`` for a user's private posts and their own
+follow changes. A stream subscribes to its own two channels plus the author
+channel of everyone the user follows, so publishing never needs the follower
+list. Publishing happens after the transaction commits, and each event is
+encoded once no matter how many streams receive it.
+
+The broker is pluggable (REALTIME_BROKER). LocalBroker delivers within one
+process; RedisBroker relays through Redis pub/sub so every ASGI worker sees
+every event.
+"""
+import asyncio
+import json
+import logging
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/posts/stream/'
+
+# Events buffered per stream before it is told to resync
+QUEUE_SIZE = 256
+
+KEEPALIVE_SECONDS = 15
+
+
+def author_channel(user_id):
+    return f"author:{user_id}"
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def post_channel(author_id, privacy):
+    """Public activity goes to the author's followers, private activity only to the author"""
+    return author_channel(author_id) if privacy == 'public' else user_channel(author_id)
+
+
+def frame(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def frame_data(message):
+    return json.loads(message.split('\ndata: ', 1)[1])
+
+
+class Subscription:
+    """A stream's queue of encoded events; fed from any thread, read on its event loop"""
+
+    def __init__(self, channels, maxsize=QUEUE_SIZE):
+        self.channels = set(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The stream's loop is gone; the broker drops it on unsubscribe
+            pass
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.overflowed = False
+
+
+class LocalBroker:
+    """In-process pub/sub; enough for a single ASGI worker and for tests"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def add(self, subscription, channel):
+        with self._lock:
+            subscription.channels.add(channel)
+            self._channels.setdefault(channel, set()).add(subscription)
+
+    def remove(self, subscription, channel):
+        with self._lock:
+            subscription.channels.discard(channel)
+            self._discard(subscription, channel)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._discard(subscription, channel)
+
+    def _discard(self, subscription, channel):
+        subscribers = self._channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publish through Redis and fan out locally. One listener thread per process
+    pattern-subscribes to every channel and hands messages to LocalBroker.
+    """
+    prefix = 'connectly:realtime:'
+
+    def __init__(self, url=None):
+        super().__init__()
+        import redis
+        self.client = redis.Redis.from_url(url or getattr(settings, 'REALTIME_REDIS_URL', 'redis://localhost:6379/0'))
+        self._listener = None
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, message)
+
+    def subscribe(self, channels):
+        self._listen()
+        return super().subscribe(channels)
+
+    def _listen(self):
+        with self._lock:
+            if self._listener is None:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(**{self.prefix + '*': self._dispatch})
+                self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def _dispatch(self, item):
+        channel = item['channel'].decode()[len(self.prefix):]
+        super().publish(channel, item['data'].decode())
+
+
+_broker = None
+_broker_lock = Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'REALTIME_BROKER', 'posts.realtime.LocalBroker'))()
+        return _broker
+
+
+def publish(channel, event, data):
+    """Send an event once the current transaction commits"""
+    message = frame(event, data)
+    transaction.on_commit(lambda: _send(channel, message))
+
+
+def _send(channel, message):
+    try:
+        get_broker().publish(channel, message)
+    except Exception:
+        logger.warning("Could not publish realtime event to %s", channel, exc_info=True)
+
+
+def post_created(post):
+    publish(post_channel(post.author_id, post.privacy), 'post', {
+        'id': post.id,
+        'author': post.author_id,
+        'author_username': post.author.username,
+        'privacy': post.privacy,
+        'created_at': post.created_at,
+    })
+
+
+def comment_created(comment):
+    post = comment.post
+    publish(post_channel(post.author_id, post.privacy), 'comment', {
+        'id': comment.id,
+        'post': post.id,
+        'author': comment.author_id,
+        'created_at': comment.created_at,
+    })
+
+
+def like_changed(post_id, delta):
+    """The like toggle only knows the post id; find its channel after commit"""
+    message = frame('like', {'post': post_id, 'delta': delta})
+
+    def send():
+        from .object_cache import post_objects
+        post = post_objects.get(post_id)
+        if post is not None:
+            _send(post_channel(post['author'], post['privacy']), message)
+
+    transaction.on_commit(send)
+
+
+def follow_changed(follower_id, followed_id, following):
+    publish(user_channel(follower_id), 'follow', {'user': followed_id, 'following': following})
+
+
+def _followed_ids(user_id):
+    from .models import Follow
+    return list(Follow.objects.filter(follower_id=user_id).values_list('followed_id', flat=True))
+
+
+def _authenticate(raw_token):
+    from users.authentication import StatelessRoleJWTAuthentication
+    authenticator = StatelessRoleJWTAuthentication()
+    try:
+        user = authenticator.get_user(authenticator.get_validated_token(raw_token))
+    except Exception:
+        return None
+    return user if user.is_active else None
+
+
+def raw_token(scope):
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            if scheme.lower() == 'bearer' and token:
+                return token
+    # EventSource cannot set headers, so browsers pass the access token in the query
+    for pair in scope.get('query_string', b'').decode('latin-1').split('&'):
+        name, _, value = pair.partition('=')
+        if name == 'token' and value:
+            return value
+    return None
+
+
+async def _reply(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(scope, receive, send):
+    """ASGI app serving one user's event stream"""
+    if scope['method'] != 'GET':
+        await _reply(send, 405, {'detail': 'Method not allowed.'})
+        return
+    token = raw_token(scope)
+    user = await sync_to_async(_authenticate)(token) if token else None
+    if user is None:
+        await _reply(send, 401, {'detail': 'Authentication credentials were not provided or are invalid.'})
+        return
+
+    followed = await sync_to_async(_followed_ids)(user.id)
+    channels = [user_channel(user.id), author_channel(user.id)] + [author_channel(user_id) for user_id in followed]
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+    keepalive = getattr(settings, 'REALTIME_KEEPALIVE_SECONDS', KEEPALIVE_SECONDS)
+
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    next_message = None
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while True:
+            if next_message is None:
+                next_message = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({next_message, disconnected}, timeout=keepalive,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                break
+            if subscription.overflowed:
+                # Events were dropped; tell the client to refetch instead of sending a gap
+                if next_message in done:
+                    next_message = None
+                subscription.drain()
+                chunk = frame('resync', {})
+            elif next_message in done:
+                chunk = next_message.result()
+                next_message = None
+                if chunk.startswith('event: follow\n'):
+                    change = frame_data(chunk)
+                    channel = author_channel(change['user'])
+                    if change['following']:
+                        broker.add(subscription, channel)
+                    else:
+                        broker.remove(subscription, channel)
+            else:
+                chunk = ': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+    finally:
+        broker.unsubscribe(subscription)
+        for task in (next_message, disconnected):
+            if task is not None:
+                task.cancel()
+
+
+def route(django_application):
+    """Wrap the Django ASGI app so the stream path is served by ``stream``"""
+    path = getattr(settings, 'REALTIME_STREAM_PATH', STREAM_PATH)
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == path:
+            return await stream(scope, receive, send)
+        return await django_application(scope, receive, send)
+
+    return application
@@ -1,7 +1,81 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import Post, Comment, Like, Follow
+from .models import Post, Comment, Like, Follow, Notification
 from users.models import CustomUser
 
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets and expansions for model serializers.
+    
+    ``fields`` keeps only the named fields (plus ``id``); ``expand`` swaps in or adds the
+    fields listed in ``expandable_fields``. ``optimize_queryset`` loads just
+    the columns those fields read (``field_sources``), joins the relations
+    they traverse and adds annotations an expansion needs.
+    """
+    expandable_fields = {}      # name -> (field class, kwargs)
+    field_sources = {}          # field -> model paths it reads (default: its own name)
+    expansion_sources = {}      # expansion -> model paths it reads
+    expansion_annotations = {}  # expansion -> callable returning an annotation
+    
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            field_class, field_kwargs = self.expandable_fields[name]
+            self.fields[name] = field_class(**field_kwargs)
+        if fields is not None:
+            # The id is always returned so clients can still address each item
+            keep = set(fields) | set(expand) | {'id'}
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+    
+    @classmethod
+    def params_from_request(cls, request):
+        """Read ``?fields=`` and ``?expand=`` (comma separated), rejecting unknown names"""
+        def split(value):
+            return [name.strip() for name in value.split(',') if name.strip()]
+        
+        fields = request.query_params.get('fields')
+        fields = split(fields) if fields else None
+        expand = split(request.query_params.get('expand', ''))
+        errors = {}
+        unknown = [name for name in fields or () if name not in cls.Meta.fields]
+        if unknown:
+            errors['fields'] = [f"Unknown field(s): {', '.join(unknown)}"]
+        unknown = [name for name in expand if name not in cls.expandable_fields]
+        if unknown:
+            errors['expand'] = [f"Unknown expansion(s): {', '.join(unknown)}. Use: {', '.join(cls.expandable_fields)}"]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return fields, expand
+    
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=()):
+        """Restrict a queryset to what the selected fields and expansions read"""
+        paths = {'id'}
+        for name in cls.Meta.fields if fields is None else fields:
+            if name not in expand:
+                paths.update(cls.field_sources.get(name, [name]))
+        for name in expand:
+            paths.update(cls.expansion_sources.get(name, []))
+        related = {path.split('__')[0] for path in paths if '__' in path}
+        if related:
+            # A relation that is joined cannot also be deferred
+            paths |= related
+            queryset = queryset.select_related(*related)
+        queryset = queryset.only(*paths)
+        for name in expand:
+            if name in cls.expansion_annotations:
+                queryset = queryset.annotate(**{name: cls.expansion_annotations[name]()})
+        return queryset
+
+class AuthorSerializer(serializers.ModelSerializer):
+    """Public profile fields embedded by ?expand=author"""
+    
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'first_name', 'last_name']
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
     
@@ -43,14 +117,17 @@ class LikeSerializer(serializers.ModelSerializer):
         fields = ['id', 'post', 'user', 'created_at']
         read_only_fields = ['user', 'created_at']
         
-    def validate(self, data):
-        # Check if the user has already liked this post
+    def create(self, validated_data):
+        # The unique (user, post) constraint catches duplicates without a separate exists() query
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
-            user = request.user
-            if Like.objects.filter(user=user, post=data['post']).exists():
-                raise serializers.ValidationError("You have already liked this post")
-        return data
+            validated_data['user'] = request.user
+        try:
+            # A savepoint, so the failed insert doesn't abort an enclosing transaction
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError("You have already liked this post")
 
 class CommentSerializer(serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source='author.username')
@@ -60,9 +137,28 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'content', 'author', 'author_username', 'post', 'created_at']
         read_only_fields = ['author', 'author_username', 'post', 'created_at']
 
-class PostSerializer(serializers.ModelSerializer):
+def like_count_annotation():
+    from .counters import like_count_expression
+    return like_count_expression()
+
+class PostSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source='author.username')
     
+    expandable_fields = {
+        'author': (AuthorSerializer, {'read_only': True}),
+        'like_count': (serializers.IntegerField, {'read_only': True}),
+    }
+    field_sources = {
+        'author': ['author'],
+        'author_username': ['author__username'],
+    }
+    expansion_sources = {
+        'author': ['author__username', 'author__first_name', 'author__last_name'],
+    }
+    expansion_annotations = {
+        'like_count': like_count_annotation,
+    }
+    
     class Meta:
         model = Post
         fields = ['id', 'content', 'created_at', 'author', 'author_username', 'privacy']
@@ -82,10 +178,40 @@ class FollowSerializer(serializers.ModelSerializer):
         if request and hasattr(request, 'user'):
             # Set follower to current user
             data['follower'] = request.user
-            # Check if already following
-            if Follow.objects.filter(follower=request.user, followed=data['followed']).exists():
-                raise serializers.ValidationError("You are already following this user")
             # Prevent self-following
             if data['follower'] == data['followed']:
                 raise serializers.ValidationError("You cannot follow yourself")
-        return data
\ No newline at end of file
+        return data
+    
+    def create(self, validated_data):
+        # The unique (follower, followed) constraint catches duplicates without a separate exists() query
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError("You are already following this user")
+
+class NotificationSerializer(serializers.ModelSerializer):
+    actor_username = serializers.ReadOnlyField(source='actor.username')
+    summary = serializers.SerializerMethodField()
+    
+    VERB_PHRASES = {
+        'like': 'liked your post',
+        'comment': 'commented on your post',
+        'follow': 'started following you',
+    }
+    
+    class Meta:
+        model = Notification
+        fields = ['id', 'verb', 'post', 'actor', 'actor_username', 'actor_count', 'summary', 'read',
+                  'created_at', 'updated_at']
+        read_only_fields = fields
+    
+    def get_summary(self, obj):
+        name = obj.actor.username if obj.actor else 'Someone'
+        others = obj.actor_count - 1
+        if others == 1:
+            name = f"{name} and 1 other"
+        elif others > 1:
+            name = f"{name} and {others} others"
+        return f"{name} {self.VERB_PHRASES[obj.verb]}"
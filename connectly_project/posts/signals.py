@@ -0,0 +1,85 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from users.models import CustomUser
+from .models import Post, Comment, Like, Follow
+from . import stats
+from . import viewer_state
+from . import notifications
+from .object_cache import post_objects, user_objects
+
+@receiver(post_save, sender=CustomUser)
+def count_user_created(sender, instance, created, **kwargs):
+    if created:
+        stats.record('users')
+
+@receiver(post_save, sender=Post)
+def count_post_created(sender, instance, created, **kwargs):
+    if created:
+        stats.record('posts', when=instance.created_at, user_id=instance.author_id)
+
+@receiver(post_save, sender=Comment)
+def count_comment_created(sender, instance, created, **kwargs):
+    if created:
+        stats.record('comments', when=instance.created_at, user_id=instance.author_id)
+
+@receiver(post_save, sender=Like)
+def count_like_created(sender, instance, created, **kwargs):
+    if created:
+        stats.record('likes', when=instance.created_at, user_id=instance.user_id)
+
+@receiver(post_save, sender=Like)
+def add_to_like_filter(sender, instance, created, **kwargs):
+    if created:
+        viewer_state.add(instance.user_id, viewer_state.LIKES, [instance.post_id])
+
+@receiver(post_save, sender=Follow)
+def add_to_follow_filter(sender, instance, created, **kwargs):
+    if created:
+        viewer_state.add(instance.follower_id, viewer_state.FOLLOWS, [instance.followed_id])
+
+@receiver(post_save, sender=Comment)
+def notify_comment(sender, instance, created, **kwargs):
+    if created:
+        notifications.notify(notifications.COMMENT, instance.author_id, post_id=instance.post_id)
+
+@receiver(post_save, sender=Like)
+def notify_like(sender, instance, created, **kwargs):
+    if created:
+        notifications.notify(notifications.LIKE, instance.user_id, post_id=instance.post_id)
+
+@receiver(post_save, sender=Follow)
+def notify_follow(sender, instance, created, **kwargs):
+    if created:
+        notifications.notify(notifications.FOLLOW, instance.follower_id, recipient_id=instance.followed_id)
+
+@receiver(pre_delete, sender=Post)
+def forget_post_notifications(sender, instance, **kwargs):
+    notifications.forget_post(instance.pk)
+
+@receiver(post_save, sender=Post)
+def write_through_post(sender, instance, **kwargs):
+    post_objects.saved(instance)
+
+@receiver(post_delete, sender=Post)
+def drop_cached_post(sender, instance, **kwargs):
+    post_objects.delete(instance.pk)
+
+@receiver(post_save, sender=CustomUser)
+def write_through_user(sender, instance, **kwargs):
+    user_objects.saved(instance)
+
+@receiver(post_delete, sender=CustomUser)
+def drop_cached_user(sender, instance, **kwargs):
+    user_objects.delete(instance.pk)
+
+@receiver(post_delete, sender=CustomUser)
+def count_user_deleted(sender, instance, **kwargs):
+    stats.increment('users', -1)
+
+@receiver(post_delete, sender=Post)
+def count_post_deleted(sender, instance, **kwargs):
+    stats.increment('posts', -1)
+
+@receiver(post_delete, sender=Comment)
+def count_comment_deleted(sender, instance, **kwargs):
+    stats.increment('comments', -1)
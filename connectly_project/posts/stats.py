@@ -0,0 +1,151 @@
+"""
+Incrementally maintained statistics for the admin dashboard.
+
+Totals (users, posts, comments, likes) are kept in StatCounter rows updated
+with atomic ``value = value + delta`` statements from model signals and from
+bulk code paths that bypass signals. Time series (posts per hour, likes per
+day, active users per day) live in StatBucket rows. Reading the dashboard is
+then a couple of indexed lookups instead of COUNT(*) over every table.
+
+Every write runs inside the writer's transaction, so like posts.counters,
+each total and bucket is split into up to STAT_COUNTER_SHARDS rows: a write
+adds to one shard picked at random and reads sum them, so concurrent writers
+do not all queue on one row lock. ``manage.py reconcile_stats`` folds the
+shards back into one row when it recounts.
+
+Like deletions are recorded explicitly by the views rather than through a
+post_delete signal: a listener would stop Django from fast-deleting likes in
+bulk and when a post is removed. Likes removed by cascades therefore drift
+until ``manage.py reconcile_stats`` recounts them.
+"""
+import random
+from datetime import timedelta
+from threading import Lock
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import StatCounter, StatBucket
+from .circuit import cache
+
+TOTALS = ('users', 'posts', 'comments', 'likes')
+
+# Model label -> running total it feeds
+MODEL_TOTALS = {
+    'users.CustomUser': 'users',
+    'posts.Post': 'posts',
+    'posts.Comment': 'comments',
+    'posts.Like': 'likes',
+}
+
+# Series kept for each metric: metric -> granularity
+SERIES = {
+    'posts': 'hour',
+    'likes': 'day',
+    'active_users': 'day',
+}
+
+_active_seen = {}
+_active_lock = Lock()
+
+def bucket_start(when, granularity):
+    """Truncate a datetime to the start of its bucket"""
+    if granularity == 'hour':
+        return when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def shard_count():
+    return max(1, getattr(settings, 'STAT_COUNTER_SHARDS', 8))
+
+def _add(model, lookup, delta):
+    """Atomically add delta to a random shard of the rows matching lookup, creating it if needed"""
+    lookup = dict(lookup, shard=random.randrange(shard_count()))
+    if model.objects.filter(**lookup).update(value=F('value') + delta):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(value=delta, **lookup)
+    except IntegrityError:
+        # Another writer created the row first
+        model.objects.filter(**lookup).update(value=F('value') + delta)
+
+def increment(name, delta=1):
+    """Add delta to a running total"""
+    if delta:
+        _add(StatCounter, {'name': name}, delta)
+
+def increment_bucket(name, granularity, when=None, delta=1):
+    """Add delta to the bucket containing when"""
+    if delta:
+        when = bucket_start(when or timezone.now(), granularity)
+        _add(StatBucket, {'name': name, 'granularity': granularity, 'bucket_start': when}, delta)
+
+def record(metric, delta=1, when=None, user_id=None):
+    """
+    Record delta events for a metric: updates its total, its time series when
+    one is kept, and marks user_id active for the day
+    """
+    increment(metric, delta)
+    if metric in SERIES and delta > 0:
+        increment_bucket(metric, SERIES[metric], when, delta)
+    if user_id is not None:
+        mark_active(user_id, when)
+
+def mark_active(user_id, when=None):
+    """Count a user once per day in the active_users series"""
+    day = bucket_start(when or timezone.now(), 'day')
+    with _active_lock:
+        seen = _active_seen.setdefault(day, set())
+        if user_id in seen:
+            return
+        # Forget previous days and stop growing on extremely busy days
+        for old_day in [d for d in _active_seen if d != day]:
+            del _active_seen[old_day]
+        if len(seen) < 100000:
+            seen.add(user_id)
+    # The shared marker makes the count exact across worker processes
+    try:
+        first_today = cache.add(f"stats:active:{day:%Y%m%d}:{user_id}", 1, timeout=2 * 86400)
+    except Exception:
+        first_today = True
+    if first_today:
+        increment_bucket('active_users', 'day', day)
+
+def totals():
+    """Return every running total in one query"""
+    values = dict.fromkeys(TOTALS, 0)
+    values.update(StatCounter.objects.filter(name__in=TOTALS)
+                  .values('name').annotate(total=Sum('value')).values_list('name', 'total'))
+    return values
+
+def total_for_model(model):
+    """Return the maintained total for a tracked model, or None"""
+    name = MODEL_TOTALS.get(model._meta.label)
+    if name is None:
+        return None
+    return StatCounter.objects.filter(name=name).aggregate(total=Sum('value'))['total']
+
+def replace_total(name, actual):
+    """Fold a total's shards into shard 0 holding actual. Returns the previous total."""
+    with transaction.atomic():
+        shards = list(StatCounter.objects.select_for_update().filter(name=name).order_by('shard'))
+        previous = sum(shard.value for shard in shards)
+        # Only the rows read above; shards created since keep their deltas
+        StatCounter.objects.filter(pk__in=[shard.pk for shard in shards if shard.shard != 0]).delete()
+        if shards and shards[0].shard == 0:
+            StatCounter.objects.filter(pk=shards[0].pk).update(value=actual)
+        else:
+            StatCounter.objects.create(name=name, shard=0, value=actual)
+    return previous
+
+def series(name, granularity, periods):
+    """Return [(bucket_start, value), ...] for the last periods buckets, oldest first"""
+    step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+    end = bucket_start(timezone.now(), granularity)
+    start = end - step * (periods - 1)
+    stored = dict(StatBucket.objects.filter(
+        name=name, granularity=granularity, bucket_start__gte=start
+    ).values('bucket_start').annotate(total=Sum('value')).values_list('bucket_start', 'total'))
+    return [(start + step * i, stored.get(start + step * i, 0)) for i in range(periods)]
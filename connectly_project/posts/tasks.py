@@ -0,0 +1,72 @@
+"""
+Jobs run off the request path (see posts.jobs).
+"""
+from django.core.management import call_command
+
+from . import exporters
+from . import warming
+from . import windows
+from .circuit import cache
+from .jobs import job
+from .models import Follow
+from .utils import CacheHelper
+
+# Followers whose cache keys are dropped per cache call
+FAN_OUT_BATCH = 500
+
+
+@job(priority=10, max_attempts=5, visibility_timeout=120)
+def invalidate_feeds(author_id):
+    """Drop the cached feeds of everyone following an author (the post view drops the author's own)"""
+    followers = (Follow.objects.filter(followed_id=author_id)
+                 .values_list('follower_id', flat=True).iterator(chunk_size=FAN_OUT_BATCH))
+    active = set(warming.tracker.recent())
+    batch = []
+    for follower_id in followers:
+        batch.append(follower_id)
+        if len(batch) >= FAN_OUT_BATCH:
+            _drop_feeds(cache, batch, active)
+            batch = []
+    if batch:
+        _drop_feeds(cache, batch, active)
+
+
+def _drop_feeds(cache_client, user_ids, active):
+    if hasattr(cache_client, 'delete_pattern'):
+        # Redis cache - every page of every feed
+        for user_id in user_ids:
+            cache_client.delete_pattern(CacheHelper.get_key_pattern('feed', user_id))
+            cache_client.delete_pattern(CacheHelper.get_key_pattern('newsfeed', user_id))
+    # Every other backend: move the users to a new feed generation
+    windows.invalidate(user_ids)
+    # Rebuild them for the users likely to ask soon
+    to_warm = [user_id for user_id in user_ids if user_id in active]
+    if to_warm:
+        warm_feeds.delay(user_ids=to_warm)
+
+
+@job(priority=5, max_attempts=2, visibility_timeout=600)
+def warm_feeds(user_ids=None, refresh=False):
+    """Precompute first feed pages for the given users, or for every recently active user"""
+    if user_ids is None:
+        user_ids = warming.tracker.recent()
+    return warming.warm(user_ids, refresh=refresh)
+
+
+@job(priority=-10, max_attempts=1, visibility_timeout=3600)
+def reconcile_stats(days=7):
+    """Recount the dashboard totals and series"""
+    call_command('reconcile_stats', days=days)
+
+
+@job(priority=-10, max_attempts=1, visibility_timeout=3600)
+def compact_like_counters(rebuild=False):
+    call_command('compact_like_counters', rebuild=rebuild)
+
+
+@job(priority=-5, max_attempts=2, visibility_timeout=3600)
+def write_export(datasets, path, fmt='ndjson', user_id=None, compress=False):
+    """Write an export to a file instead of streaming it in a response"""
+    with open(path, 'wb') as f:
+        for chunk in exporters.export_stream(datasets, fmt, user_id=user_id, compress=compress):
+            f.write(chunk)
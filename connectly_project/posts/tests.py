@@ -1,9 +1,47 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from unittest import mock
+from io import StringIO
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from asgiref.testing import ApplicationCommunicator
 from django.middleware.csrf import get_token
-from .models import Post, Like, Comment, Follow
+from .models import Post, Like, Comment, Follow, StatCounter, BatchCheckpoint, ImportIdMap, PostLikeCounterShard, Notification, Job, QueryFingerprint
 from users.models import CustomUser
 from django.urls import reverse
+from django.utils import timezone
+from urllib.parse import unquote
+from .throttling import GCRA, LocalBuckets, TokenBucketThrottle, UserTokenBucketThrottle
+from .utils import BatchProcessor, CacheHelper, SafeCacheHelper
+from .serializers import FollowSerializer, LikeSerializer
+from .toggles import toggle_like, CREATED, DELETED
+from . import stats
+from . import counters
+from . import viewer_state
+from . import compression
+from . import object_cache
+from . import realtime
+from . import notifications
+from . import jobs
+from . import warming
+from . import windows
+from . import codec
+from . import cache_metrics
+from . import circuit
+from . import index_audit
+from . import profiling
 
 class PostPrivacyTests(TestCase):
     def setUp(self):
@@ -117,3 +155,1285 @@ class SocialFeatureTests(TestCase):
         response = self.client.post(f"/api/posts/follow/{self.user1.id}/")
         self.assertEqual(response.status_code, 204)
         self.assertEqual(Follow.objects.count(), 0)
+
+class TokenBucketThrottleTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username="throttled", password="password", role="user"
+        )
+        TokenBucketThrottle.local.clear()
+    
+    def test_gcra_allows_burst_then_rejects(self):
+        bucket = GCRA(num_requests=5, duration=60)
+        tat = None
+        for _ in range(5):
+            allowed, tat, _ = bucket.update(tat, 1000.0)
+            self.assertTrue(allowed)
+        allowed, _, wait = bucket.update(tat, 1000.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 12.0)
+        
+        # One token is replenished after the emission interval
+        allowed, _, _ = bucket.update(tat, 1012.0)
+        self.assertTrue(allowed)
+    
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_shared_bucket_holds_across_concurrent_workers(self):
+        cache.clear()
+        request = mock.Mock(user=self.user)
+        allowed = []
+        
+        def worker():
+            # A fresh process: nothing in its local tier
+            throttle = UserTokenBucketThrottle()
+            throttle.local = LocalBuckets()
+            for _ in range(10):
+                allowed.append(throttle.allow_request(request, None))
+        
+        def slowly(method):
+            # Cache round trips take a while, so the workers' calls overlap
+            def call(cache, *args, **kwargs):
+                result = method(cache, *args, **kwargs)
+                time.sleep(0.002)
+                return result
+            return call
+        
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        with mock.patch.object(LocMemCache, "get", slowly(LocMemCache.get)), \
+                mock.patch.object(LocMemCache, "incr", slowly(LocMemCache.incr)):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(allowed.count(True), 40)
+    
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_allowed_requests_make_one_cache_call(self):
+        cache.clear()
+        request = mock.Mock(user=self.user)
+        throttle = UserTokenBucketThrottle()
+        self.assertTrue(throttle.allow_request(request, None))  # creates the bucket
+        calls = []
+        
+        def counted(name):
+            method = getattr(LocMemCache, name)
+            def call(cache, *args, **kwargs):
+                calls.append(name)
+                return method(cache, *args, **kwargs)
+            return mock.patch.object(LocMemCache, name, call)
+        
+        with counted("incr"), counted("set"), counted("touch"), counted("get"):
+            for _ in range(3):
+                self.assertTrue(throttle.allow_request(request, None))
+        self.assertEqual(calls, ["incr"] * 3)
+    
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_expired_bucket_restarts_from_local_state(self):
+        cache.clear()
+        request = mock.Mock(user=self.user)
+        first, second = UserTokenBucketThrottle(), UserTokenBucketThrottle()
+        first.local, second.local = LocalBuckets(), LocalBuckets()
+        first.timer = second.timer = lambda: 1000.0
+        for _ in range(first.num_requests - 1):
+            self.assertTrue(first.allow_request(request, None))
+        cache.clear()  # the shared bucket expires
+        self.assertTrue(first.allow_request(request, None))
+        # The recreated bucket holds what the first worker had already used
+        self.assertFalse(second.allow_request(request, None))
+    
+    def test_bulk_follow_route_bucket(self):
+        self.client.force_authenticate(user=self.user)
+        for _ in range(10):
+            response = self.client.post(
+                "/api/posts/bulk/follows/", {"user_ids": [], "action": "follow"}, format="json"
+            )
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/api/posts/bulk/follows/", {"user_ids": [], "action": "follow"}, format="json"
+        )
+        self.assertEqual(response.status_code, 429)
+
+class PaginationCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username="pager", password="password", role="user"
+        )
+        for i in range(12):
+            Post.objects.create(author=self.user, content=f"Post {i}", privacy="public")
+        self.client.force_authenticate(user=self.user)
+    
+    def test_estimated_count_matches_small_table(self):
+        response = self.client.get("/api/posts/posts/")
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(response.data["total_pages"], 2)
+    
+    def test_exact_false_omits_counts(self):
+        response = self.client.get("/api/posts/posts/?exact=false")
+        self.assertNotIn("count", response.data)
+        self.assertNotIn("total_pages", response.data)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertIsNotNone(response.data["next"])
+        
+        response = self.client.get("/api/posts/posts/?exact=false&page=2")
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+    
+    def test_stale_count_does_not_hide_rows(self):
+        # bulk_create skips the signals that keep the maintained total current
+        Post.objects.bulk_create(Post(author=self.user, content=f"Late {i}", privacy="public") for i in range(15))
+        response = self.client.get("/api/posts/posts/?page=3")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 7)
+        self.assertEqual((response.data["count"], response.data["total_pages"]), (27, 3))
+        self.assertIsNone(response.data["next"])
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Users seen active by earlier tests must be counted again
+        stats._active_seen.clear()
+        self.admin = CustomUser.objects.create_user(
+            username="statsadmin", password="password", role="admin"
+        )
+        self.post = Post.objects.create(author=self.admin, content="Counted", privacy="public")
+        Like.objects.create(user=self.admin, post=self.post)
+        self.client.force_authenticate(user=self.admin)
+    
+    def test_dashboard_reads_maintained_totals(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/posts/admin/dashboard/")
+        # No query touches the counted tables themselves
+        self.assertFalse([q for q in ctx.captured_queries if '"posts_like"' in q["sql"]])
+        self.assertEqual(response.data["user_count"], 1)
+        self.assertEqual(response.data["post_count"], 1)
+        self.assertEqual(response.data["like_count"], 1)
+        self.assertEqual(response.data["series"]["posts_per_hour"][-1]["value"], 1)
+        self.assertEqual(response.data["series"]["active_users_per_day"][-1]["value"], 1)
+    
+    def test_reconcile_corrects_drift(self):
+        # Cascaded like deletes are not tracked until reconciliation
+        Like.objects.all().delete()
+        call_command("reconcile_stats", workers=1, stdout=StringIO())
+        response = self.client.get("/api/posts/admin/dashboard/")
+        self.assertEqual(response.data["like_count"], 0)
+    
+    @override_settings(STAT_COUNTER_SHARDS=4)
+    def test_writes_spread_over_shards(self):
+        for shard in range(4):
+            with mock.patch("posts.stats.random.randrange", return_value=shard):
+                stats.record("posts")
+        self.assertGreaterEqual(StatCounter.objects.filter(name="posts").count(), 4)
+        self.assertEqual(stats.totals()["posts"], 5)
+        self.assertEqual(stats.total_for_model(Post), 5)
+        self.assertEqual(stats.series("posts", "hour", 1)[0][1], 5)
+        
+        call_command("reconcile_stats", workers=1, days=0, stdout=StringIO())
+        self.assertEqual(list(StatCounter.objects.filter(name="posts").values_list("shard", "value")), [(0, 1)])
+
+class BatchProcessorTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="batcher", password="password", role="user"
+        )
+        for i in range(25):
+            Post.objects.create(author=self.user, content=f"Post {i}", privacy="public")
+    
+    def test_parallel_run_processes_every_row(self):
+        seen = []
+        
+        def collect(batch):
+            seen.extend(post.id for post in batch)
+            return len(batch)
+        
+        total = BatchProcessor.process_in_parallel(
+            Post.objects.all(), collect, workers=1, shards=3, batch_size=4
+        )
+        self.assertEqual(total, 25)
+        self.assertEqual(sorted(seen), sorted(Post.objects.values_list("id", flat=True)))
+        self.assertFalse(BatchCheckpoint.objects.exists())
+    
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        calls = []
+        
+        def crash_on_third_batch(batch):
+            calls.append(len(batch))
+            if len(calls) == 3:
+                raise RuntimeError("worker died")
+            return len(batch)
+        
+        with self.assertRaises(RuntimeError):
+            BatchProcessor.process_in_parallel(
+                Post.objects.all(), crash_on_third_batch, workers=1, shards=1,
+                batch_size=5, min_batch_size=5, max_batch_size=5, checkpoint="resume-test"
+            )
+        
+        resumed = []
+        total = BatchProcessor.process_in_parallel(
+            Post.objects.all(), lambda batch: resumed.extend(batch) or len(batch),
+            workers=1, batch_size=5, checkpoint="resume-test"
+        )
+        self.assertEqual(total, 25)
+        self.assertEqual(len(resumed), 15)
+    
+    def test_resumed_run_covers_rows_added_since(self):
+        BatchProcessor.process_in_parallel(
+            Post.objects.all(), len, workers=1, shards=2, checkpoint="grown", keep_checkpoint=True
+        )
+        for i in range(3):
+            Post.objects.create(author=self.user, content=f"Late {i}", privacy="public")
+        resumed = []
+        total = BatchProcessor.process_in_parallel(
+            Post.objects.all(), lambda batch: resumed.extend(batch) or len(batch), workers=1, checkpoint="grown"
+        )
+        self.assertEqual(total, 28)
+        self.assertEqual([post.content for post in resumed], ["Late 0", "Late 1", "Late 2"])
+    
+    def test_process_pool_runs_the_batches(self):
+        total = BatchProcessor.process_in_parallel(
+            Post.objects.all(), count_batch, workers=1, shards=2, batch_size=10, processes=True
+        )
+        self.assertEqual(total, 25)
+
+class DataExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username="exporter", password="password")
+        self.other = CustomUser.objects.create_user(username="other", password="password")
+        self.admin = CustomUser.objects.create_user(
+            username="export_admin", password="password", role="admin", is_staff=True
+        )
+        self.post = Post.objects.create(author=self.user, content="Mine", privacy="public")
+        Post.objects.create(author=self.other, content="Theirs", privacy="public")
+        Like.objects.create(user=self.user, post=self.post)
+    
+    def read(self, response):
+        return b"".join(response.streaming_content)
+    
+    def test_takeout_contains_only_own_rows(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("user-data-export"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("attachment", response["Content-Disposition"])
+        rows = [json.loads(line) for line in self.read(response).decode().splitlines()]
+        by_type = {}
+        for row in rows:
+            by_type.setdefault(row["type"], []).append(row)
+        self.assertEqual([row["id"] for row in by_type["users"]], [self.user.id])
+        self.assertEqual([row["content"] for row in by_type["posts"]], ["Mine"])
+        self.assertEqual(len(by_type["likes"]), 1)
+    
+    def test_gzip_csv_export(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("user-data-export"), {"fmt": "csv", "dataset": "posts", "gzip": "true"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(self.read(response)).decode().splitlines()
+        self.assertEqual(lines[0], "id,author_id,content,privacy,created_at")
+        self.assertEqual(len(lines), 2)
+    
+    def test_invalid_parameters_rejected_before_streaming(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("user-data-export"), {"fmt": "csv"})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_admin_export_requires_admin(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("admin-export", args=["posts"])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(url)
+        self.assertEqual(len(self.read(response).splitlines()), 2)
+
+@override_settings(PASSWORD_HASH_POOL_SIZE=0)
+class BulkImportTests(TestCase):
+    def write_file(self, name, rows):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        return path
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        CustomUser.objects.create_user(username="taken", password="password")
+    
+    def run_import(self, dataset, path, source="legacy"):
+        call_command("import_data", dataset, path, "--source", source, "--hash-workers", "0",
+                     "--batch-size", "2", stdout=StringIO(), stderr=StringIO())
+    
+    def test_import_remaps_foreign_keys(self):
+        users = self.write_file("users.ndjson", [
+            {"id": 500, "username": "alice", "email": "alice@example.com", "password": "secret-pass"},
+            {"id": 501, "username": "bob", "email": "bob@example.com"},
+            {"id": 502, "username": "taken"},
+        ])
+        posts = self.write_file("posts.ndjson", [
+            {"id": 9000, "author_id": 500, "content": "Imported", "created_at": "2024-01-02T03:04:05Z"},
+            {"id": 9001, "author_id": 999, "content": "Orphan"},
+        ])
+        likes = self.write_file("likes.ndjson", [
+            {"user_id": 501, "post_id": 9000},
+            {"user_id": 501, "post_id": 9000},
+        ])
+        self.run_import("users", users)
+        self.run_import("posts", posts)
+        self.run_import("likes", likes)
+        
+        alice = CustomUser.objects.get(username="alice")
+        self.assertTrue(alice.check_password("secret-pass"))
+        self.assertFalse(CustomUser.objects.get(username="bob").has_usable_password())
+        post = Post.objects.get(content="Imported")
+        self.assertEqual(post.author, alice)
+        self.assertEqual(post.created_at.year, 2024)
+        self.assertFalse(Post.objects.filter(content="Orphan").exists())
+        self.assertEqual(Like.objects.get().post, post)
+        self.assertEqual(stats.totals()["likes"], 1)
+    
+    def test_rerun_skips_imported_rows(self):
+        path = self.write_file("users.ndjson", [{"id": 1, "username": "carol"}])
+        self.run_import("users", path)
+        self.run_import("users", path)
+        self.assertEqual(CustomUser.objects.filter(username="carol").count(), 1)
+        self.assertEqual(ImportIdMap.objects.filter(namespace="legacy:users").count(), 1)
+
+@override_settings(LIKE_COUNTER_SHARDS=4)
+class LikeCounterShardTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = CustomUser.objects.create_user(username="author", password="password")
+        self.post = Post.objects.create(author=self.author, content="Hot post", privacy="public")
+        self.fans = [
+            CustomUser.objects.create_user(username=f"fan{i}", password="password") for i in range(3)
+        ]
+    
+    def test_like_and_unlike_update_counter(self):
+        url = reverse("post-like", args=[self.post.id])
+        for fan in self.fans:
+            self.client.force_authenticate(user=fan)
+            self.client.post(url)
+        self.assertEqual(counters.like_count(self.post.id), 3)
+        self.client.post(url)
+        self.assertEqual(counters.like_count(self.post.id), 2)
+    
+    def test_bulk_like_updates_counter(self):
+        other = Post.objects.create(author=self.author, content="Other", privacy="public")
+        self.client.force_authenticate(user=self.fans[0])
+        self.client.post(reverse("bulk-likes"), {"post_ids": [self.post.id, other.id]}, format="json")
+        self.assertEqual(counters.like_counts([self.post.id, other.id]), {self.post.id: 1, other.id: 1})
+        self.client.post(reverse("bulk-likes"), {"post_ids": [other.id], "action": "unlike"}, format="json")
+        self.assertEqual(counters.like_count(other.id), 0)
+    
+    def test_bulk_like_counts_repeated_ids_once(self):
+        self.client.force_authenticate(user=self.fans[0])
+        with mock.patch("posts.notifications.notify") as notify:
+            response = self.client.post(
+                reverse("bulk-likes"), {"post_ids": [self.post.id, self.post.id, str(self.post.id)]}, format="json"
+            )
+        self.assertEqual(response.data["message"], "1 posts liked successfully")
+        self.assertEqual(counters.like_count(self.post.id), 1)
+        self.assertEqual(stats.totals()["likes"], 1)
+        self.assertEqual(notify.call_count, 1)
+    
+    def test_writes_spread_over_shards_and_compact(self):
+        for _ in range(50):
+            counters.add_likes(self.post.id)
+        shards = PostLikeCounterShard.objects.filter(post=self.post)
+        self.assertGreater(shards.count(), 1)
+        self.assertLessEqual(shards.count(), 4)
+        
+        call_command("compact_like_counters", stdout=StringIO())
+        self.assertEqual(list(shards.values_list("shard", "count")), [(0, 50)])
+    
+    def test_compact_keeps_shards_created_meanwhile(self):
+        counters._add(self.post.id, 0, 3)
+        counters._add(self.post.id, 1, 4)
+        locked = list(PostLikeCounterShard.objects.filter(post=self.post).order_by("shard"))
+        
+        class Racing:
+            def __iter__(self):
+                # A like lands on a new shard after compact read the others
+                PostLikeCounterShard.objects.create(post=locked[0].post, shard=2, count=5)
+                return iter(locked)
+        
+        with mock.patch.object(PostLikeCounterShard.objects, "select_for_update") as select:
+            select.return_value.filter.return_value.order_by.return_value = Racing()
+            self.assertEqual(counters.compact(self.post.id), 7)
+        self.assertEqual(counters.like_count(self.post.id), 12)
+    
+    def test_rebuild_recounts_from_likes(self):
+        Like.objects.create(user=self.fans[0], post=self.post)
+        counters.add_likes(self.post.id, 7)
+        call_command("compact_like_counters", "--rebuild", "--workers", "1", stdout=StringIO())
+        self.assertEqual(counters.like_count(self.post.id), 1)
+
+class ViewerStateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.viewer = CustomUser.objects.create_user(username="viewer", password="password")
+        self.author = CustomUser.objects.create_user(username="followed", password="password")
+        self.stranger = CustomUser.objects.create_user(username="stranger", password="password")
+        self.liked = Post.objects.create(author=self.author, content="Liked", privacy="public")
+        self.unliked = Post.objects.create(author=self.stranger, content="Not liked", privacy="public")
+        Follow.objects.create(follower=self.viewer, followed=self.author)
+        Like.objects.create(user=self.viewer, post=self.liked)
+        self.client.force_authenticate(user=self.viewer)
+    
+    def flags(self, response):
+        return {
+            item["id"]: (item["viewer_has_liked"], item["viewer_follows_author"])
+            for item in response.json()["results"]
+        }
+    
+    def test_feed_flags(self):
+        response = self.client.get(reverse("feed"))
+        self.assertEqual(self.flags(response), {
+            self.liked.id: (True, True),
+            self.unliked.id: (False, False),
+        })
+    
+    def test_cached_newsfeed_reflects_new_like(self):
+        own = Post.objects.create(author=self.viewer, content="Mine", privacy="public")
+        self.assertEqual(self.flags(self.client.get(reverse("newsfeed")))[own.id], (False, False))
+        self.client.post(reverse("post-like", args=[own.id]))
+        self.assertEqual(self.flags(self.client.get(reverse("newsfeed")))[own.id], (True, False))
+    
+    def test_likes_list_flags_followed_likers(self):
+        Like.objects.create(user=self.author, post=self.liked)
+        response = self.client.get(reverse("post-likes-list", args=[self.liked.id]))
+        flags = {item["user"]: item["viewer_follows_user"] for item in response.data["results"]}
+        self.assertEqual(flags, {self.author.id: True, self.viewer.id: False})
+    
+    def test_bloom_filter_skips_database_for_negatives(self):
+        viewer_state.resolve(self.viewer, viewer_state.LIKES, [self.liked.id])
+        with CaptureQueriesContext(connection) as queries:
+            liked = viewer_state.resolve(self.viewer, viewer_state.LIKES, [self.unliked.id + 1000])
+        self.assertEqual(liked, set())
+        self.assertFalse([q for q in queries.captured_queries if "posts_like" in q["sql"]])
+        self.assertEqual(viewer_state.resolve(self.viewer, viewer_state.LIKES, [self.liked.id]), {self.liked.id})
+
+    def test_new_like_is_added_to_the_cached_filter(self):
+        viewer_state.resolve(self.viewer, viewer_state.LIKES, [self.liked.id])
+        self.client.post(reverse("post-like", args=[self.unliked.id]))
+        # The filter was updated in place, not dropped and rebuilt from every id
+        with CaptureQueriesContext(connection) as queries:
+            liked = viewer_state.resolve(self.viewer, viewer_state.LIKES, [self.liked.id, self.unliked.id])
+        self.assertEqual(liked, {self.liked.id, self.unliked.id})
+        self.assertFalse([q for q in queries.captured_queries if "LIMIT" in q["sql"]])
+        self.assertIsNotNone(cache.get(f"viewer:likes:{self.viewer.id}"))
+        
+        self.client.post(reverse("post-like", args=[self.unliked.id]))  # unlike
+        self.assertIsNone(cache.get(f"viewer:likes:{self.viewer.id}"))
+    
+    def test_overwritten_filter_is_dropped(self):
+        viewer_state.resolve(self.viewer, viewer_state.LIKES, [self.liked.id])
+        empty = viewer_state.BloomFilter(1).dumps()
+        real_set = circuit.cache.set
+        
+        def set_then_overwritten(key, value, **kwargs):
+            real_set(key, value, **kwargs)
+            real_set(key, empty, **kwargs)  # a concurrent add wins
+        with mock.patch.object(circuit.GuardedCache, "set", side_effect=set_then_overwritten, create=True):
+            viewer_state.add(self.viewer.id, viewer_state.LIKES, [self.unliked.id])
+        self.assertIsNone(cache.get(f"viewer:likes:{self.viewer.id}"))
+    
+class ToggleTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username="toggler", password="password")
+        self.author = CustomUser.objects.create_user(username="toggled", password="password")
+        self.post = Post.objects.create(author=self.author, content="Toggle me", privacy="public")
+    
+    def test_duplicates_through_serializers_are_validation_errors(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Follow.objects.create(follower=self.user, followed=self.author)
+        context = {"request": mock.Mock(user=self.user)}
+        for serializer in (LikeSerializer(data={"post": self.post.id}, context=context),
+                           FollowSerializer(data={"followed": self.author.id}, context=context)):
+            serializer.is_valid(raise_exception=True)
+            with self.assertRaises(ValidationError):
+                serializer.save()
+        # The failed inserts were rolled back to a savepoint; the transaction is still usable
+        self.assertEqual((Like.objects.count(), Follow.objects.count()), (1, 1))
+    
+    def test_like_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            result, like = toggle_like(self.user.id, self.post.id)
+        self.assertEqual(result, CREATED)
+        stored = Like.objects.get()
+        self.assertEqual((stored.id, stored.user_id, stored.post_id), (like.id, self.user.id, self.post.id))
+        self.assertIsNotNone(stored.created_at)
+        
+        with self.assertNumQueries(2):
+            self.assertEqual(toggle_like(self.user.id, self.post.id), (DELETED, None))
+        self.assertFalse(Like.objects.exists())
+    
+    def test_missing_targets_return_404(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.post(reverse("post-like", args=[self.post.id + 100])).status_code, 404)
+        self.assertEqual(self.client.post(f"/api/posts/follow/{self.author.id + 100}/").status_code, 404)
+        self.assertFalse(Like.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+    
+    def test_follow_toggle(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f"/api/posts/follow/{self.author.id}/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["followed_username"], "toggled")
+        response = self.client.post(f"/api/posts/follow/{self.author.id}/")
+        self.assertEqual(response.data["status"], "unfollowed")
+        self.assertFalse(Follow.objects.exists())
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username="reader", password="password")
+        for i in range(10):
+            Post.objects.create(author=self.user, content=f"Post {i} " + "lorem ipsum " * 20, privacy="public")
+        self.client.force_authenticate(user=self.user)
+    
+    def test_negotiate_respects_quality_values(self):
+        available = {"gzip": None, "br": None}
+        self.assertEqual(compression.negotiate("gzip;q=0.5, br", available), "br")
+        self.assertEqual(compression.negotiate("br;q=0, gzip", available), "gzip")
+        self.assertEqual(compression.negotiate("*", available), "br")
+        self.assertIsNone(compression.negotiate("identity", available))
+    
+    def test_large_response_is_gzipped(self):
+        response = self.client.get(reverse("newsfeed"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data["results"]), 10)
+    
+    def test_small_response_is_not_compressed(self):
+        response = self.client.get(reverse("newsfeed"), {"page_size": 1}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+    
+    def test_cache_hit_serves_precompressed_bytes(self):
+        first = self.client.get(reverse("newsfeed"), HTTP_ACCEPT_ENCODING="gzip")
+        with mock.patch.object(compression, "compress", side_effect=AssertionError("recompressed")):
+            second = self.client.get(reverse("newsfeed"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(second.content, first.content)
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            username="sparse", password="password", first_name="Sam"
+        )
+        self.post = Post.objects.create(author=self.user, content="Sparse post", privacy="public")
+        counters.add_likes(self.post.id, 3)
+        self.client.force_authenticate(user=self.user)
+    
+    def test_fields_prune_response_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("post-list-create"), {"fields": "content", "exact": "false"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [{"id": self.post.id, "content": "Sparse post"}])
+        post_queries = [q["sql"] for q in queries.captured_queries if 'FROM "posts_post"' in q["sql"]]
+        self.assertEqual(len(post_queries), 1)
+        self.assertNotIn('"privacy"', post_queries[0])
+        self.assertNotIn("users_customuser", post_queries[0])
+    
+    def test_expand_embeds_author_and_like_count(self):
+        response = self.client.get(reverse("post-list-create"), {"expand": "author,like_count"})
+        item = response.data["results"][0]
+        self.assertEqual(item["author"], {"id": self.user.id, "username": "sparse", "first_name": "Sam", "last_name": ""})
+        self.assertEqual(item["like_count"], 3)
+    
+    def test_feed_supports_expansions(self):
+        response = self.client.get(reverse("feed"), {"fields": "content", "expand": "like_count"})
+        self.assertEqual(response.data["results"][0]["like_count"], 3)
+        self.assertNotIn("privacy", response.data["results"][0])
+    
+    def test_unknown_fields_rejected(self):
+        response = self.client.get(reverse("post-list-create"), {"fields": "password"})
+        self.assertEqual(response.status_code, 400)
+
+class MultiGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username="batcher", password="password")
+        self.other = CustomUser.objects.create_user(username="hidden", password="password")
+        self.public = Post.objects.create(author=self.other, content="Public", privacy="public")
+        self.private = Post.objects.create(author=self.other, content="Private", privacy="private")
+        self.own = Post.objects.create(author=self.user, content="Own private", privacy="private")
+        self.client.force_authenticate(user=self.user)
+    
+    def test_posts_in_request_order_with_bulk_privacy(self):
+        ids = f"{self.own.id},{self.private.id},{self.public.id},999999"
+        response = self.client.get(reverse("post-list-create"), {"ids": ids})
+        self.assertEqual([post["id"] for post in response.data["results"]], [self.own.id, self.public.id])
+        self.assertEqual(response.data["missing"], [self.private.id, 999999])
+    
+    def test_second_batch_is_served_from_cache(self):
+        ids = f"{self.public.id},{self.own.id}"
+        self.client.get(reverse("post-list-create"), {"ids": ids})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("post-list-create"), {"ids": ids, "fields": "content"})
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "posts_post"' in q["sql"]])
+        self.assertEqual(response.data["results"][0], {"id": self.public.id, "content": "Public"})
+    
+    def test_updates_invalidate_cached_post(self):
+        self.client.get(reverse("post-list-create"), {"ids": str(self.public.id)})
+        self.public.content = "Edited"
+        self.public.save()
+        response = self.client.get(reverse("post-list-create"), {"ids": str(self.public.id)})
+        self.assertEqual(response.data["results"][0]["content"], "Edited")
+    
+    def test_users_batch(self):
+        response = self.client.get(reverse("user-list-create"), {"ids": f"{self.other.id},{self.user.id}"})
+        self.assertEqual([user["username"] for user in response.data["results"]], ["hidden", "batcher"])
+    
+    def test_invalid_ids_rejected(self):
+        self.assertEqual(self.client.get(reverse("post-list-create"), {"ids": "1,abc"}).status_code, 400)
+        too_many = ",".join(str(i) for i in range(1, 102))
+        self.assertEqual(self.client.get(reverse("user-list-create"), {"ids": too_many}).status_code, 400)
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username="cached", password="password")
+        self.post = Post.objects.create(author=self.user, content="Cached", privacy="public")
+        self.client.force_authenticate(user=self.user)
+    
+    def post_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [q for q in queries.captured_queries if 'FROM "posts_post"' in q["sql"]]
+    
+    def test_detail_served_from_cache(self):
+        url = reverse("post-detail", args=[self.post.id])
+        self.client.get(url)
+        response, queries = self.post_queries(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["content"], "Cached")
+        self.assertFalse(queries)
+    
+    def test_patch_writes_through(self):
+        url = reverse("post-detail", args=[self.post.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("post-update", args=[self.post.id]), {"content": "Edited"}, format="json")
+        response, queries = self.post_queries(url)
+        self.assertEqual(response.data["content"], "Edited")
+        self.assertFalse(queries)
+    
+    def test_delete_drops_entry(self):
+        url = reverse("post-detail", args=[self.post.id])
+        self.client.get(url)
+        admin = CustomUser.objects.create_user(username="remover", password="password", role="admin")
+        self.client.force_authenticate(user=admin)
+        self.client.delete(reverse("post-delete", args=[self.post.id]))
+        self.assertEqual(self.client.get(url).status_code, 404)
+    
+    def test_private_post_hidden_from_cache(self):
+        self.post.privacy = "private"
+        self.post.save()
+        other = CustomUser.objects.create_user(username="stranger", password="password")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse("post-detail", args=[self.post.id])).status_code, 403)
+    
+    def test_user_profile_and_hit_ratio(self):
+        object_cache.user_objects.hits = object_cache.user_objects.misses = 0
+        url = reverse("user-profile", args=[self.user.id])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.data["username"], "cached")
+        self.assertEqual(object_cache.stats()["users"], {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+
+@override_settings(NOTIFICATION_FLUSH_DELAY=0, JOB_BACKEND='immediate')
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username="listener", password="password")
+        self.author = CustomUser.objects.create_user(username="speaker", password="password")
+        self.stranger = CustomUser.objects.create_user(username="stranger", password="password")
+        Follow.objects.create(follower=self.user, followed=self.author)
+        self.token = str(AccessToken.for_user(self.user))
+    
+    def sent(self, make_request):
+        with mock.patch.object(realtime, "_send") as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                make_request()
+        return [(call.args[0], realtime.frame_data(call.args[1])) for call in send.call_args_list]
+    
+    def test_views_publish_deltas(self):
+        self.client.force_authenticate(user=self.author)
+        sent = self.sent(lambda: self.client.post(reverse("post-list-create"), {"content": "Hi", "privacy": "public"}))
+        post_id = Post.objects.get(content="Hi").id
+        self.assertEqual(sent[0][0], f"author:{self.author.id}")
+        self.assertEqual(sent[0][1]["id"], post_id)
+        self.assertNotIn("content", sent[0][1])
+        
+        self.client.force_authenticate(user=self.user)
+        sent = self.sent(lambda: self.client.post(reverse("post-like", args=[post_id])))
+        self.assertEqual(sent, [(f"author:{self.author.id}", {"post": post_id, "delta": 1})])
+    
+    def test_private_activity_stays_with_author(self):
+        self.client.force_authenticate(user=self.author)
+        sent = self.sent(lambda: self.client.post(reverse("post-list-create"), {"content": "Secret", "privacy": "private"}))
+        self.assertEqual(sent[0][0], f"user:{self.author.id}")
+    
+    async def open_stream(self, query_string=b""):
+        communicator = ApplicationCommunicator(realtime.route(None), {
+            "type": "http", "method": "GET", "path": realtime.STREAM_PATH,
+            "headers": [], "query_string": query_string,
+        })
+        await communicator.send_input({"type": "http.request", "body": b""})
+        return communicator, await communicator.receive_output(5)
+    
+    async def test_stream_requires_token(self):
+        _, start = await self.open_stream()
+        self.assertEqual(start["status"], 401)
+    
+    async def test_stream_receives_followed_authors_only(self):
+        communicator, start = await self.open_stream(f"token={self.token}".encode())
+        self.assertEqual(start["status"], 200)
+        await communicator.receive_output(5)  # retry hint
+        broker = realtime.get_broker()
+        broker.publish(realtime.author_channel(self.stranger.id), realtime.frame("like", {"post": 1, "delta": 1}))
+        broker.publish(realtime.author_channel(self.author.id), realtime.frame("like", {"post": 2, "delta": 1}))
+        body = (await communicator.receive_output(5))["body"].decode()
+        self.assertEqual(realtime.frame_data(body), {"post": 2, "delta": 1})
+        
+        # Following someone mid-stream subscribes to their channel
+        broker.publish(realtime.user_channel(self.user.id), realtime.frame("follow", {"user": self.stranger.id, "following": True}))
+        await communicator.receive_output(5)
+        broker.publish(realtime.author_channel(self.stranger.id), realtime.frame("like", {"post": 3, "delta": -1}))
+        body = (await communicator.receive_output(5))["body"].decode()
+        self.assertEqual(realtime.frame_data(body), {"post": 3, "delta": -1})
+        
+        await communicator.send_input({"type": "http.disconnect"})
+        await communicator.wait(5)
+        self.assertEqual(broker.subscriber_count(realtime.user_channel(self.user.id)), 0)
+
+
+@override_settings(NOTIFICATION_FLUSH_DELAY=0)
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = CustomUser.objects.create_user(username="popular", password="password")
+        self.fans = [CustomUser.objects.create_user(username=f"fan{i}", password="password") for i in range(3)]
+        self.post = Post.objects.create(author=self.author, content="Hello", privacy="public")
+    
+    def as_user(self, user, make_request):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_request()
+    
+    def like(self, user):
+        return self.as_user(user, lambda: self.client.post(reverse("post-like", args=[self.post.id])))
+    
+    def inbox(self, **params):
+        self.client.force_authenticate(user=self.author)
+        return self.client.get(reverse("notification-list"), params).data
+    
+    def test_burst_of_likes_is_one_entry(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.like(self.author)  # own likes are not notified
+        inbox = self.inbox()
+        self.assertEqual(len(inbox["results"]), 1)
+        self.assertEqual(inbox["results"][0]["summary"], "fan2 and 2 others liked your post")
+        self.assertEqual(inbox["unread"], 1)
+    
+    def test_repeated_actor_counted_once(self):
+        self.like(self.fans[0])
+        self.like(self.fans[0])
+        self.like(self.fans[0])
+        self.assertEqual(self.inbox()["results"][0]["actor_count"], 1)
+    
+    def test_batch_is_written_with_few_queries(self):
+        now = timezone.now()
+        notifications.write([(notifications.LIKE, self.fans[0].id, None, self.post.id, now)])
+        events = [(notifications.LIKE, fan.id, None, self.post.id, now) for fan in self.fans]
+        events += [(notifications.FOLLOW, fan.id, self.author.id, None, now) for fan in self.fans]
+        events += [(notifications.COMMENT, fan.id, None, self.post.id, now) for fan in self.fans]
+        # authors, existing entries, insert, update, counter rows, counter update (+ savepoints)
+        with self.assertNumQueries(8):
+            notifications.write(events)
+        entries = {entry.verb: entry.actor_count for entry in Notification.objects.filter(recipient=self.author)}
+        self.assertEqual(entries, {"like": 3, "follow": 3, "comment": 3})
+        self.assertEqual(notifications.unread_count(self.author.id), 3)
+    
+    def test_buffered_until_flush(self):
+        with override_settings(NOTIFICATION_FLUSH_DELAY=60):
+            self.as_user(self.fans[0], lambda: self.client.post(reverse("follow-user", args=[self.author.id])))
+            self.assertFalse(Notification.objects.exists())
+            self.assertEqual(notifications.buffer.flush(), 1)
+        self.assertEqual(Notification.objects.get().verb, "follow")
+    
+    def test_bulk_likes_and_follows_notify(self):
+        other = Post.objects.create(author=self.author, content="Again", privacy="public")
+        for fan in self.fans[:2]:
+            self.as_user(fan, lambda: self.client.post(
+                reverse("bulk-likes"), {"post_ids": [self.post.id, other.id]}, format="json"))
+            self.as_user(fan, lambda: self.client.post(
+                reverse("bulk-follows"), {"user_ids": [self.author.id], "action": "follow"}, format="json"))
+        entries = Notification.objects.filter(recipient=self.author)
+        self.assertEqual(sorted(entries.values_list("verb", "actor_count")), [("follow", 2), ("like", 2), ("like", 2)])
+    
+    def test_deleting_a_post_lowers_unread_counts(self):
+        other = Post.objects.create(author=self.author, content="Kept", privacy="public")
+        self.like(self.fans[0])
+        self.as_user(self.fans[1], lambda: self.client.post(reverse("post-like", args=[other.id])))
+        self.as_user(self.fans[2], lambda: self.client.post(reverse("follow-user", args=[self.author.id])))
+        self.assertEqual(notifications.unread_count(self.author.id), 3)
+        self.post.delete()
+        self.assertEqual(notifications.unread_count(self.author.id), 2)
+        # Read entries were never counted
+        notifications.mark_read(self.author.id)
+        other.delete()
+        self.assertEqual(notifications.unread_count(self.author.id), 0)
+    
+    def test_keyset_pages_and_mark_read(self):
+        self.like(self.fans[0])
+        self.as_user(self.fans[1], lambda: self.client.post(reverse("follow-user", args=[self.author.id])))
+        self.as_user(self.fans[2], lambda: self.client.post(
+            reverse("post-comment-create", args=[self.post.id]), {"content": "Nice"}))
+        first = self.inbox(page_size=2)
+        self.assertEqual([entry["verb"] for entry in first["results"]], ["comment", "follow"])
+        cursor = first["next"].split("cursor=")[1].split("&")[0]
+        second = self.inbox(page_size=2, cursor=unquote(cursor))
+        self.assertEqual([entry["verb"] for entry in second["results"]], ["like"])
+        
+        response = self.client.post(reverse("notification-read"), {"ids": [first["results"][0]["id"]]}, format="json")
+        self.assertEqual(response.data, {"marked": 1, "unread": 2})
+        response = self.client.post(reverse("notification-read"), {}, format="json")
+        self.assertEqual(response.data, {"marked": 2, "unread": 0})
+
+
+calls = []
+
+@jobs.job(name="tests.record", max_attempts=2)
+def record_call(value):
+    calls.append(value)
+
+@jobs.job(name="tests.explode", max_attempts=2)
+def explode():
+    raise RuntimeError("boom")
+
+
+@override_settings(JOB_BACKEND='db')
+class JobTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        warming.tracker.clear()
+        self.worker = jobs.Worker()
+    
+    def test_delay_stores_row_and_worker_runs_by_priority(self):
+        record_call.delay("low")
+        record_call.delay("high", priority=5)
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(self.worker.drain(), 2)
+        self.assertEqual(calls, ["high", "low"])
+        self.assertFalse(Job.objects.exists())
+    
+    def test_failures_retry_with_backoff_then_fail(self):
+        explode.delay()
+        with self.assertLogs("posts.jobs", "WARNING"):
+            self.worker.drain()
+        job_row = Job.objects.get()
+        self.assertEqual((job_row.status, job_row.attempts), (jobs.QUEUED, 1))
+        self.assertGreater(job_row.run_after, timezone.now())
+        
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs("posts.jobs", "WARNING"):
+            self.worker.drain()
+        job_row = Job.objects.get()
+        self.assertEqual((job_row.status, job_row.attempts), (jobs.FAILED, 2))
+        self.assertIn("boom", job_row.last_error)
+    
+    def test_expired_claim_is_picked_up_again(self):
+        record_call.delay("again")
+        claimed = self.worker.claim()
+        self.assertIsNone(self.worker.claim())  # hidden while the claim lasts
+        Job.objects.filter(id=claimed.id).update(run_after=timezone.now())
+        self.assertEqual(self.worker.drain(), 1)
+        self.assertEqual(calls, ["again"])
+    
+    def test_author_sees_own_post_before_fan_out_runs(self):
+        author = CustomUser.objects.create_user(username="prolific", password="password")
+        follower = CustomUser.objects.create_user(username="reader", password="password")
+        Follow.objects.create(follower=follower, followed=author)
+        client = APIClient()
+        client.force_authenticate(user=author)
+        TokenBucketThrottle.local.clear()
+        self.assertEqual(client.get(reverse("newsfeed")).json()["results"], [])
+        
+        client.post(reverse("post-list-create"), {"content": "Fresh", "privacy": "public"})
+        self.assertEqual(Job.objects.filter(name="posts.tasks.invalidate_feeds").count(), 1)
+        results = client.get(reverse("newsfeed")).json()["results"]
+        self.assertEqual([post["content"] for post in results], ["Fresh"])
+    
+    def test_post_creation_cost_does_not_depend_on_followers(self):
+        author = CustomUser.objects.create_user(username="famous", password="password")
+        client = APIClient()
+        client.force_authenticate(user=author)
+        
+        TokenBucketThrottle.local.clear()
+        now = time.time()
+        
+        def create_post():
+            # Always the same stats shard, so no post creates one, and the same
+            # moment, so the throttle bucket never goes idle between posts
+            with CaptureQueriesContext(connection) as queries, \
+                    mock.patch("posts.stats.random.randrange", return_value=0), \
+                    mock.patch.object(TokenBucketThrottle, "timer", staticmethod(lambda: now)):
+                client.post(reverse("post-list-create"), {"content": "Hi", "privacy": "public"})
+            return len(queries.captured_queries)
+        
+        create_post()  # first post creates counter and throttle rows
+        before = create_post()
+        for i in range(20):
+            follower = CustomUser.objects.create_user(username=f"follower{i}", password="password")
+            Follow.objects.create(follower=follower, followed=author)
+        self.assertEqual(create_post(), before)
+        self.assertEqual(Job.objects.filter(name="posts.tasks.invalidate_feeds").count(), 3)
+        self.assertEqual(self.worker.drain(), 3)
+
+
+@override_settings(JOB_BACKEND='db', WARM_WORKERS=1, WARM_RATE=1000)
+class FeedWarmingTests(TestCase):
+    def setUp(self):
+        warming.tracker.clear()
+        self.client = APIClient()
+        self.author = CustomUser.objects.create_user(username="writer", password="password")
+        self.reader = CustomUser.objects.create_user(username="reader", password="password")
+        Follow.objects.create(follower=self.reader, followed=self.author)
+        Post.objects.create(author=self.author, content="First", privacy="public")
+    
+    def newsfeed_post_queries(self):
+        self.client.force_authenticate(user=self.reader)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("newsfeed"))
+        self.assertEqual(response.status_code, 200)
+        return [q for q in queries.captured_queries if 'FROM "posts_post"' in q["sql"]]
+    
+    def test_tracker_is_bounded_and_shared(self):
+        tracker = warming.ActiveUserTracker(max_size=2)
+        for user_id in (1, 2, 3):
+            tracker.touch(user_id)
+        self.assertEqual(tracker.local(), [3, 2])
+        tracker.persist()
+        self.assertEqual(warming.ActiveUserTracker(max_size=2).recent(), [3, 2])
+    
+    @override_settings(WARM_FEEDS_ON_STARTUP=True)
+    def test_one_startup_warm_up_per_deploy(self):
+        with mock.patch("posts.tasks.warm_feeds.delay") as delay:
+            for _ in range(4):  # worker processes starting together
+                warming.warm_on_startup()
+        self.assertEqual(delay.call_count, 1)
+    
+    def test_warmed_reader_skips_feed_queries(self):
+        self.assertEqual(call_command_output("warm_feeds", str(self.reader.id)).strip(), "Warmed 2 blocks for 1 users")
+        self.assertFalse(self.newsfeed_post_queries())
+        self.assertEqual(warming.warm([self.reader.id]), 0)  # already warm
+    
+    def test_new_post_rewarms_active_followers(self):
+        self.newsfeed_post_queries()  # marks the reader active
+        self.client.force_authenticate(user=self.author)
+        self.client.post(reverse("post-list-create"), {"content": "Second", "privacy": "public"})
+        jobs.Worker().drain()
+        self.assertFalse(self.newsfeed_post_queries())
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.client.get(reverse("newsfeed")).json()["results"][0]["content"], "Second")
+    
+    def test_newsfeed_pages_still_validated(self):
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.client.get(reverse("newsfeed"), {"page": 5}).status_code, 404)
+        self.assertEqual(self.client.get(reverse("newsfeed"), {"page": "x"}).status_code, 404)
+
+
+
+@override_settings(FEED_BLOCK_SIZE=5)
+class FeedWindowTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        TokenBucketThrottle.local.clear()
+        self.user = CustomUser.objects.create_user(username="windowed", password="password")
+        for i in range(12):
+            Post.objects.create(author=self.user, content=f"Post {i}", privacy="public")
+        self.client.force_authenticate(user=self.user)
+    
+    def feed(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("feed"), params)
+        post_queries = [q for q in queries.captured_queries if 'FROM "posts_post"' in q["sql"]]
+        return response, post_queries
+    
+    def test_equivalent_params_share_cached_blocks(self):
+        response, _ = self.feed(page_size="10")
+        self.assertEqual(response.status_code, 200)
+        for params in ({"page_size": "010"}, {"page": "2", "page_size": "4"}, {"page_size": "7"}):
+            response, post_queries = self.feed(**params)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(post_queries)
+        self.assertEqual([p["content"] for p in response.json()["results"]], [f"Post {i}" for i in range(11, 4, -1)])
+    
+    def test_pages_slice_across_blocks(self):
+        page = windows.feed_window.page(self.user, page=2, page_size=4)
+        self.assertEqual([p.content for p in page["results"]], ["Post 7", "Post 6", "Post 5", "Post 4"])
+        self.assertEqual((page["count"], page["num_pages"], page["has_next"]), (12, 3, True))
+    
+    def test_page_size_clamped_and_page_validated(self):
+        response, _ = self.feed(page_size="1000")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 12)
+        self.assertEqual(self.feed(page="x")[0].status_code, 404)
+        self.assertEqual(self.feed(page="9")[0].status_code, 404)
+    
+    def test_out_of_range_pages_build_nothing(self):
+        self.feed()
+        for name in ("feed", "newsfeed"):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name), {"page": "1000000000000000000"})
+            self.assertEqual(response.status_code, 404)
+            self.assertFalse([q for q in queries.captured_queries if "OFFSET" in q["sql"]])
+        far_block = (10 ** 18 - 1) * 10 // windows.feed_window.block_size
+        self.assertIsNone(CacheHelper.get(windows.feed_window.key(self.user.id, far_block, (None, ()))))
+    
+    def test_following_refreshes_every_cached_block(self):
+        author = CustomUser.objects.create_user(username="followed-author", password="password")
+        for i in range(8):
+            Post.objects.create(author=author, content=f"Followed {i}", privacy="public")
+        for page in ("1", "2"):
+            self.assertEqual(self.client.get(reverse("newsfeed"), {"page": page}).status_code, 200)
+        self.client.post(reverse("follow-user", args=[author.id]))
+        response = self.client.get(reverse("newsfeed"), {"page": "2"})
+        self.assertEqual(response.json()["count"], 20)
+        self.client.post(reverse("bulk-follows"), {"user_ids": [author.id], "action": "unfollow"}, format="json")
+        response = self.client.get(reverse("newsfeed"))
+        self.assertEqual(response.json()["count"], 12)
+        self.assertNotIn("Followed 7", [p["content"] for p in response.json()["results"]])
+    
+    def test_report(self):
+        output = call_command_output("feed_cache_report", str(self.user.id), "--requests", "50")
+        self.assertIn("50 requests from 1 users", output)
+        self.assertIn("feed blocks:", output)
+
+
+class CacheCodecTests(TestCase):
+    def setUp(self):
+        codec.reset_stats()
+        self.user = CustomUser.objects.create_user(username="packer", password="password")
+        for i in range(30):
+            Post.objects.create(author=self.user, content=f"Packed post {i}", privacy="public")
+    
+    def test_rows_round_trip_smaller_than_pickled_instances(self):
+        rows = list(windows.newsfeed_queryset(self.user))
+        packed = codec.encode("v3:newsfeed:test", codec.pack_rows(rows))
+        self.assertLess(len(packed), len(pickle.dumps(rows)) / 3)
+        with self.assertNumQueries(0):
+            restored = codec.unpack_rows(codec.decode("v3:newsfeed:test", packed))
+            self.assertEqual([(p.id, p.content, p.author.username, p.like_count) for p in restored],
+                             [(p.id, p.content, p.author.username, p.like_count) for p in rows])
+    
+    def test_deferred_fields_stay_deferred(self):
+        rows = list(windows.feed_queryset(self.user, fields=("id", "content")))
+        restored = codec.unpack_rows(codec.pack_rows(rows))
+        self.assertEqual(restored[0].get_deferred_fields(), rows[0].get_deferred_fields())
+        self.assertEqual(restored[0].content, rows[0].content)
+    
+    @override_settings(CACHE_MAX_ENTRY_SIZE=2000)
+    def test_large_entries_compressed_or_rejected(self):
+        self.assertTrue(CacheHelper.set("v3:test:text", "x" * 5000))
+        self.assertEqual(CacheHelper.get("v3:test:text"), "x" * 5000)
+        CacheHelper.set("v3:test:noise", b"old")
+        with self.assertLogs("posts.codec", "WARNING"):
+            self.assertFalse(CacheHelper.set("v3:test:noise", os.urandom(5000)))
+        self.assertIsNone(CacheHelper.get("v3:test:noise"))
+        usage = codec.stats()["test"]
+        self.assertEqual((usage["compressed"], usage["rejected"]), (1, 1))
+    
+    def test_values_stored_directly_are_read_back(self):
+        cache.set("legacy", {"a": 1})
+        self.assertEqual(CacheHelper.get("legacy"), {"a": 1})
+
+
+class CacheMetricsTests(TestCase):
+    def setUp(self):
+        cache_metrics.metrics.reset()
+        self.client = APIClient()
+        self.admin = CustomUser.objects.create_user(username="metrics", password="password", role="admin")
+        Post.objects.create(author=self.admin, content="Measured", privacy="public")
+        self.client.force_authenticate(user=self.admin)
+    
+    def test_space_saving_keeps_heavy_hitters(self):
+        sketch = cache_metrics.SpaceSaving(3)
+        for i in range(40):
+            sketch.add("hot")
+            if i % 2:
+                sketch.add("warm")
+            sketch.add(f"cold-{i}")
+        top = sketch.top(2)
+        self.assertEqual([entry["key"] for entry in top], ["hot", "warm"])
+        self.assertGreaterEqual(top[1]["count"], 20)
+        self.assertLessEqual(top[1]["count"] - top[1]["error"], 20)
+    
+    def test_feed_reads_recorded_per_prefix(self):
+        self.client.get(reverse("feed"))
+        self.client.get(reverse("feed"))
+        feed = cache_metrics.collect()["prefixes"]["feed"]
+        self.assertEqual((feed["hits"], feed["misses"], feed["writes"]), (1, 1, 1))
+        self.assertIsNotNone(feed["avg_ms"])
+        self.assertGreater(feed["bytes"]["bytes_written"], 0)
+        hot = cache_metrics.collect()["hot_keys"][0]
+        self.assertEqual((hot["key"], hot["count"]), (windows.feed_window.key(self.admin.id, 0, (None, ()), windows.current_generation(self.admin.id)), 2))
+    
+    def test_errors_counted_and_logged(self):
+        with mock.patch("posts.utils.cache") as broken:
+            broken.get.side_effect = ConnectionError("cache down")
+            with self.assertLogs("posts.utils", "WARNING"):
+                self.assertEqual(SafeCacheHelper.get("v3:post:1", "fallback"), "fallback")
+        self.assertEqual(cache_metrics.collect()["prefixes"]["post"]["errors"], 1)
+    
+    def test_admin_endpoint_and_command(self):
+        self.client.get(reverse("feed"))
+        response = self.client.get(reverse("admin-cache-metrics"), {"top": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("feed", response.data["prefixes"])
+        output = call_command_output("cache_stats")
+        self.assertIn("Processes reporting: 1", output)
+        self.assertIn("feed", output)
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        circuit.breaker.reset()
+        cache_metrics.metrics.reset()
+        self.addCleanup(circuit.breaker.reset)
+    
+    def test_errors_open_the_circuit(self):
+        breaker = circuit.CircuitBreaker()
+        backend = mock.Mock(side_effect=ConnectionError("down"))
+        with self.assertLogs("posts.circuit", "WARNING"):
+            for _ in range(circuit.MIN_CALLS):
+                with self.assertRaises(ConnectionError):
+                    breaker.call(backend)
+        self.assertEqual(breaker.stats()["state"], circuit.OPEN)
+        with self.assertRaises(circuit.CacheUnavailable):
+            breaker.call(backend)
+        self.assertEqual(backend.call_count, circuit.MIN_CALLS)
+    
+    @override_settings(CACHE_BREAKER_SLOW_MS=-1, CACHE_BREAKER_COOLDOWN=0)
+    def test_slow_calls_open_and_probe_recovers(self):
+        breaker = circuit.CircuitBreaker()
+        with self.assertLogs("posts.circuit", "WARNING"):
+            for _ in range(circuit.MIN_CALLS):
+                self.assertEqual(breaker.call(lambda: "value"), "value")
+        self.assertEqual(breaker.stats()["state"], circuit.OPEN)
+        self.assertTrue(breaker.allow())   # the probe
+        self.assertFalse(breaker.allow())  # everyone else waits for it
+        with self.assertLogs("posts.circuit", "WARNING"), self.settings(CACHE_BREAKER_SLOW_MS=250):
+            breaker.record(True, 0)
+        self.assertEqual(breaker.stats()["state"], circuit.CLOSED)
+    
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_missing_keys_are_not_failures(self):
+        for i in range(circuit.MIN_CALLS + 2):
+            with self.assertRaises(ValueError):
+                circuit.cache.incr(f"missing-{i}")
+        self.assertEqual(circuit.breaker.stats()["state"], circuit.CLOSED)
+        self.assertEqual(circuit.breaker.stats()["recent_failures"], 0)
+        
+        # First-time clients reach the shared bucket without tripping the breaker
+        throttle = UserTokenBucketThrottle()
+        throttle.local = LocalBuckets()
+        for i in range(circuit.MIN_CALLS + 2):
+            self.assertTrue(throttle.allow_request(mock.Mock(user=CustomUser(pk=1000 + i)), None))
+        self.assertEqual(circuit.breaker.stats()["trips"], 0)
+    
+    def test_outage_falls_back_to_database(self):
+        user = CustomUser.objects.create_user(username="outage", password="password")
+        Post.objects.create(author=user, content="Still here", privacy="public")
+        methods = ["get", "set", "add", "get_many", "set_many", "delete", "delete_many"]
+        broken = mock.Mock(spec=methods)
+        for method in methods:
+            getattr(broken, method).side_effect = ConnectionError("cache down")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with mock.patch("posts.circuit.caches", {"default": broken}), self.assertLogs("posts", "WARNING"):
+            for _ in range(5):
+                response = client.get(reverse("feed"))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["results"][0]["content"], "Still here")
+            newsfeed = client.get(reverse("newsfeed"))
+        self.assertEqual(newsfeed.status_code, 200)
+        self.assertEqual(circuit.breaker.stats()["state"], circuit.OPEN)
+        # Only the first requests waited for the backend
+        self.assertLess(broken.get_many.call_count, 3)
+        self.assertGreater(cache_metrics.collect()["prefixes"]["feed"]["skipped"], 0)
+
+
+class IndexAuditTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="indexed", password="password")
+        self.post = Post.objects.create(author=self.user, content="Indexed", privacy="public")
+        Like.objects.create(user=self.user, post=self.post)
+    
+    def test_no_redundant_indexes_left(self):
+        self.assertEqual(index_audit.redundant_indexes(), [])
+    
+    @override_settings(QUERY_PROFILE_SAMPLE_RATE=1, QUERY_PROFILE_FLUSH_INTERVAL=0)
+    def test_profiled_requests_store_fingerprints(self):
+        for i in range(15):
+            Post.objects.create(author=self.user, content=f"Page {i}")
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        client.get(reverse("post-list-create"), {"page": 1})
+        client.get(reverse("post-list-create"), {"page": 2})
+        # Both pages are one fingerprint
+        page_query = QueryFingerprint.objects.get(sql__contains='FROM "posts_post"', sql__endswith="LIMIT ?")
+        self.assertEqual(page_query.calls, 2)
+        self.assertGreater(page_query.total_ms, 0)
+    
+    def test_parameter_values_are_not_stored(self):
+        profiling.profiler.entries.clear()
+        with profiling.profiler.profile():
+            CustomUser.objects.create_user(username="secretive", email="secret@example.com", password="password")
+            list(CustomUser.objects.filter(username="secretive"))
+            list(Post.objects.filter(privacy="public", author=self.user))
+        profiling.profiler.flush()
+        stored = json.dumps(list(QueryFingerprint.objects.values_list("sample_params", flat=True)))
+        for secret in ("secretive", "secret@example.com", "argon2"):
+            self.assertNotIn(secret, stored)
+        users = QueryFingerprint.objects.filter(sql__contains='"users_customuser"')
+        self.assertEqual(users.get(sql__startswith="SELECT").sample_params, [{"redacted": "str"}])
+        posts = QueryFingerprint.objects.get(sql__startswith="SELECT", sql__contains='"posts_post"')
+        self.assertEqual(posts.sample_params, [{"redacted": "int"}, "public"])
+        self.assertEqual(index_audit.recommend_for(posts.sample_sql, posts.sample_params).condition, {"privacy": "public"})
+        self.assertTrue(index_audit.explain(posts.sample_sql, posts.sample_params))
+    
+    def test_public_feed_gets_partial_index_covered_by_composite(self):
+        sql, params = Post.objects.filter(privacy="public").order_by("-created_at", "-id").query.sql_with_params()
+        recommendation = index_audit.recommend_for(sql, list(params))
+        self.assertEqual(recommendation.fields, ["-created_at", "-id"])
+        self.assertEqual(recommendation.condition, {"privacy": "public"})
+        self.assertTrue(index_audit.is_covered(recommendation))
+    
+    def test_command_recommends_and_replays(self):
+        sql, params = Like.objects.filter(user=self.user).order_by("-created_at").query.sql_with_params()
+        profiling.profiler.record(sql, params, 12.5)
+        profiling.profiler.flush()
+        output = call_command_output("audit_indexes", "--replay")
+        self.assertIn("models.Index(fields=['user', '-created_at']", output)
+        self.assertIn("12ms profiled", output)
+        self.assertNotIn("could not replay", output)
+        self.assertNotIn("Redundant indexes", output)
+
+
+
+def count_batch(batch):
+    """Module level, so worker processes can unpickle it"""
+    return len(batch)
+
+def call_command_output(*args):
+    out = StringIO()
+    call_command(*args, stdout=out)
+    return out.getvalue()
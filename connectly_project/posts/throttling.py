@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .circuit import cache
+
+
+def parse_rate(rate):
+    """
+    Parse a DRF style rate string ('40/minute', '5/s') into (requests, seconds)
+    """
+    if rate is None:
+        return (None, None)
+    num, period = rate.split('/')
+    duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return (int(num), duration)
+
+
+class GCRA:
+    """
+    Generic Cell Rate Algorithm - a token bucket that only needs to remember a
+    single number per key: the theoretical arrival time (TAT) of the next request.
+
+    A request is allowed when it does not arrive earlier than TAT minus the
+    burst tolerance. Both checks and updates are O(1).
+    """
+
+    def __init__(self, num_requests, duration, burst=None):
+        self.emission_interval = duration / float(num_requests)
+        self.burst = burst or num_requests
+        self.tolerance = self.emission_interval * self.burst
+
+    def update(self, tat, now):
+        """
+        Return (allowed, new_tat, wait_seconds) for a request arriving at now
+        """
+        tat = max(tat or now, now)
+        new_tat = tat + self.emission_interval
+        allow_at = new_tat - self.tolerance
+        if now < allow_at:
+            return False, tat, allow_at - now
+        return True, new_tat, 0.0
+
+
+class LocalBuckets:
+    """Bounded in-process store of TAT values (LRU eviction)"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._tats = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._tats.get(key)
+
+    def set(self, key, tat):
+        with self._lock:
+            self._tats[key] = tat
+            self._tats.move_to_end(key)
+            while len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._tats.clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    O(1) token bucket throttle (GCRA) with two tiers:
+
+    1. A local in-process bucket that is checked first. A client that is already
+       over its limit on this worker is rejected without touching the cache.
+    2. A shared bucket in the cache holding one integer per key (the TAT in
+       milliseconds), so limits hold across workers. A request reserves its
+       slot with an atomic ``incr`` of the TAT and gives it back with ``decr``
+       when it turns out to be over the limit, so concurrent workers cannot
+       all pass on the same reading. ``incr`` is atomic on Redis, Memcached
+       and the local-memory cache; on the database cache it is a read and a
+       write, and the shared tier is best-effort. Resetting an idle bucket is
+       a plain write on every backend, which may drop a reservation while the
+       bucket is far from its limit. The key's expiry is only set when a
+       bucket is created or reset, so an allowed request costs one ``incr``;
+       a bucket that expires while still in use restarts from this worker's
+       local TAT. Set ``shared = False`` to use the local tier only.
+
+    Rates come from ``DEFAULT_THROTTLE_RATES`` using ``scope``, like DRF's
+    SimpleRateThrottle. ``burst`` defaults to the number of requests per period.
+    """
+    scope = None
+    rate = None
+    burst = None
+    shared = True
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+    local = LocalBuckets()
+    timer = time.time
+
+    def __init__(self):
+        if not getattr(self, 'rate', None):
+            self.rate = self.get_rate()
+        self.num_requests, self.duration = parse_rate(self.rate)
+        self.wait_seconds = 0.0
+
+    def get_rate(self):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            return None
+
+    def get_cache_key(self, request, view):
+        """Return a unique key for the client, or None to skip throttling"""
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        bucket = GCRA(self.num_requests, self.duration, self.burst)
+        now = self.timer()
+
+        # Local pre-check: reject without a cache round-trip
+        local_tat = self.local.get(key)
+        allowed, new_tat, wait = bucket.update(local_tat, now)
+        if not allowed:
+            self.wait_seconds = wait
+            return False
+
+        if self.shared:
+            # Other workers may have consumed tokens this worker hasn't seen
+            shared = self._reserve_shared(key, bucket, now, new_tat)
+            if shared is not None:
+                allowed, shared_tat, wait = shared
+                if not allowed:
+                    # Remember the shared state so the next request is rejected locally
+                    self.local.set(key, shared_tat)
+                    self.wait_seconds = wait
+                    return False
+                new_tat = max(new_tat, shared_tat)
+
+        self.local.set(key, new_tat)
+        return True
+
+    def _reserve_shared(self, key, bucket, now, local_tat):
+        """
+        Take one emission interval from the shared bucket; local_tat is this
+        worker's TAT including the request. Returns (allowed, tat,
+        wait_seconds), or None when the cache is unavailable.
+        """
+        step = max(1, int(bucket.emission_interval * 1000))
+        tolerance = int(bucket.tolerance * 1000)
+        now_ms = int(now * 1000)
+        timeout = int(bucket.tolerance) + 1
+        try:
+            try:
+                tat = cache.incr(key, step)
+            except ValueError:
+                tat = None  # no bucket yet, or it expired
+            if tat is None or tat - step < now_ms:
+                # New or idle bucket: it restarts from what this worker has seen
+                tat = max(now_ms + step, int(local_tat * 1000))
+                cache.set(key, tat, timeout=timeout)
+            elif tat - tolerance > now_ms:
+                cache.decr(key, step)
+                return False, (tat - step) / 1000, (tat - tolerance - now_ms) / 1000
+        except Exception:
+            return None
+        return True, tat / 1000, 0.0
+
+    def wait(self):
+        return self.wait_seconds or None
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Limit authenticated users by id and anonymous users by IP"""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    """Limit anonymous users by IP"""
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class AuthTokenBucketThrottle(AnonTokenBucketThrottle):
+    """Limit authentication attempts by IP"""
+    scope = 'auth'
+
+
+class BulkLikeThrottle(UserTokenBucketThrottle):
+    """Per-route bucket for the bulk like endpoint"""
+    scope = 'bulk_like'
+
+
+class BulkFollowThrottle(UserTokenBucketThrottle):
+    """Per-route bucket for the bulk follow endpoint"""
+    scope = 'bulk_follow'
@@ -0,0 +1,102 @@
+"""
+Like / follow toggles built on the unique_together constraints.
+
+A toggle used to be get_object_or_404 + filter().first() + create/delete,
+three round trips that could also race each other. Here the insert is tried
+first as a single statement that only inserts when the target row exists and
+does nothing on a unique conflict:
+
+    INSERT INTO posts_like (user_id, post_id, created_at)
+    SELECT %s, id, %s FROM posts_post WHERE id = %s
+    ON CONFLICT (user_id, post_id) DO NOTHING RETURNING id
+
+A returned id means the relation was created (one query). Otherwise it
+either existed, in which case one DELETE removes it, or the target does not
+exist and nothing was deleted either, which maps to 404.
+
+Databases without INSERT ... ON CONFLICT ... RETURNING fall back to the ORM.
+Model signals do not fire on the SQL path; callers record side effects.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404
+from django.utils import timezone
+
+from users.models import CustomUser
+from .models import Post, Like, Follow
+
+CREATED = 'created'
+DELETED = 'deleted'
+
+
+class Toggle:
+    """Toggle a unique (owner, target) relation row"""
+
+    def __init__(self, model, owner_field, target_field, target_model):
+        self.model = model
+        self.owner_field = owner_field
+        self.target_field = target_field
+        self.target_model = target_model
+
+    def __call__(self, owner_id, target_id):
+        """Return (CREATED, instance) or (DELETED, None); raise Http404 for a missing target"""
+        now = timezone.now()
+        if self.supports_single_statement():
+            pk = self.insert(owner_id, target_id, now)
+        else:
+            pk = self.insert_with_orm(owner_id, target_id, now)
+        if pk is not None:
+            return CREATED, self.model(pk=pk, created_at=now, **{
+                f"{self.owner_field}_id": owner_id,
+                f"{self.target_field}_id": target_id,
+            })
+        if self.delete(owner_id, target_id):
+            return DELETED, None
+        raise Http404(f"No {self.target_model._meta.verbose_name} matches the given query.")
+
+    @staticmethod
+    def supports_single_statement():
+        return (connection.vendor in ('sqlite', 'postgresql')
+                and connection.features.can_return_columns_from_insert)
+
+    def column(self, model, field):
+        return connection.ops.quote_name(model._meta.get_field(field).column)
+
+    def insert(self, owner_id, target_id, now):
+        quote = connection.ops.quote_name
+        meta, target_meta = self.model._meta, self.target_model._meta
+        owner, target = self.column(self.model, self.owner_field), self.column(self.model, self.target_field)
+        created_at = meta.get_field('created_at').get_db_prep_value(now, connection)
+        sql = (
+            f"INSERT INTO {quote(meta.db_table)} ({owner}, {target}, {self.column(self.model, 'created_at')}) "
+            f"SELECT %s, {quote(target_meta.pk.column)}, %s FROM {quote(target_meta.db_table)} "
+            f"WHERE {quote(target_meta.pk.column)} = %s "
+            f"ON CONFLICT ({owner}, {target}) DO NOTHING RETURNING {quote(meta.pk.column)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [owner_id, created_at, target_id])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def insert_with_orm(self, owner_id, target_id, now):
+        if not self.target_model.objects.filter(pk=target_id).exists():
+            return None
+        lookup = {f"{self.owner_field}_id": owner_id, f"{self.target_field}_id": target_id}
+        try:
+            with transaction.atomic():
+                # bulk_create, like the SQL path, sends no post_save
+                self.model.objects.bulk_create([self.model(created_at=now, **lookup)])
+        except IntegrityError:
+            return None
+        return self.model.objects.filter(**lookup).values_list('pk', flat=True).first()
+
+    def delete(self, owner_id, target_id):
+        # Likes and follows have no dependents or delete signals, so this is one DELETE
+        deleted, _ = self.model.objects.filter(**{
+            f"{self.owner_field}_id": owner_id,
+            f"{self.target_field}_id": target_id,
+        }).delete()
+        return deleted
+
+
+toggle_like = Toggle(Like, 'user', 'post', Post)
+toggle_follow = Toggle(Follow, 'follower', 'followed', CustomUser)
@@ -4,7 +4,8 @@ from .views import (
     PostCommentList, PostLikeCreate, PostCommentCreate,
     FeedView, FollowUserView, PostDetailView, PostDeleteView, NewsFeedView,
     BulkLikeView, BulkFollowView, PostUpdateView, CommentUpdateView, CommentDeleteView,
-    PostLikesListView, UserFollowersView, UserFollowingView, AdminDashboardView, ProtectedView
+    PostLikesListView, UserFollowersView, UserFollowingView, AdminDashboardView, ProtectedView,
+    UserDataExportView, AdminExportView, NotificationListView, NotificationReadView, AdminCacheMetricsView
 )
 
 urlpatterns = [
@@ -31,4 +32,9 @@ urlpatterns = [
     path('users/<int:user_id>/following/', UserFollowingView.as_view(), name='user-following'),
     path('admin/dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
     path('protected/', ProtectedView.as_view(), name='protected-view'),
+    path('export/me/', UserDataExportView.as_view(), name='user-data-export'),
+    path('admin/export/<str:dataset>/', AdminExportView.as_view(), name='admin-export'),
+    path('admin/cache/', AdminCacheMetricsView.as_view(), name='admin-cache-metrics'),
+    path('notifications/', NotificationListView.as_view(), name='notification-list'),
+    path('notifications/read/', NotificationReadView.as_view(), name='notification-read'),
 ]
\ No newline at end of file
@@ -9,33 +9,45 @@ class Config:
     def __init__(self):
         self.settings = {}
 
-from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.conf import settings
 import hashlib
 import json
 from functools import wraps
 from django.db import connection, transaction, models
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_EXCEPTION
+import logging
+import multiprocessing
+import os
 import time
+import uuid
+
+from . import codec
+from .cache_metrics import metrics
+from .circuit import cache, CacheUnavailable
+
+logger = logging.getLogger(__name__)
 
 class CacheHelper:
     """Helper for cache operations with versioning and patterns"""
     
     # Cache version - bump this when changing cache structure
-    VERSION = 1
+    VERSION = 3
     
     @staticmethod
-    def get_key(prefix, user_id, page=1, page_size=10):
-        """Generate a versioned cache key"""
-        return f"v{CacheHelper.VERSION}:{prefix}:user-{user_id}:page-{page}:size-{page_size}"
+    def get_key(prefix, user_id, page=1, page_size=10, generation=None):
+        """Generate a versioned cache key, optionally for one feed generation (see posts.windows)"""
+        key = f"v{CacheHelper.VERSION}:{prefix}:user-{user_id}:page-{page}:size-{page_size}"
+        return key if generation is None else f"{key}:gen-{generation}"
     
     @staticmethod
     def get_feed_key(user_id, page=1, page_size=10):
         return CacheHelper.get_key('feed', user_id, page, page_size)
     
     @staticmethod
-    def get_newsfeed_key(user_id, page=1, page_size=10):
-        return CacheHelper.get_key('newsfeed', user_id, page, page_size)
+    def get_newsfeed_key(user_id, page=1, page_size=10, generation=None):
+        return CacheHelper.get_key('newsfeed', user_id, page, page_size, generation)
     
     @staticmethod
     def get_user_key(user_id):
@@ -52,57 +64,140 @@ class CacheHelper:
             return f"v{CacheHelper.VERSION}:{prefix}:user-{user_id}:*"
         return f"v{CacheHelper.VERSION}:{prefix}:*"
     
+    @staticmethod
+    def page_entry(data, body=None, fingerprint=None, timeout=None, expires=None):
+        """
+        Build a cached page: the page data plus, when given, its rendered body
+        and every compressed variant of it (see posts.compression). fingerprint
+        identifies what the body was rendered for, e.g. the viewer's flags.
+        """
+        from .compression import precompress
+        timeout = timeout or getattr(settings, 'CACHE_TTL', 60)
+        return {
+            'data': data,
+            'fingerprint': fingerprint,
+            'body': body,
+            'variants': precompress(body) if body else {},
+            'expires': expires or time.time() + timeout,
+        }
+    
+    @staticmethod
+    def entry_timeout(entry):
+        """Seconds left before a page entry expires, so re-rendering it keeps its original expiry"""
+        return max(1, int(entry['expires'] - time.time()))
+    
+    # Every call below is counted and timed per key prefix (see posts.cache_metrics)
+    
+    @staticmethod
+    def get(key, default=None):
+        """Get a value stored with set (see posts.codec)"""
+        with metrics.track([key], reads=True) as call:
+            data = cache.get(key)
+            call.found(data is not None, data is None)
+        return default if data is None else codec.decode(key, data)
+    
+    @staticmethod
+    def set(key, value, timeout=DEFAULT_TIMEOUT):
+        """Store a value encoded and, when large, compressed; returns False if it is over the size limit"""
+        with metrics.track([key]) as call:
+            data = codec.encode(key, value)
+            if data is None:
+                cache.delete(key)
+                call.deletes += 1
+                return False
+            cache.set(key, data, timeout=timeout)
+            call.writes += 1
+        return True
+    
+    @staticmethod
+    def get_many(keys):
+        keys = list(keys)
+        with metrics.track(keys, reads=True) as call:
+            found = cache.get_many(keys)
+            call.found(len(found), len(keys) - len(found))
+        return {key: codec.decode(key, data) for key, data in found.items()}
+    
+    @staticmethod
+    def set_many(mapping, timeout=DEFAULT_TIMEOUT):
+        with metrics.track(list(mapping)) as call:
+            encoded = {key: codec.encode(key, value) for key, value in mapping.items()}
+            rejected = [key for key, data in encoded.items() if data is None]
+            if rejected:
+                cache.delete_many(rejected)
+                call.deletes += len(rejected)
+            stored = {key: data for key, data in encoded.items() if data is not None}
+            cache.set_many(stored, timeout=timeout)
+            call.writes += len(stored)
+    
+    @staticmethod
+    def delete(key):
+        with metrics.track([key]) as call:
+            cache.delete(key)
+            call.deletes += 1
+    
     @staticmethod
     def get_or_set(key, function, timeout=None):
         """Get value from cache or calculate and set it"""
         timeout = timeout or getattr(settings, 'CACHE_TTL', 900)  # Default 15 min
-        value = cache.get(key)
+        value = CacheHelper.get(key)
         if value is None:
             value = function()
-            cache.set(key, value, timeout=timeout)
+            CacheHelper.set(key, value, timeout=timeout)
         return value
 
 class SafeCacheHelper:
-    """A safer version of cache operations that won't crash if cache operations fail"""
+    """
+    A safer version of cache operations that won't crash if cache operations fail.
+    While the cache circuit is open (see posts.circuit) calls return at once, without logging.
+    """
     
     @staticmethod
     def delete(key):
         """Delete a cache key safely"""
         try:
-            cache.delete(key)
-        except Exception as e:
+            CacheHelper.delete(key)
+        except CacheUnavailable:
+            pass
+        except Exception:
             # Log this but don't fail the request
-            print(f"Cache delete error: {str(e)}")
+            logger.warning("Cache delete error for %s", key, exc_info=True)
     
     @staticmethod
     def delete_pattern(pattern):
         """Try to delete pattern if Redis, otherwise do nothing"""
         try:
-            cache_client = caches['default']
-            if hasattr(cache_client, 'delete_pattern'):
-                cache_client.delete_pattern(pattern)
-        except Exception as e:
+            if hasattr(cache, 'delete_pattern'):
+                with metrics.track([pattern]) as call:
+                    call.deletes += cache.delete_pattern(pattern) or 0
+        except CacheUnavailable:
+            pass
+        except Exception:
             # Log this but don't fail the request
-            print(f"Cache pattern delete error: {str(e)}")
+            logger.warning("Cache pattern delete error for %s", pattern, exc_info=True)
     
     @staticmethod
     def get(key, default=None):
         """Get from cache safely"""
         try:
-            return cache.get(key, default)
-        except Exception as e:
+            return CacheHelper.get(key, default)
+        except CacheUnavailable:
+            return default
+        except Exception:
             # Log but return default
-            print(f"Cache get error: {str(e)}")
+            logger.warning("Cache get error for %s", key, exc_info=True)
             return default
     
     @staticmethod
     def set(key, value, timeout=None):
         """Set cache safely"""
         try:
-            cache.set(key, value, timeout=timeout)
-        except Exception as e:
+            return CacheHelper.set(key, value, timeout=timeout)
+        except CacheUnavailable:
+            return False
+        except Exception:
             # Log but don't fail
-            print(f"Cache set error: {str(e)}")
+            logger.warning("Cache set error for %s", key, exc_info=True)
+            return False
 
 def is_debug_mode():
     """
@@ -117,10 +212,13 @@ def query_cache(ttl=None, prefix="querydata"):
     Args:
         ttl: Cache time to live in seconds
         prefix: Cache key prefix
+    
+    The wrapper also exposes ``cache_key(*args, **kwargs)`` and
+    ``refresh(*args, **kwargs)``, which recomputes and stores a result. A
+    model instance and its id give the same key.
     """
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
+        def cache_key(*args, **kwargs):
             # Create a unique cache key based on function name, args and kwargs
             key_parts = [prefix, func.__name__]
             for arg in args:
@@ -142,91 +240,60 @@ def query_cache(ttl=None, prefix="querydata"):
             if len(key_str) > 200:  # If key is too long, hash it
                 key_str = hashlib.md5(key_str.encode()).hexdigest()
             
-            cache_key = f"qc:{key_str}"
-            
-            # Try getting from cache first
-            cached_data = cache.get(cache_key)
-            if cached_data is not None:
-                return cached_data
-            
-            # If not in cache, execute function
+            return f"qc:{key_str}"
+        
+        def refresh(*args, **kwargs):
             result = func(*args, **kwargs)
             
             # Set cache with appropriate TTL
             ttl_value = ttl or getattr(settings, 'CACHE_TTL', 60)
-            cache.set(cache_key, result, timeout=ttl_value)
+            CacheHelper.set(cache_key(*args, **kwargs), result, timeout=ttl_value)
             
             return result
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # Try getting from cache first
+            cached_data = CacheHelper.get(cache_key(*args, **kwargs))
+            if cached_data is not None:
+                return cached_data
+            
+            # If not in cache, execute function
+            return refresh(*args, **kwargs)
+        
+        wrapper.cache_key = cache_key
+        wrapper.refresh = refresh
         return wrapper
     return decorator
 
-@query_cache(ttl=60)
-def get_user_feed_posts(user, privacy_filter=None, page=1, page_size=10):
-    """Get posts for user feed with caching"""
-    if privacy_filter is None:
-        privacy_filter = models.Q(privacy='public') | models.Q(privacy='private', author=user)
-    
-    # Get posts based on privacy settings with select_related for author
-    posts = Post.objects.select_related('author').filter(privacy_filter).order_by('-created_at')
-    
-    # Adding annotations for counts
-    posts = posts.annotate(
-        like_count=models.Count('likes', distinct=True),
-        comment_count=models.Count('comments', distinct=True)
-    )
+def get_user_feed_posts(user, privacy_filter=None, page=1, page_size=10, fields=None, expand=()):
+    """Get posts for user feed, sliced from cached blocks of the feed (see posts.windows)"""
+    from .windows import feed_window, paginate
+    from .models import Post
+    from .serializers import PostSerializer
     
-    # Manual pagination to avoid Django REST pagination which can't be easily cached
-    paginator = Paginator(posts, page_size)
-    try:
-        posts_page = paginator.page(page)
-    except (EmptyPage, PageNotAnInteger):
-        posts_page = paginator.page(1)
-    
-    return {
-        'count': paginator.count,
-        'num_pages': paginator.num_pages,
-        'current_page': posts_page.number,
-        'results': list(posts_page.object_list),
-        'has_next': posts_page.has_next(),
-        'has_previous': posts_page.has_previous(),
-    }
+    if privacy_filter is not None:
+        # Custom filters are not cached
+        posts = Post.objects.filter(privacy_filter).order_by('-created_at', '-id')
+        return paginate(PostSerializer.optimize_queryset(posts, fields, expand), page, page_size)
+    return feed_window.page(user, page, page_size, variant=(fields, tuple(expand)))
 
-@query_cache(ttl=60)
-def get_user_newsfeed_posts(user, page=1, page_size=10):
-    """Get posts for user newsfeed with caching"""
-    # Get users that the current user follows
-    followed_users = Follow.objects.filter(follower=user).values_list('followed', flat=True)
-    
-    # Get posts from followed users and user's own posts with optimized queries
-    feed_posts = Post.objects.select_related('author').filter(
-        models.Q(author__in=followed_users) | models.Q(author=user)
-    ).order_by('-created_at')
-    
-    # Add annotated fields for performance
-    feed_posts = feed_posts.annotate(
-        like_count=models.Count('likes', distinct=True),
-        comment_count=models.Count('comments', distinct=True)
-    )
-    
-    # Manual pagination
-    paginator = Paginator(feed_posts, page_size)
-    try:
-        posts_page = paginator.page(page)
-    except (EmptyPage, PageNotAnInteger):
-        posts_page = paginator.page(1)
-    
-    return {
-        'count': paginator.count,
-        'num_pages': paginator.num_pages,
-        'current_page': posts_page.number,
-        'results': list(posts_page.object_list),
-        'has_next': posts_page.has_next(),
-        'has_previous': posts_page.has_previous(),
-    }
+def get_user_newsfeed_posts(user, page=1, page_size=10, generation=None):
+    """Get posts for user newsfeed, sliced from cached blocks of the feed (see posts.windows)"""
+    from .windows import newsfeed_window
+    return newsfeed_window.page(user, page, page_size, generation=generation)
+
+def _init_process_worker():
+    # Spawned workers start without Django configured
+    import django
+    django.setup()
 
 class BatchProcessor:
     """Utility for processing large datasets in batches"""
     
+    # Pause between batches of process_in_batches to ease database contention
+    pause = 0.01
+    
     @staticmethod
     def process_in_batches(queryset, batch_size, processing_func, *args, **kwargs):
         """
@@ -274,6 +341,179 @@ class BatchProcessor:
             last_pk = getattr(batch[-1], pk_name)
             
             # Optional: Sleep briefly to avoid database contention
-            time.sleep(0.01)
+            if BatchProcessor.pause:
+                time.sleep(BatchProcessor.pause)
             
-        return total_processed
\ No newline at end of file
+        return total_processed
+    
+    @staticmethod
+    def process_in_parallel(queryset, processing_func, workers=None, shards=None,
+                            batch_size=1000, target_seconds=0.5, min_batch_size=100,
+                            max_batch_size=20000, checkpoint=None, keep_checkpoint=False,
+                            progress=None, progress_interval=5.0, processes=False):
+        """
+        Process a queryset with a pool of worker threads, resumably
+        
+        The pk range is split into shards that workers take in turn. Each shard
+        walks its range with keyset pagination, resizing batches so that one
+        batch takes about target_seconds, and records its position in a
+        BatchCheckpoint row after every batch. Running again with the same
+        checkpoint name after a crash skips everything already processed; the
+        last shard is extended to rows added since the first run.
+        
+        Threads only overlap database I/O: a processing_func that spends its
+        time in Python holds the GIL and uses one core however many workers
+        there are. Pass processes=True to run processing_func in a pool of
+        worker processes instead (one per worker); it must then be a
+        module-level function, and batches are pickled to it.
+        
+        Args:
+            queryset: The base queryset to process
+            processing_func: Called with each batch (a list); returns the number processed
+            workers: Worker threads (defaults to the CPU count)
+            shards: Number of pk ranges (defaults to 4 per worker, for load balancing)
+            batch_size: Initial batch size
+            target_seconds: Batch duration the adaptive sizing aims for
+            checkpoint: Name to persist progress under; without one, progress
+                is kept only for the duration of the run
+            keep_checkpoint: Keep the checkpoint rows after a successful run
+            progress: Called as progress(processed, elapsed_seconds, rows_per_second)
+            processes: Run processing_func in worker processes, for CPU-bound work
+        
+        Returns:
+            Total processed count, including work done by earlier interrupted runs
+        """
+        from .models import BatchCheckpoint
+        
+        workers = workers or os.cpu_count() or 1
+        name = checkpoint or f"run-{uuid.uuid4().hex}"
+        shard_rows = BatchProcessor._load_shards(queryset, name, shards or workers * 4)
+        pending = [shard for shard in shard_rows if not shard.done]
+        options = {
+            'batch_size': batch_size,
+            'target_seconds': target_seconds,
+            'min_batch_size': min_batch_size,
+            'max_batch_size': max_batch_size,
+            'pool': BatchProcessor._make_process_pool(workers) if processes and pending else None,
+        }
+        
+        started = time.monotonic()
+        
+        def report():
+            processed = BatchCheckpoint.objects.filter(name=name).aggregate(
+                total=models.Sum('processed'))['total'] or 0
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed else 0.0
+            if progress:
+                progress(processed, elapsed, rate)
+            return processed
+        
+        try:
+            if workers == 1:
+                # Run inline so callers inside a transaction see their own data
+                for shard in pending:
+                    BatchProcessor._process_shard(queryset, processing_func, shard, options)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    remaining = {
+                        executor.submit(BatchProcessor._run_shard_thread, queryset, processing_func, shard, options)
+                        for shard in pending
+                    }
+                    while remaining:
+                        done, remaining = wait(remaining, timeout=progress_interval, return_when=FIRST_EXCEPTION)
+                        for future in done:
+                            # Re-raise the first failure; finished shards stay checkpointed
+                            future.result()
+                        if remaining:
+                            report()
+        except Exception:
+            if checkpoint is None:
+                # Nobody can resume an unnamed run
+                BatchCheckpoint.objects.filter(name=name).delete()
+            raise
+        finally:
+            if options['pool'] is not None:
+                options['pool'].shutdown(cancel_futures=True)
+        
+        total = report()
+        if not keep_checkpoint:
+            BatchCheckpoint.objects.filter(name=name).delete()
+        return total
+    
+    @staticmethod
+    def _load_shards(queryset, name, shard_count):
+        """Return existing checkpoint rows for name, or split the pk range into new ones"""
+        from .models import BatchCheckpoint
+        
+        existing = list(BatchCheckpoint.objects.filter(name=name).order_by('shard'))
+        pk_name = queryset.model._meta.pk.name
+        if existing:
+            # Rows inserted since the first run are past the last shard; extend it to them
+            last = existing[-1]
+            high = queryset.aggregate(high=models.Max(pk_name))['high']
+            if high is not None and high > last.upper_pk:
+                last.upper_pk, last.done = high, False
+                BatchCheckpoint.objects.filter(pk=last.pk).update(upper_pk=high, done=False)
+            return existing
+        
+        bounds = queryset.aggregate(low=models.Min(pk_name), high=models.Max(pk_name))
+        if bounds['low'] is None:
+            return []
+        
+        low, high = bounds['low'], bounds['high']
+        step = max(1, -(-(high - low + 1) // shard_count))
+        rows = []
+        for index, lower in enumerate(range(low, high + 1, step)):
+            rows.append(BatchCheckpoint(
+                name=name, shard=index, lower_pk=lower, upper_pk=min(lower + step - 1, high)
+            ))
+        return BatchCheckpoint.objects.bulk_create(rows)
+    
+    @staticmethod
+    def _make_process_pool(workers):
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_process_worker,
+        )
+    
+    @staticmethod
+    def _run_shard_thread(queryset, processing_func, shard, options):
+        try:
+            return BatchProcessor._process_shard(queryset, processing_func, shard, options)
+        finally:
+            # Worker threads each opened their own connection
+            connection.close()
+    
+    @staticmethod
+    def _process_shard(queryset, processing_func, shard, options):
+        from .models import BatchCheckpoint
+        
+        pk_name = queryset.model._meta.pk.name
+        batch_size = options['batch_size']
+        last_pk = shard.last_pk if shard.last_pk is not None else shard.lower_pk - 1
+        processed = shard.processed
+        
+        while True:
+            started = time.monotonic()
+            batch = list(
+                queryset.filter(**{f'{pk_name}__gt': last_pk, f'{pk_name}__lte': shard.upper_pk})
+                .order_by(pk_name)[:batch_size]
+            )
+            if not batch:
+                break
+            
+            if options['pool'] is not None:
+                processed += options['pool'].submit(processing_func, batch).result()
+            else:
+                processed += processing_func(batch)
+            last_pk = getattr(batch[-1], pk_name)
+            BatchCheckpoint.objects.filter(pk=shard.pk).update(last_pk=last_pk, processed=processed)
+            
+            # Move the batch size toward the target duration, at most 2x per step
+            elapsed = max(time.monotonic() - started, 0.001)
+            factor = min(2.0, max(0.5, options['target_seconds'] / elapsed))
+            batch_size = int(min(options['max_batch_size'], max(options['min_batch_size'], batch_size * factor)))
+        
+        BatchCheckpoint.objects.filter(pk=shard.pk).update(done=True)
+        return processed
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""
+Viewer-specific flags for lists: has the requesting user liked each post, and
+do they follow its author.
+
+Pages are enriched after they are read from cache, so the shared page data
+never goes stale when the viewer likes or follows something. All flags for a
+page are resolved with at most one query for likes and one for follows.
+
+Each user also has a Bloom filter per relation (posts they liked, users they
+follow) kept in the cache. A Bloom filter never reports a false negative, so
+ids it rules out are answered without touching the database; only the
+"maybe" ids are checked. A new like or follow is added to the cached filter
+(and again once the transaction commits), so active users keep it; a filter
+that a concurrent writer may have overwritten, or that has grown past half
+its bits set, is deleted instead. An unlike or unfollow deletes the filter,
+and it is rebuilt from a single id query on the next read.
+"""
+import hashlib
+import math
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Like, Follow
+from .circuit import cache
+
+LIKES = 'likes'
+FOLLOWS = 'follows'
+
+# Users with more likes/follows than this are always checked in the database
+MAX_FILTER_ITEMS = 50000
+
+FALSE_POSITIVE_RATE = 0.01
+
+# Cached marker for users whose filter would exceed MAX_FILTER_ITEMS
+TOO_LARGE = 'too-large'
+
+# A new filter is sized for GROWTH times its ids (at least GROWTH_MIN), so new
+# ids can be added; past MAX_FILL set bits it is rebuilt rather than grown
+GROWTH = 2
+GROWTH_MIN = 100
+MAX_FILL = 0.5
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE, bits=None, hash_count=None, data=None):
+        capacity = max(capacity, 1)
+        self.bits = bits or max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = hash_count or max(1, round(self.bits / capacity * math.log(2)))
+        self.data = bytearray(data) if data is not None else bytearray((self.bits + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.bits for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.data[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def fill(self):
+        """Share of bits set; the false positive rate grows with it"""
+        return int.from_bytes(self.data, 'little').bit_count() / self.bits
+
+    def dumps(self):
+        return (self.bits, self.hash_count, bytes(self.data))
+
+    @classmethod
+    def loads(cls, state):
+        bits, hash_count, data = state
+        return cls(1, bits=bits, hash_count=hash_count, data=data)
+
+
+def _key(relation, user_id):
+    return f"viewer:{relation}:{user_id}"
+
+
+def _related_ids(relation, user_id):
+    if relation == LIKES:
+        return Like.objects.filter(user_id=user_id).values_list('post_id', flat=True)
+    return Follow.objects.filter(follower_id=user_id).values_list('followed_id', flat=True)
+
+
+def _load(relation, user_id):
+    """
+    Return (bloom_filter, exact_ids). A freshly built filter comes with the
+    exact id set it was built from; either may be None.
+    """
+    try:
+        state = cache.get(_key(relation, user_id))
+    except Exception:
+        state = None
+    if state == TOO_LARGE:
+        return None, None
+    if state is not None:
+        return BloomFilter.loads(state), None
+
+    limit = getattr(settings, 'VIEWER_FILTER_MAX_ITEMS', MAX_FILTER_ITEMS)
+    ids = set(_related_ids(relation, user_id)[:limit + 1])
+    if len(ids) > limit:
+        _store(relation, user_id, TOO_LARGE)
+        return None, None
+    bloom = BloomFilter(max(len(ids) * GROWTH, GROWTH_MIN))
+    for related_id in ids:
+        bloom.add(related_id)
+    _store(relation, user_id, bloom.dumps())
+    return bloom, ids
+
+
+def _store(relation, user_id, state):
+    try:
+        cache.set(_key(relation, user_id), state, timeout=getattr(settings, 'VIEWER_FILTER_TTL', 3600))
+    except Exception:
+        pass
+
+
+def _delete(keys):
+    try:
+        cache.delete_many(keys)
+    except Exception:
+        pass
+
+
+def _add(relation, user_id, related_ids):
+    key = _key(relation, user_id)
+    try:
+        state = cache.get(key)
+        if state is None or state == TOO_LARGE:
+            return
+        bloom = BloomFilter.loads(state)
+        for related_id in related_ids:
+            bloom.add(related_id)
+        if bloom.fill() > MAX_FILL:
+            cache.delete(key)
+            return
+        _store(relation, user_id, bloom.dumps())
+        # A concurrent add may have written over this one: a filter missing
+        # an id would wrongly rule it out, so drop it to be rebuilt
+        stored = cache.get(key)
+        if stored is not None and stored != TOO_LARGE and not all(
+                related_id in BloomFilter.loads(stored) for related_id in related_ids):
+            cache.delete(key)
+    except Exception:
+        _delete([key])
+
+
+def add(user_id, relation, related_ids):
+    """Add new likes or follows to a user's cached filter"""
+    related_ids = list(related_ids)
+    if related_ids:
+        _add(relation, user_id, related_ids)
+        # Again after commit, in case a reader rebuilt it from pre-commit data meanwhile
+        transaction.on_commit(lambda: _add(relation, user_id, related_ids))
+
+
+def add_many(pairs, relation):
+    """add() for (user_id, related_id) pairs, one filter update per user"""
+    by_user = {}
+    for user_id, related_id in pairs:
+        by_user.setdefault(user_id, []).append(related_id)
+    for user_id, related_ids in by_user.items():
+        add(user_id, relation, related_ids)
+
+
+def invalidate(user_id, relation=None):
+    """Forget a user's filter(s) after they unliked or unfollowed something"""
+    keys = [_key(rel, user_id) for rel in ([relation] if relation else [LIKES, FOLLOWS])]
+    _delete(keys)
+    # Again after commit, in case a reader rebuilt it from pre-commit data meanwhile
+    transaction.on_commit(lambda: _delete(keys))
+
+
+def resolve(user, relation, ids):
+    """Return the subset of ids the user has liked (LIKES) or follows (FOLLOWS)"""
+    ids = {related_id for related_id in ids if related_id is not None}
+    if not ids or not user or not user.is_authenticated:
+        return set()
+    bloom, exact = _load(relation, user.id)
+    if exact is not None:
+        return ids & exact
+    maybe = ids if bloom is None else {related_id for related_id in ids if related_id in bloom}
+    if not maybe:
+        return set()
+    if relation == LIKES:
+        found = Like.objects.filter(user_id=user.id, post_id__in=maybe).values_list('post_id', flat=True)
+    else:
+        found = Follow.objects.filter(follower_id=user.id, followed_id__in=maybe).values_list('followed_id', flat=True)
+    return set(found)
+
+
+def _author_id(item):
+    # The author is an id, or an embedded object with ?expand=author
+    author = item.get('author')
+    return author.get('id') if isinstance(author, dict) else author
+
+
+def for_posts(user, items):
+    """Return serialized posts with viewer_has_liked and viewer_follows_author added"""
+    liked = resolve(user, LIKES, [item.get('id') for item in items])
+    followed = resolve(user, FOLLOWS, [_author_id(item) for item in items if _author_id(item) != user.id])
+    return [
+        {**item, 'viewer_has_liked': item.get('id') in liked, 'viewer_follows_author': _author_id(item) in followed}
+        for item in items
+    ]
+
+
+def fingerprint(items):
+    """Identify the flags on an enriched page, to tell whether a cached render still applies"""
+    return tuple(
+        (item.get('id'), item.get('viewer_has_liked'), item.get('viewer_follows_author'))
+        for item in items
+    )
+
+
+def for_users(user, items, field='user'):
+    """Return serialized rows with viewer_follows_user for the user in ``field``"""
+    followed = resolve(user, FOLLOWS, [item.get(field) for item in items if item.get(field) != user.id])
+    return [{**item, 'viewer_follows_user': item.get(field) in followed} for item in items]
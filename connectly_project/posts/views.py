@@ -1,5 +1,5 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
@@ -8,25 +8,44 @@ from rest_framework import status
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.throttling import UserRateThrottle
+from rest_framework.renderers import JSONRenderer
 from rest_framework.pagination import PageNumberPagination
 from django.db import models, transaction
 from rest_framework.exceptions import PermissionDenied, NotFound
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.reverse import reverse
+from rest_framework.utils.urls import remove_query_param
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from collections import OrderedDict
-from django.core.cache import cache, caches
 from django.conf import settings
 from django_redis import get_redis_connection
 import time
 from urllib.parse import urlsplit, urlunsplit, parse_qs, urlencode
 from django.db.models import Q
-from .models import Post, Comment, Like, Follow
+from .models import Post, Comment, Like, Follow, Notification
 from users.models import CustomUser
-from .serializers import UserSerializer, PostSerializer, CommentSerializer, LikeSerializer, FollowSerializer
+from .serializers import UserSerializer, PostSerializer, CommentSerializer, LikeSerializer, FollowSerializer, NotificationSerializer
 from .permissions import IsOwnerOrReadOnly, IsPostOwnerOrPublic, IsAdminUser
-from .utils import is_debug_mode, CacheHelper, get_user_feed_posts, get_user_newsfeed_posts
+from .throttling import UserTokenBucketThrottle, BulkLikeThrottle, BulkFollowThrottle
+from .pagination import StandardResultsPagination, CachedCountPagination, EstimatedCountPagination, InboxPagination, page_params
+from . import stats
+from . import counters
+from . import viewer_state
+from . import multiget
+from . import object_cache
+from . import realtime
+from . import notifications
+from . import tasks
+from . import warming
+from . import windows
+from . import codec
+from . import cache_metrics
+from .permissions import can_view_post
+from .toggles import toggle_like, toggle_follow, CREATED
+from .compression import PrecompressedResponse
+from . import exporters
+from .utils import is_debug_mode, CacheHelper, SafeCacheHelper, get_user_feed_posts, get_user_newsfeed_posts
 
 def replace_query_param(url, key, val):
     """
@@ -38,26 +57,21 @@ def replace_query_param(url, key, val):
     query = urlencode(query_dict, doseq=True)
     return urlunsplit((scheme, netloc, path, query, fragment))
 
-class StandardResultsPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-    
-    def get_paginated_response(self, data):
-        return Response(OrderedDict([
-            ('count', self.page.paginator.count),
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('current_page', self.page.number),
-            ('total_pages', self.page.paginator.num_pages),
-            ('results', data)
-        ]))
-
 class UserListCreate(APIView):
     """
     List all users or create a new user
     """
+    @swagger_auto_schema(
+        operation_description="List users, or fetch specific users with ?ids=1,2,3",
+        manual_parameters=[
+            openapi.Parameter('ids', openapi.IN_QUERY, description="Comma separated user ids (max 100)", type=openapi.TYPE_STRING),
+        ]
+    )
     def get(self, request, format=None):
+        if 'ids' in request.query_params:
+            ids = multiget.parse_ids(request.query_params['ids'])
+            return Response(multiget.get_users(ids))
+        
         users = CustomUser.objects.all()
         serializer = UserSerializer(users, many=True)
         return Response(serializer.data)
@@ -90,16 +104,34 @@ class PostListCreate(APIView):
     List all posts or create a new post
     """
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsPagination
+    pagination_class = EstimatedCountPagination
     
+    @swagger_auto_schema(
+        operation_description="List posts",
+        manual_parameters=[
+            openapi.Parameter('ids', openapi.IN_QUERY, description="Comma separated post ids to fetch in one request (max 100)", type=openapi.TYPE_STRING),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return", type=openapi.TYPE_STRING),
+            openapi.Parameter('expand', openapi.IN_QUERY, description="Embed related data: author, like_count", type=openapi.TYPE_STRING),
+            openapi.Parameter('exact', openapi.IN_QUERY, description="Set to false to omit count and total_pages", type=openapi.TYPE_BOOLEAN),
+        ]
+    )
     def get(self, request):
+        fields, expand = PostSerializer.params_from_request(request)
+        if 'ids' in request.query_params:
+            if expand:
+                return Response({"error": "expand cannot be combined with ids"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            ids = multiget.parse_ids(request.query_params['ids'])
+            return Response(multiget.get_posts(request.user, ids, fields))
+        
         try:
-            posts = Post.objects.all()
+            # Load only the columns and relations the requested fields use
+            posts = PostSerializer.optimize_queryset(Post.objects.all(), fields, expand)
             
             paginator = self.pagination_class()
             paginated_posts = paginator.paginate_queryset(posts, request)
             
-            serializer = PostSerializer(paginated_posts, many=True)
+            serializer = PostSerializer(paginated_posts, many=True, fields=fields, expand=expand)
             return paginator.get_paginated_response(serializer.data)
         except Exception as e:
             return Response({
@@ -120,31 +152,12 @@ class PostListCreate(APIView):
             serializer = PostSerializer(data=request.data)
             if serializer.is_valid():
                 post = serializer.save(author=request.user)
+                realtime.post_created(post)
                 
-                # Get the cache backend
-                cache_client = caches['default']
-                
-                # Check if we're using Redis before attempting Redis-specific methods
-                if hasattr(cache_client, 'delete_pattern'):
-                    # Redis cache - use pattern deletion
-                    cache_client.delete_pattern(CacheHelper.get_key_pattern('feed', request.user.id))
-                    cache_client.delete_pattern(CacheHelper.get_key_pattern('newsfeed', request.user.id))
-                    
-                    # Clear newsfeed caches for all followers
-                    followers = Follow.objects.filter(followed=request.user).values_list('follower_id', flat=True)
-                    for follower_id in followers:
-                        cache_client.delete_pattern(CacheHelper.get_key_pattern('feed', follower_id))
-                        cache_client.delete_pattern(CacheHelper.get_key_pattern('newsfeed', follower_id))
-                else:
-                    # Non-Redis cache - delete specific keys
-                    cache.delete(f"feed_{request.user.id}_1_10")
-                    cache.delete(f"newsfeed_{request.user.id}_1_10")
-                    
-                    # For followers, just clear first page
-                    followers = Follow.objects.filter(followed=request.user).values_list('follower_id', flat=True)
-                    for follower_id in followers:
-                        cache.delete(f"feed_{follower_id}_1_10")
-                        cache.delete(f"newsfeed_{follower_id}_1_10")
+                # The author sees the post on their next load; follower feeds are
+                # invalidated in the background, so this costs the same for any audience
+                windows.invalidate([request.user.id])
+                tasks.invalidate_feeds.delay(request.user.id)
                 
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -231,7 +244,8 @@ class PostCommentCreate(APIView):
         serializer = CommentSerializer(data=request.data)
         
         if serializer.is_valid():
-            serializer.save(author=request.user, post=post)
+            comment = serializer.save(author=request.user, post=post)
+            realtime.comment_created(comment)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -243,25 +257,30 @@ class PostLikeCreate(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request, post_id, format=None):
-        post = get_object_or_404(Post, id=post_id)
-        
-        # Check if user already liked this post
-        existing_like = Like.objects.filter(user=request.user, post=post).first()
+        # Like if not liked yet, otherwise unlike; 404 if the post does not exist
+        result, like = toggle_like(request.user.id, post_id)
         
-        if existing_like:
-            # Unlike the post
-            existing_like.delete()
-            return Response({'status': 'unliked'}, status=status.HTTP_200_OK)
-        else:
-            # Like the post
-            like = Like.objects.create(user=request.user, post=post)
+        if result == CREATED:
+            # The toggle bypasses post_save, so record the like here
+            stats.record('likes', when=like.created_at, user_id=request.user.id)
+            counters.add_likes(post_id)
+            viewer_state.add(request.user.id, viewer_state.LIKES, [post_id])
+            realtime.like_changed(post_id, 1)
+            notifications.notify(notifications.LIKE, request.user.id, post_id=post_id)
             serializer = LikeSerializer(like)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        
+        stats.increment('likes', -1)
+        counters.add_likes(post_id, -1)
+        viewer_state.invalidate(request.user.id, viewer_state.LIKES)
+        realtime.like_changed(post_id, -1)
+        return Response({'status': 'unliked'}, status=status.HTTP_200_OK)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class BulkLikeView(APIView):
     """Process multiple post likes in a single operation"""
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle, BulkLikeThrottle]
     
     @swagger_auto_schema(auto_schema=None)
     def post(self, request):
@@ -282,11 +301,20 @@ class BulkLikeView(APIView):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
+                try:
+                    # Each post once, however often it is listed
+                    post_ids = list(dict.fromkeys(int(post_id) for post_id in post_ids))
+                except (TypeError, ValueError):
+                    return Response(
+                        {"error": "post_ids must be a list of post ids"}, 
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
                 if action == 'like':
-                    existing_likes = Like.objects.filter(
+                    existing_likes = set(Like.objects.filter(
                         user=request.user, 
                         post_id__in=post_ids
-                    ).values_list('post_id', flat=True)
+                    ).values_list('post_id', flat=True))
                     
                     new_likes = []
                     for post_id in post_ids:
@@ -297,14 +325,28 @@ class BulkLikeView(APIView):
                         Like.objects.bulk_create(new_likes, ignore_conflicts=True)
                     
                     processed = len(new_likes)
+                    # bulk_create skips post_save, so record the likes here
+                    stats.record('likes', processed, user_id=request.user.id)
+                    counters.add_likes_many([like.post_id for like in new_likes])
+                    for like in new_likes:
+                        notifications.notify(notifications.LIKE, request.user.id, post_id=like.post_id)
+                    viewer_state.add(request.user.id, viewer_state.LIKES, [like.post_id for like in new_likes])
                     
                 elif action == 'unlike':
-                    result = Like.objects.filter(
+                    liked_ids = list(Like.objects.filter(
                         user=request.user, 
                         post_id__in=post_ids
+                    ).values_list('post_id', flat=True))
+                    result = Like.objects.filter(
+                        user=request.user, 
+                        post_id__in=liked_ids
                     ).delete()
                     
                     processed = result[0]
+                    stats.increment('likes', -processed)
+                    counters.add_likes_many(liked_ids, -1)
+                    if processed:
+                        viewer_state.invalidate(request.user.id, viewer_state.LIKES)
                     
                 else:
                     return Response(
@@ -328,6 +370,7 @@ class BulkLikeView(APIView):
 class BulkFollowView(APIView):
     """Process multiple user follows in a single operation"""
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle, BulkFollowThrottle]
     
     @swagger_auto_schema(auto_schema=None)  # Add this line to hide from Swagger
     @transaction.atomic
@@ -373,6 +416,10 @@ class BulkFollowView(APIView):
             # Bulk create the new follows
             if new_follows:
                 Follow.objects.bulk_create(new_follows, ignore_conflicts=True)
+                viewer_state.add(request.user.id, viewer_state.FOLLOWS, [follow.followed_id for follow in new_follows])
+                # bulk_create skips signals; notify as FollowUserView does
+                for follow in new_follows:
+                    notifications.notify(notifications.FOLLOW, request.user.id, recipient_id=follow.followed_id)
             
             processed = len(new_follows)
             
@@ -385,6 +432,8 @@ class BulkFollowView(APIView):
             ).delete()
             
             processed = result[0]  # Number of deleted objects
+            if processed:
+                viewer_state.invalidate(request.user.id, viewer_state.FOLLOWS)
             
         else:
             return Response(
@@ -392,12 +441,8 @@ class BulkFollowView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Clear caches that might be affected
-        cache_client = caches['default']
-        if hasattr(cache_client, 'delete_pattern'):
-            cache_client.delete_pattern(CacheHelper.get_key_pattern('newsfeed', request.user.id))
-        else:
-            cache.delete(f"newsfeed_{request.user.id}_1_10")
+        # The newsfeed shows posts of followed users
+        windows.invalidate([request.user.id])
         
         return Response({
             "processed": processed,
@@ -412,24 +457,26 @@ class FollowUserView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request, user_id, format=None):
-        user_to_follow = get_object_or_404(CustomUser, id=user_id)
-        
         if request.user.id == user_id:
             return Response({'error': 'You cannot follow yourself'}, 
                             status=status.HTTP_400_BAD_REQUEST)
         
-        # Check if already following
-        existing_follow = Follow.objects.filter(follower=request.user, followed=user_to_follow).first()
+        # Follow if not following yet, otherwise unfollow; 404 if the user does not exist
+        result, follow = toggle_follow(request.user.id, user_id)
         
-        if existing_follow:
-            # Unfollow
-            existing_follow.delete()
-            return Response({'status': 'unfollowed'}, status=status.HTTP_200_OK)
-        else:
-            # Follow
-            follow = Follow.objects.create(follower=request.user, followed=user_to_follow)
+        if result == CREATED:
+            viewer_state.add(request.user.id, viewer_state.FOLLOWS, [user_id])
+            realtime.follow_changed(request.user.id, user_id, True)
+            notifications.notify(notifications.FOLLOW, request.user.id, recipient_id=user_id)
+            windows.invalidate([request.user.id])
+            follow.follower = request.user
             serializer = FollowSerializer(follow)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        
+        viewer_state.invalidate(request.user.id, viewer_state.FOLLOWS)
+        realtime.follow_changed(request.user.id, user_id, False)
+        windows.invalidate([request.user.id])
+        return Response({'status': 'unfollowed'}, status=status.HTTP_200_OK)
 
 class NewsFeedView(APIView):
     """
@@ -440,61 +487,80 @@ class NewsFeedView(APIView):
     
     def get(self, request, format=None):
         # Create a user-specific cache key
-        page = request.query_params.get('page', 1)
-        page_size = request.query_params.get('page_size', 10)
-        cache_key = CacheHelper.get_newsfeed_key(request.user.id, page, page_size)
+        page, page_size = page_params(request, self.pagination_class)
+        generation = windows.current_generation(request.user.id)
+        cache_key = CacheHelper.get_newsfeed_key(request.user.id, page, page_size, generation)
         
         # Try to get from cache first
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return Response(cached_data)
-            
-        user = request.user
-        
-        # Get users that the current user follows
-        followed_users = Follow.objects.filter(follower=user).values_list('followed', flat=True)
+        entry = SafeCacheHelper.get(cache_key)
+        if entry:
+            return self.page_response(request, cache_key, entry)
         
-        # Get posts with optimized queries
-        feed_posts = Post.objects.select_related('author').filter(
-            models.Q(author__in=followed_users) | models.Q(author=user)
-        ).order_by('-created_at')
-        
-        # Add annotated fields for performance - CORRECTED FIELD NAMES
-        feed_posts = feed_posts.annotate(
-            like_count=models.Count('likes', distinct=True),
-            comment_count=models.Count('comments', distinct=True)
-        )
-        
-        paginator = self.pagination_class()
-        paginated_posts = paginator.paginate_queryset(feed_posts, request)
+        # The query result is cached separately, and kept warm for active users (see posts.warming)
+        warming.tracker.touch(request.user.id)
+        feed_data = get_user_newsfeed_posts(request.user, page=page, page_size=page_size, generation=generation)
+        if feed_data['current_page'] != page:
+            raise NotFound("Invalid page.")
         
-        serializer = PostSerializer(paginated_posts, many=True, context={'request': request})
+        serializer = PostSerializer(feed_data['results'], many=True, context={'request': request})
         
         # Get paginated response
+        url = request.build_absolute_uri()
         response_data = OrderedDict([
-            ('count', paginator.page.paginator.count),
-            ('next', paginator.get_next_link()),
-            ('previous', paginator.get_previous_link()),
-            ('current_page', paginator.page.number),
-            ('total_pages', paginator.page.paginator.num_pages),
+            ('count', feed_data['count']),
+            ('next', replace_query_param(url, 'page', page + 1) if feed_data['has_next'] else None),
+            ('previous', (remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1))
+                         if feed_data['has_previous'] else None),
+            ('current_page', page),
+            ('total_pages', feed_data['num_pages']),
             ('results', serializer.data)
         ])
         
         # Cache the result
         cache_ttl = getattr(settings, 'CACHE_TTL', 60)
-        cache.set(cache_key, response_data, timeout=cache_ttl)
+        entry = CacheHelper.page_entry(response_data, timeout=cache_ttl)
+        return self.page_response(request, cache_key, entry, store=True)
+    
+    def page_response(self, request, cache_key, entry, store=False):
+        """
+        Respond with a cached page. JSON responses reuse the body and compressed
+        variants stored with the page while the viewer's flags are unchanged;
+        otherwise the page is rendered and compressed once and stored again.
+        """
+        data = self.with_viewer_state(request, entry['data'])
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            if store:
+                SafeCacheHelper.set(cache_key, entry, timeout=CacheHelper.entry_timeout(entry))
+            return Response(data)
         
-        return Response(response_data)
+        fingerprint = viewer_state.fingerprint(data['results'])
+        if entry['body'] is None or entry['fingerprint'] != fingerprint:
+            body = JSONRenderer().render(data)
+            entry = CacheHelper.page_entry(entry['data'], body, fingerprint, expires=entry['expires'])
+            store = True
+        if store:
+            SafeCacheHelper.set(cache_key, entry, timeout=CacheHelper.entry_timeout(entry))
+        return PrecompressedResponse(entry['body'], entry['variants'])
+    
+    @staticmethod
+    def with_viewer_state(request, data):
+        """Add the viewer's like/follow flags; kept out of the cached page so it never goes stale"""
+        data = OrderedDict(data)
+        data['results'] = viewer_state.for_posts(request.user, data['results'])
+        return data
 
 @method_decorator(csrf_exempt, name='dispatch')
 class PostDetailView(APIView):
     permission_classes = [IsAuthenticated, IsPostOwnerOrPublic]
 
     def get(self, request, post_id):
-        post = get_object_or_404(Post, id=post_id)
-        self.check_object_permissions(request, post)
-        serializer = PostSerializer(post)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Served from the post cache; same checks as IsPostOwnerOrPublic, on the cached values
+        post = object_cache.post_objects.get(post_id)
+        if post is None:
+            raise NotFound("No Post matches the given query.")
+        if not can_view_post(request.user, post['privacy'], post['author']):
+            raise PermissionDenied()
+        return Response(post, status=status.HTTP_200_OK)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class PostDeleteView(APIView):
@@ -509,16 +575,28 @@ class PostDeleteView(APIView):
 class FeedView(APIView):
     permission_classes = [IsAuthenticated]
     
+    @swagger_auto_schema(
+        operation_description="Get public posts and your own private posts",
+        manual_parameters=[
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return", type=openapi.TYPE_STRING),
+            openapi.Parameter('expand', openapi.IN_QUERY, description="Embed related data: author, like_count", type=openapi.TYPE_STRING),
+        ]
+    )
     def get(self, request):
         # Get parameters
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 10))
+        page, page_size = page_params(request)
+        fields, expand = PostSerializer.params_from_request(request)
         
         # Use cached query function
-        feed_data = get_user_feed_posts(request.user, page=page, page_size=page_size)
+        warming.tracker.touch(request.user.id)
+        feed_data = get_user_feed_posts(request.user, page=page, page_size=page_size,
+                                        fields=tuple(fields) if fields else None, expand=tuple(expand))
+        if feed_data['current_page'] != page:
+            raise NotFound("Invalid page.")
         
         # Serialize the results
-        serializer = PostSerializer(feed_data['results'], many=True, context={'request': request})
+        serializer = PostSerializer(feed_data['results'], many=True, context={'request': request},
+                                    fields=fields, expand=expand)
         
         # Build response with pagination info
         response_data = OrderedDict([
@@ -527,7 +605,7 @@ class FeedView(APIView):
             ('previous', self.get_previous_link(feed_data, request)),
             ('current_page', feed_data['current_page']),
             ('total_pages', feed_data['num_pages']),
-            ('results', serializer.data)
+            ('results', viewer_state.for_posts(request.user, serializer.data))
         ])
         
         return Response(response_data)
@@ -593,6 +671,13 @@ def api_root(request, format=None):
         },
         'admin': {
             'dashboard': reverse('admin-dashboard', request=request, format=format),
+            'cache_metrics': reverse('admin-cache-metrics', request=request, format=format),
+            'export': '/api/posts/admin/export/{dataset}/',
+        },
+        'export': reverse('user-data-export', request=request, format=format),
+        'notifications': {
+            'inbox': reverse('notification-list', request=request, format=format),
+            'read': reverse('notification-read', request=request, format=format),
         },
         'protected': reverse('protected-view', request=request, format=format),
         'bulk_operations': {
@@ -686,7 +771,7 @@ class PostLikesListView(APIView):
     API endpoint for listing likes on a post
     """
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsPagination
+    pagination_class = CachedCountPagination
     
     @swagger_auto_schema(
         operation_description="Get all likes for a post",
@@ -697,6 +782,7 @@ class PostLikesListView(APIView):
         manual_parameters=[
             openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
             openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of results per page", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('exact', openapi.IN_QUERY, description="Set to false to omit count and total_pages", type=openapi.TYPE_BOOLEAN),
         ]
     )
     def get(self, request, post_id):
@@ -707,7 +793,7 @@ class PostLikesListView(APIView):
         paginated_likes = paginator.paginate_queryset(likes, request)
         
         serializer = LikeSerializer(paginated_likes, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(viewer_state.for_users(request.user, serializer.data))
 
 class UserFollowersView(APIView):
     """
@@ -779,19 +865,28 @@ class AdminDashboardView(APIView):
         }
     )
     def get(self, request):
-        # Get system stats
-        user_count = CustomUser.objects.count()
-        post_count = Post.objects.count()
-        comment_count = Comment.objects.count()
-        like_count = Like.objects.count()
+        # Read the incrementally maintained totals instead of counting every table
+        totals = stats.totals()
         
         return Response({
-            'user_count': user_count,
-            'post_count': post_count,
-            'comment_count': comment_count,
-            'like_count': like_count,
+            'user_count': totals['users'],
+            'post_count': totals['posts'],
+            'comment_count': totals['comments'],
+            'like_count': totals['likes'],
+            'series': {
+                'posts_per_hour': self.format_series(stats.series('posts', 'hour', 24)),
+                'likes_per_day': self.format_series(stats.series('likes', 'day', 7)),
+                'active_users_per_day': self.format_series(stats.series('active_users', 'day', 7)),
+            },
+            'object_cache': object_cache.stats(),
+            'feed_cache': windows.stats(),
+            'cache_bytes': codec.stats(),
             'admin_name': request.user.username
         })
+    
+    @staticmethod
+    def format_series(points):
+        return [{'start': start, 'value': value} for start, value in points]
 
 class ProtectedView(APIView):
     """
@@ -812,3 +907,124 @@ class ProtectedView(APIView):
             'user': request.user.username
         })
 
+
+def streaming_export(request, datasets, name, user_id=None):
+    """Build a StreamingHttpResponse for an export, or a 400 for bad parameters"""
+    fmt = request.query_params.get('fmt', 'ndjson')
+    compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        stream = exporters.export_stream(datasets, fmt, user_id=user_id, compress=compress)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = StreamingHttpResponse(stream, content_type=exporters.content_type(fmt, compress))
+    response['Content-Disposition'] = f'attachment; filename="{exporters.filename(name, fmt, compress)}"'
+    return response
+
+class UserDataExportView(APIView):
+    """
+    Stream a copy of the current user's own data (posts, comments, likes, follows)
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_description="Download your data as NDJSON or CSV",
+        manual_parameters=[
+            openapi.Parameter('fmt', openapi.IN_QUERY, description="ndjson (default) or csv", type=openapi.TYPE_STRING),
+            openapi.Parameter('dataset', openapi.IN_QUERY, description="Limit to one dataset (required for csv)", type=openapi.TYPE_STRING),
+            openapi.Parameter('gzip', openapi.IN_QUERY, description="Compress the download", type=openapi.TYPE_BOOLEAN),
+        ]
+    )
+    def get(self, request):
+        dataset = request.query_params.get('dataset')
+        datasets = [dataset] if dataset else list(exporters.DATASETS)
+        return streaming_export(request, datasets, f"connectly-{request.user.username}", user_id=request.user.id)
+
+class AdminCacheMetricsView(APIView):
+    """
+    Cache hit rates, latency, bytes and hot keys per key prefix (admin only)
+    """
+    permission_classes = [IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_description="Cache metrics merged across the processes that reported recently (admin only)",
+        manual_parameters=[
+            openapi.Parameter('top', openapi.IN_QUERY, description="How many hot keys to list (default 20)", type=openapi.TYPE_INTEGER),
+        ]
+    )
+    def get(self, request):
+        try:
+            top = max(0, int(request.query_params.get('top', 20)))
+        except ValueError:
+            top = 20
+        return Response(cache_metrics.collect(top=top))
+
+class AdminExportView(APIView):
+    """
+    Stream a full-table export (admin only)
+    """
+    permission_classes = [IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_description="Export a whole dataset as NDJSON or CSV (admin only)",
+        manual_parameters=[
+            openapi.Parameter('fmt', openapi.IN_QUERY, description="ndjson (default) or csv", type=openapi.TYPE_STRING),
+            openapi.Parameter('gzip', openapi.IN_QUERY, description="Compress the download", type=openapi.TYPE_BOOLEAN),
+        ]
+    )
+    def get(self, request, dataset):
+        return streaming_export(request, [dataset], dataset)
+
+class NotificationListView(APIView):
+    """
+    The current user's notification inbox
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = InboxPagination
+    
+    @swagger_auto_schema(
+        operation_description="List your notifications, most recently active first, with the unread count",
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous page's next link", type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of results per page (max 100)", type=openapi.TYPE_INTEGER),
+        ]
+    )
+    def get(self, request):
+        entries = Notification.objects.filter(recipient=request.user).select_related('actor')
+        
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        
+        serializer = NotificationSerializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['unread'] = notifications.unread_count(request.user.id)
+        return response
+
+@method_decorator(csrf_exempt, name='dispatch')
+class NotificationReadView(APIView):
+    """
+    Mark notifications read
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                      description='Notifications to mark read; omit to mark all'),
+            }
+        ),
+        operation_description="Mark some or all of your notifications read"
+    )
+    def post(self, request):
+        ids = request.data.get('ids')
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return Response({"error": "ids must be a list of integers"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        marked = notifications.mark_read(request.user.id, ids)
+        return Response({
+            "marked": marked,
+            "unread": notifications.unread_count(request.user.id)
+        })
+
@@ -0,0 +1,170 @@
+"""
+Keep the first feed pages of active users warm.
+
+After a deploy or a CacheHelper.VERSION bump every feed cache is cold, and
+the first requests from all active users hit the database at once. The
+warmer builds the first block of each feed window (posts.windows), which
+serves the first page at any page size, for recently active users before
+they ask for it.
+
+ActiveUserTracker remembers who was active: an in-process LRU bounded at
+WARM_ACTIVE_USERS ids, copied to the shared cache at most every
+PERSIST_INTERVAL seconds so a freshly started process knows whom to warm.
+
+Warming runs on the job backend (posts.tasks.warm_feeds):
+- at startup (wsgi.py / asgi.py call ``warm_on_startup``), for entries
+  that are missing; every worker process runs this, so a lock in the cache
+  lets only the first one of a deploy queue the job,
+- after a new post invalidates follower feeds, for the active followers,
+  recomputing their entries.
+Users are warmed in parallel on WARM_WORKERS threads and paced by a GCRA
+limiter at WARM_RATE users per second, so warming never stampedes the
+database either.
+"""
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection
+
+from .throttling import GCRA
+from . import windows
+from .circuit import cache
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_USERS_KEY = 'warm:active-users'
+ACTIVE_USERS = 5000
+PERSIST_INTERVAL = 30
+
+WORKERS = 4
+RATE = 50
+
+# Only the first process to start within this many seconds queues the startup warm-up
+STARTUP_LOCK_KEY = 'warm:startup'
+STARTUP_LOCK_TTL = 300
+
+
+class ActiveUserTracker:
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._users = OrderedDict()
+        self._lock = Lock()
+        self._persisted_at = 0.0
+
+    @property
+    def max_size(self):
+        return self._max_size or getattr(settings, 'WARM_ACTIVE_USERS', ACTIVE_USERS)
+
+    def touch(self, user_id):
+        """Record activity; cheap enough to call on every feed request"""
+        now = time.monotonic()
+        with self._lock:
+            self._users[user_id] = None
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+            due = now - self._persisted_at >= PERSIST_INTERVAL
+            if due:
+                self._persisted_at = now
+        if due:
+            self.persist()
+
+    def local(self):
+        """Ids seen by this process, most recent first"""
+        with self._lock:
+            return list(reversed(self._users))
+
+    def persist(self):
+        """Merge this process's ids into the shared list"""
+        try:
+            stored = cache.get(ACTIVE_USERS_KEY) or []
+            merged = list(OrderedDict.fromkeys(self.local() + stored))[:self.max_size]
+            cache.set(ACTIVE_USERS_KEY, merged, timeout=None)
+        except Exception:
+            logger.warning("Could not persist active users", exc_info=True)
+
+    def recent(self, limit=None):
+        """Active ids from this process and the shared list, most recent first"""
+        try:
+            stored = cache.get(ACTIVE_USERS_KEY) or []
+        except Exception:
+            stored = []
+        return list(OrderedDict.fromkeys(self.local() + stored))[:limit or self.max_size]
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._persisted_at = 0.0
+
+
+tracker = ActiveUserTracker()
+
+
+class Pacer:
+    """Blocks callers so that, together, they proceed at most ``rate`` times per second"""
+
+    def __init__(self, rate):
+        self.gcra = GCRA(rate, 1, burst=1)
+        self._tat = None
+        self._lock = Lock()
+
+    def wait(self):
+        while True:
+            with self._lock:
+                allowed, self._tat, delay = self.gcra.update(self._tat, time.monotonic())
+            if allowed:
+                return
+            time.sleep(delay)
+
+
+def warm_user(user_id, refresh=False):
+    """Build the first block of each of a user's feeds; only missing ones unless refresh. Returns blocks built"""
+    return sum(window.warm(user_id, refresh=refresh) for window in windows.WINDOWS)
+
+
+def warm(user_ids, refresh=False, workers=None, rate=None):
+    """Warm several users in parallel, paced; returns the number of blocks built"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return 0
+    pacer = Pacer(rate or getattr(settings, 'WARM_RATE', RATE))
+    workers = workers or getattr(settings, 'WARM_WORKERS', WORKERS)
+
+    def run(user_id):
+        pacer.wait()
+        try:
+            return warm_user(user_id, refresh)
+        except Exception:
+            logger.warning("Could not warm feeds for user %s", user_id, exc_info=True)
+            return 0
+
+    if workers <= 1:
+        return sum(run(user_id) for user_id in user_ids)
+
+    def run_in_thread(user_id):
+        try:
+            return run(user_id)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(run_in_thread, user_ids))
+
+
+def warm_on_startup():
+    """Queue a warm-up of every recently active user's missing feed blocks, once per deploy"""
+    if not getattr(settings, 'WARM_FEEDS_ON_STARTUP', False):
+        return
+    from .tasks import warm_feeds
+    try:
+        if not cache.add(STARTUP_LOCK_KEY, time.time(),
+                         timeout=getattr(settings, 'WARM_STARTUP_LOCK_TTL', STARTUP_LOCK_TTL)):
+            return  # another process of this deploy queued it
+        warm_feeds.delay()
+    except Exception:
+        # e.g. the job table does not exist yet before the first migrate
+        logger.warning("Could not queue the startup feed warm-up", exc_info=True)
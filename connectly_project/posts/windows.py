@@ -0,0 +1,243 @@
+"""
+Feed pages served from fixed-size cached blocks.
+
+Caching each (page, page_size) result separately means ``page_size=10``,
+``page_size=20`` and ``page=2&page_size=5`` are all different cache entries
+for overlapping rows, so nearly every non-default client setting misses. A
+FeedWindow instead caches each user's feed in blocks of FEED_BLOCK_SIZE rows
+(block 0 = rows 0-49, block 1 = rows 50-99, ...) and slices whatever page is
+asked for out of the one to three blocks it overlaps. Blocks for all the
+requested rows are read with one ``get_many``; each missing block is one
+sliced query. Rows are stored as packed tuples rather than pickled model
+instances (posts.codec.pack_rows).
+
+Every block key carries the user's feed generation. ``invalidate`` bumps
+it, which retires all of the user's blocks (and rendered newsfeed pages) at
+once on any cache backend; the old entries simply expire. Blocks of one
+generation therefore never mix with rows from an older one.
+
+Variants (``fields``/``expand`` on the general feed) are canonicalized
+before they become part of the key, so the order they were given in does
+not matter. Hit and miss counts per window are kept in-process and shown
+on the admin dashboard and by ``manage.py feed_cache_report``.
+"""
+import hashlib
+import math
+import time
+from threading import Lock
+
+from django.conf import settings
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import models
+from rest_framework.exceptions import NotFound
+
+from . import codec
+from .circuit import cache
+from .utils import CacheHelper
+
+BLOCK_SIZE = 50
+GENERATION_KEY = 'feed-generation:user-{}'
+
+
+def current_generation(user_id):
+    """The user's current feed generation (0 when the cache is unavailable)"""
+    key = GENERATION_KEY.format(user_id)
+    try:
+        value = cache.get(key)
+        if value is None:
+            # Start from the clock, so a generation lost to eviction never reuses an old number
+            value = int(time.time() * 1000)
+            if not cache.add(key, value, timeout=None):
+                value = cache.get(key) or value
+        return value
+    except Exception:
+        return 0
+
+
+def invalidate(user_ids):
+    """Retire every cached feed block and rendered feed page of the given users"""
+    keys = {GENERATION_KEY.format(user_id): user_id for user_id in user_ids}
+    if not keys:
+        return
+    now = int(time.time() * 1000)
+    try:
+        current = cache.get_many(list(keys))
+        cache.set_many({key: max(current.get(key, 0) + 1, now) for key in keys}, timeout=None)
+    except Exception:
+        pass
+
+
+def paginate(queryset, page, page_size):
+    """Uncached page in the shape FeedWindow.page returns"""
+    paginator = Paginator(queryset, page_size)
+    try:
+        posts_page = paginator.page(page)
+    except (EmptyPage, PageNotAnInteger):
+        posts_page = paginator.page(1)
+    return {
+        'count': paginator.count,
+        'num_pages': paginator.num_pages,
+        'current_page': posts_page.number,
+        'results': list(posts_page.object_list),
+        'has_next': posts_page.has_next(),
+        'has_previous': posts_page.has_previous(),
+    }
+
+
+class FeedWindow:
+    def __init__(self, name, queryset_func):
+        self.name = name
+        self.queryset_func = queryset_func
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    @property
+    def block_size(self):
+        return getattr(settings, 'FEED_BLOCK_SIZE', BLOCK_SIZE)
+
+    def timeout(self):
+        return getattr(settings, 'CACHE_TTL', 60)
+
+    @staticmethod
+    def canonical_variant(variant):
+        return tuple(tuple(sorted(part)) if part is not None else None for part in variant)
+
+    def key(self, user_id, block, variant=(), generation=0):
+        # Same prefix as the page keys, so CacheHelper.get_key_pattern(name, user) covers blocks too
+        key = f"v{CacheHelper.VERSION}:{self.name}:user-{user_id}:gen-{generation}:block-{block}:size-{self.block_size}"
+        if any(variant):
+            key += ':' + hashlib.md5(repr(variant).encode()).hexdigest()[:12]
+        return key
+
+    def read(self, user_id, blocks, variant=(), generation=0):
+        keys = {self.key(user_id, block, variant, generation): block for block in blocks}
+        try:
+            cached = CacheHelper.get_many(list(keys))
+        except Exception:
+            return {}
+        return {keys[key]: {'rows': codec.unpack_rows(entry['rows']), 'count': entry['count']}
+                for key, entry in cached.items()}
+
+    def build(self, user, blocks, variant=(), generation=0):
+        """Query and store blocks; one COUNT plus one sliced query per block"""
+        queryset = self.queryset_func(user, *variant)
+        count = queryset.count()
+        size = self.block_size
+        built = {block: {'rows': list(queryset[block * size:(block + 1) * size]), 'count': count}
+                 for block in blocks}
+        try:
+            user_id = getattr(user, 'id', user)
+            CacheHelper.set_many({
+                self.key(user_id, block, variant, generation): {'rows': codec.pack_rows(entry['rows']), 'count': entry['count']}
+                for block, entry in built.items()
+            }, timeout=self.timeout())
+        except Exception:
+            pass
+        return built
+
+    def get_blocks(self, user, blocks, variant=(), generation=0):
+        """Return {block: {'rows': [...], 'count': n}}, building and storing the missing ones"""
+        found = self.read(getattr(user, 'id', user), blocks, variant, generation)
+        missing = [block for block in blocks if block not in found]
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            found.update(self.build(user, missing, variant, generation))
+        return found
+
+    def warm(self, user_id, blocks=(0,), variant=(), refresh=False):
+        """Build blocks ahead of requests (not counted as hits or misses); returns how many were built"""
+        current = current_generation(user_id)
+        missing = list(blocks) if refresh else [
+            b for b in blocks if b not in self.read(user_id, blocks, variant, current)
+        ]
+        if missing:
+            self.build(user_id, missing, variant, current)
+        return len(missing)
+
+    def page(self, user, page=1, page_size=10, variant=(), generation=None):
+        """
+        One page in the shape of a Paginator page. The count is read from
+        block 0 before any other block is touched, so an out-of-range page
+        (404) costs no query beyond that block and builds nothing past the end.
+        generation is the user's feed generation, when the caller already read it.
+        """
+        if generation is None:
+            generation = current_generation(getattr(user, 'id', user))
+        variant = self.canonical_variant(variant)
+        size = self.block_size
+        start = (page - 1) * page_size
+        blocks = self.get_blocks(user, [0], variant, generation)
+        count = blocks[0]['count']
+        if page > 1 and start >= count:
+            raise NotFound("Invalid page.")
+
+        end = min(start + page_size, count)
+        wanted = [block for block in range(start // size, max(end - 1, 0) // size + 1) if block not in blocks]
+        if wanted:
+            blocks.update(self.get_blocks(user, wanted, variant, generation))
+        rows = []
+        for block in range(start // size, max(end - 1, 0) // size + 1):
+            rows.extend(blocks[block]['rows'])
+        offset = start - (start // size) * size
+        num_pages = max(1, math.ceil(count / page_size))
+        return {
+            'count': count,
+            'num_pages': num_pages,
+            'current_page': page,
+            'results': rows[offset:offset + page_size],
+            'has_next': page < num_pages,
+            'has_previous': page > 1,
+        }
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+def newsfeed_queryset(user):
+    from .models import Post, Follow
+    from .counters import like_count_expression
+
+    # Get users that the current user follows
+    followed_users = Follow.objects.filter(follower=user).values_list('followed', flat=True)
+
+    # Get posts from followed users and user's own posts with optimized queries
+    return Post.objects.select_related('author').filter(
+        models.Q(author__in=followed_users) | models.Q(author=user)
+    ).order_by('-created_at', '-id').annotate(
+        like_count=like_count_expression(),
+        comment_count=models.Count('comments', distinct=True)
+    )
+
+
+def feed_queryset(user, fields=None, expand=()):
+    from .models import Post
+    from .serializers import PostSerializer
+
+    privacy_filter = models.Q(privacy='public') | models.Q(privacy='private', author=user)
+    posts = Post.objects.filter(privacy_filter).order_by('-created_at', '-id')
+    # Load only what the requested fields and expansions need (author join, like counts)
+    return PostSerializer.optimize_queryset(posts, fields, expand)
+
+
+newsfeed_window = FeedWindow('newsfeed', newsfeed_queryset)
+feed_window = FeedWindow('feed', feed_queryset)
+
+WINDOWS = (newsfeed_window, feed_window)
+
+
+def stats():
+    return {window.name: window.stats() for window in WINDOWS}
@@ -0,0 +1,197 @@
+from collections import OrderedDict
+from threading import Lock
+import copy
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from posts.circuit import cache
+
+
+class UserCache:
+    """
+    Short-TTL in-process cache of authenticated users.
+
+    Entries are keyed by user id and token version, so a token minted with a
+    newer version never sees a user cached for an older one. Entries for a user
+    are dropped whenever the user row is saved or deleted (see users.signals);
+    other worker processes pick up the change when their entry expires.
+    """
+
+    def __init__(self, ttl=None, max_size=10000):
+        self._ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'AUTH_USER_CACHE_TTL', 30)
+
+    def get(self, user_id, version=0):
+        key = (user_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, user_id, version, user):
+        key = (user_id, version)
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Drop every cached version of a user"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves users from the in-process user cache,
+    falling back to the usual database lookup on a miss.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        version = validated_token.get('role_version', 0)
+
+        user = user_cache.get(user_id, version) if user_id is not None else None
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, version, user)
+
+        # Hand out a copy so request-level changes never leak into the cache
+        return copy.copy(user)
+
+
+class RoleRevocationList:
+    """
+    Users whose role claims issued before a given role version must not be trusted.
+
+    Each user's revocation lives under its own cache key so every worker learns
+    about downgrades; a worker re-reads a user's key at most once per
+    ``refresh_interval`` seconds. Entries outlive a refresh token plus the access
+    token minted from it at the last moment, after which no token carrying the
+    old version can still be valid.
+
+    Revoking writes straight to the cache backend and raises if it fails, so a
+    downgrade is never silently dropped. A failed read counts as revoked: the
+    token falls back to the database lookup.
+    """
+    key_prefix = 'auth:role-revocation:user-'
+    refresh_interval = 5
+    write_attempts = 5
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = Lock()
+
+    @property
+    def lifetime(self):
+        return int((api_settings.REFRESH_TOKEN_LIFETIME + api_settings.ACCESS_TOKEN_LIFETIME).total_seconds())
+
+    def key(self, user_id):
+        return f'{self.key_prefix}{user_id}'
+
+    def revoke(self, user_id, min_version):
+        """Distrust role claims with a role_version below min_version"""
+        with self._lock:
+            self._merge(user_id, min_version, time.monotonic())
+
+        # Concurrent revocations of the same user may overwrite each other; every
+        # writer re-reads after its write until the highest version has stuck
+        backend = caches['default']
+        key = self.key(user_id)
+        for _ in range(self.write_attempts):
+            current = backend.get(key)
+            if current is not None and current >= min_version:
+                return
+            backend.set(key, min_version, timeout=self.lifetime)
+        raise RuntimeError(f"Could not record role revocation for user {user_id}")
+
+    def is_revoked(self, user_id, version):
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is None or now - entry[1] >= self.refresh_interval:
+            try:
+                shared = cache.get(self.key(user_id))
+            except Exception:
+                return True
+            with self._lock:
+                entry = self._merge(user_id, shared or 0, now)
+        return version < entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _merge(self, user_id, min_version, checked_at):
+        current = self._entries.get(user_id)
+        if current is not None and current[0] > min_version and checked_at - current[1] < self.refresh_interval:
+            min_version = current[0]
+        self._entries[user_id] = (min_version, checked_at)
+        return self._entries[user_id]
+
+role_revocations = RoleRevocationList()
+
+# Claims copied into the token user; everything else stays deferred
+TOKEN_USER_CLAIMS = ('username', 'role', 'role_version', 'is_superuser', 'is_staff')
+
+
+def token_user(validated_token):
+    """
+    Build a CustomUser from token claims without a query.
+
+    The instance has its primary key and role fields set and every other
+    field deferred, so it can be used as a foreign key value and in role
+    checks for free, and loads remaining fields lazily if something reads them.
+    """
+    user_model = get_user_model()
+    claims = {claim: validated_token[claim] for claim in TOKEN_USER_CLAIMS}
+    claims['id'] = validated_token[api_settings.USER_ID_CLAIM]
+    claims['is_active'] = True
+
+    # from_db expects values in concrete field order
+    names = [f.attname for f in user_model._meta.concrete_fields if f.attname in claims]
+    return user_model.from_db('default', names, [claims[name] for name in names])
+
+
+class StatelessRoleJWTAuthentication(CachedJWTAuthentication):
+    """
+    Trust the role claims embedded by RoleTokenObtainPairSerializer so that
+    authentication and role-based permission checks need no database access.
+
+    Tokens without role claims, or whose role_version has been revoked by a
+    privilege downgrade, fall back to the cached database lookup.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or any(claim not in validated_token for claim in TOKEN_USER_CLAIMS):
+            return super().get_user(validated_token)
+        if role_revocations.is_revoked(user_id, validated_token['role_version']):
+            return super().get_user(validated_token)
+        return token_user(validated_token)
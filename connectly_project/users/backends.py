@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from allauth.account.auth_backends import AuthenticationBackend
+from allauth.account.utils import filter_users_by_email, filter_users_by_username
+from . import hashing
+
+UserModel = get_user_model()
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend that verifies passwords in the hashing process pool, so
+    SessionLoginView and TokenObtainPairView don't hash on the request thread.
+    """
+    
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so response time doesn't reveal which usernames exist
+            hashing.make_password(password)
+            return None
+        if hashing.check_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+class PooledAuthenticationBackend(AuthenticationBackend):
+    """
+    allauth's backend (login by email) with the same pooled hashing, so failed
+    logins through allauth don't run Argon2 on the request thread either.
+    """
+    
+    def _authenticate_by_username(self, **credentials):
+        username = credentials.get('username')
+        password = credentials.get('password')
+        if username is None or password is None:
+            return None
+        try:
+            user = filter_users_by_username(username).get()
+        except UserModel.DoesNotExist:
+            hashing.make_password(password)
+            return None
+        if self._check_password(user, password):
+            return user
+        return None
+    
+    def _authenticate_by_email(self, time_attack_mitigation=True, **credentials):
+        email = credentials.get('email', credentials.get('username'))
+        password = credentials.get('password')
+        if not email or password is None:
+            return None
+        users = filter_users_by_email(email, prefer_verified=True)
+        for user in users:
+            if self._check_password(user, password):
+                return user
+        if not users and time_attack_mitigation:
+            hashing.make_password(password)
+        return None
+    
+    def _check_password(self, user, password):
+        if not hashing.check_user_password(user, password):
+            return False
+        if not self.user_can_authenticate(user):
+            # allauth picks this user up to show its inactive account page
+            self._stash_user(user)
+            return False
+        return True
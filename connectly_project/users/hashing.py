@@ -0,0 +1,99 @@
+"""
+Password hashing offloaded to a bounded process pool.
+
+Argon2 is deliberately expensive. Running it on request threads lets a burst of
+logins occupy every worker thread (and the GIL-free C code every core), which
+stalls unrelated feed traffic. Hashes run in a small pool of processes
+instead; PASSWORD_HASH_MAX_PENDING caps how many logins may wait for a slot,
+and callers beyond that are told to retry rather than queueing indefinitely.
+
+Set PASSWORD_HASH_POOL_SIZE = 0 to hash inline on the calling thread.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+import multiprocessing
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import APIException
+
+_pool = None
+_slots = None
+_pool_lock = Lock()
+
+class HashingBusy(APIException):
+    status_code = 503
+    default_detail = 'Too many login attempts are being processed, please retry shortly.'
+    default_code = 'hashing_busy'
+
+def _init_worker():
+    # Spawned workers start without Django configured
+    import django
+    django.setup()
+
+def _verify(password, encoded):
+    """Runs in a worker: return (is_correct, must_update)"""
+    if not hashers.check_password(password, encoded):
+        return False, False
+    return True, hashers.identify_hasher(encoded).must_update(encoded)
+
+def _get_pool():
+    global _pool, _slots
+    size = getattr(settings, 'PASSWORD_HASH_POOL_SIZE', 0)
+    if not size:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = make_pool(size)
+            _slots = BoundedSemaphore(size + getattr(settings, 'PASSWORD_HASH_MAX_PENDING', 8))
+    return _pool
+
+def _run(func, *args):
+    pool = _get_pool()
+    if pool is None:
+        return func(*args)
+    timeout = getattr(settings, 'PASSWORD_HASH_QUEUE_TIMEOUT', 2)
+    if not _slots.acquire(timeout=timeout):
+        raise HashingBusy()
+    try:
+        return pool.submit(func, *args).result()
+    finally:
+        _slots.release()
+
+def make_password(password):
+    """Hash a password with the default hasher in the pool"""
+    return _run(hashers.make_password, password)
+
+def make_pool(workers):
+    """Create a dedicated hashing pool, e.g. for an import that should use every core"""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+    )
+
+def make_passwords(passwords, chunksize=16, pool=None):
+    """Hash many passwords, using every worker of the given (or the shared) pool"""
+    pool = pool or _get_pool()
+    if pool is None:
+        return [hashers.make_password(password) for password in passwords]
+    return list(pool.map(hashers.make_password, passwords, chunksize=chunksize))
+
+def check_user_password(user, password):
+    """
+    Verify a user's password in the pool. A correct password stored with
+    outdated parameters is re-hashed and saved, like User.check_password does.
+    """
+    is_correct, must_update = _run(_verify, password, user.password)
+    if is_correct and must_update:
+        user.password = make_password(password)
+        user.save(update_fields=['password'])
+    return is_correct
+
+def shutdown():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _slots = None
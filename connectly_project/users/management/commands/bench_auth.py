@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from posts.permissions import IsAdminUser, IsRegularUser
+from users.authentication import CachedJWTAuthentication, StatelessRoleJWTAuthentication, user_cache
+from users.models import CustomUser
+from users.serializers import RoleTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = "Measure per-request authentication + role check overhead for each JWT authentication class"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="User to authenticate as (defaults to the first user)")
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = CustomUser.objects.filter(username=options['username']).first()
+        else:
+            user = CustomUser.objects.order_by('id').first()
+        if user is None:
+            raise CommandError("No user found to benchmark with")
+
+        token = RoleTokenObtainPairSerializer.get_token(user).access_token
+        request = APIRequestFactory().get('/api/posts/feed/', HTTP_AUTHORIZATION=f"Bearer {token}")
+        permissions = [IsRegularUser(), IsAdminUser()]
+        iterations = options['iterations']
+
+        self.stdout.write(f"Authenticating as {user.username} ({iterations} iterations)")
+        self.stdout.write(f"{'class':<34}{'us/request':>12}{'queries/request':>18}")
+
+        for auth_class in (JWTAuthentication, CachedJWTAuthentication, StatelessRoleJWTAuthentication):
+            user_cache.clear()
+            auth = auth_class()
+
+            def run_once():
+                request.user = auth.authenticate(request)[0]
+                for permission in permissions:
+                    permission.has_permission(request, None)
+
+            # Warm up so cached classes are measured in steady state
+            run_once()
+
+            with CaptureQueriesContext(connection) as ctx:
+                for _ in range(10):
+                    run_once()
+            queries = len(ctx.captured_queries) / 10.0
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                run_once()
+            elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                f"{auth_class.__name__:<34}{elapsed / iterations * 1e6:>12.1f}{queries:>18.1f}"
+            )
@@ -0,0 +1,69 @@
+import time
+
+from argon2.low_level import Type, hash_secret
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Measure Argon2 cost on this host and recommend ARGON2_* settings for a target ms per hash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250.0,
+                            help="Slowest acceptable time for one hash")
+        parser.add_argument('--samples', type=int, default=3, help="Hashes timed per parameter set")
+        parser.add_argument('--parallelism', type=int, default=None,
+                            help="Lanes to use (defaults to ARGON2_PARALLELISM)")
+
+    def handle(self, *args, **options):
+        target = options['target_ms']
+        samples = options['samples']
+        parallelism = options['parallelism'] or getattr(settings, 'ARGON2_PARALLELISM', 8)
+
+        hasher = get_hasher('argon2')
+        current = self.measure(hasher.time_cost, hasher.memory_cost, hasher.parallelism, samples)
+        self.stdout.write(
+            f"Current: time_cost={hasher.time_cost} memory_cost={hasher.memory_cost} "
+            f"parallelism={hasher.parallelism} -> {current:.1f} ms/hash"
+        )
+
+        self.stdout.write(f"{'time_cost':>10}{'memory_cost':>14}{'parallelism':>13}{'ms/hash':>10}")
+        best = None
+        for memory_cost in (19456, 47104, 65536, 102400, 262144):
+            for time_cost in (1, 2, 3, 4):
+                elapsed = self.measure(time_cost, memory_cost, parallelism, samples)
+                self.stdout.write(f"{time_cost:>10}{memory_cost:>14}{parallelism:>13}{elapsed:>10.1f}")
+                if elapsed > target:
+                    # Higher time costs at this memory size will only be slower
+                    break
+                # Prefer more memory (GPU resistance), then more passes
+                best = (time_cost, memory_cost, elapsed)
+
+        if best is None:
+            self.stdout.write(self.style.WARNING(
+                f"No parameter set hashes within {target:.0f} ms on this host; "
+                "consider lowering ARGON2_PARALLELISM or raising --target-ms"
+            ))
+            return
+
+        time_cost, memory_cost, elapsed = best
+        self.stdout.write(self.style.SUCCESS(
+            f"Recommended ({elapsed:.1f} ms/hash):\n"
+            f"ARGON2_TIME_COST={time_cost}\n"
+            f"ARGON2_MEMORY_COST={memory_cost}\n"
+            f"ARGON2_PARALLELISM={parallelism}"
+        ))
+        self.stdout.write("Existing hashes are upgraded automatically on each user's next login.")
+
+    def measure(self, time_cost, memory_cost, parallelism, samples):
+        """Return the median milliseconds for one hash with the given parameters"""
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            hash_secret(b'calibration-password', b'calibration-salt',
+                        time_cost=time_cost, memory_cost=memory_cost,
+                        parallelism=parallelism, hash_len=32, type=Type.ID)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_alter_customuser_groups_alter_customuser_role_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="role_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
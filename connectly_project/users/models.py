@@ -8,13 +8,53 @@ class CustomUser(AbstractUser):
         ('user', 'Regular User'),
         ('guest', 'Guest User'),
     )
+    # Higher rank means more privileges; used to detect downgrades
+    ROLE_RANK = {'guest': 0, 'user': 1, 'moderator': 2, 'admin': 3}
+
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
-    
+    # Bumped whenever privileges are reduced so older role claims in JWTs stop being trusted
+    role_version = models.PositiveIntegerField(default=0)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._remember_privileges()
+
     def __str__(self):
         return self.username
-    
+
     def is_admin(self):
         return self.role == 'admin' or self.is_superuser
-    
+
     def is_moderator(self):
         return self.role == 'moderator'
+
+    def _remember_privileges(self):
+        # Read from __dict__ so deferred fields are not loaded just to remember them
+        self._loaded_privileges = (
+            self.__dict__.get('role'),
+            self.__dict__.get('is_superuser'),
+            self.__dict__.get('is_staff'),
+            self.__dict__.get('is_active'),
+        )
+
+    def privileges_reduced(self):
+        """Return True if unsaved changes lower this user's privileges"""
+        old_role, old_superuser, old_staff, old_active = self._loaded_privileges
+        if old_role is not None and self.ROLE_RANK.get(self.role, 0) < self.ROLE_RANK.get(old_role, 0):
+            return True
+        for old, new in ((old_superuser, self.__dict__.get('is_superuser')),
+                         (old_staff, self.__dict__.get('is_staff')),
+                         (old_active, self.__dict__.get('is_active'))):
+            if old and new is False:
+                return True
+        return False
+
+    def save(self, *args, **kwargs):
+        if self.pk and self.privileges_reduced():
+            self.role_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'role_version'}
+            self._role_downgraded = True
+        super().save(*args, **kwargs)
+        self._remember_privileges()
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import CustomUser
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -66,4 +69,52 @@ class UserListSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'role']
-        read_only_fields = ['role']
\ No newline at end of file
+        read_only_fields = ['role']
+
+def add_role_claims(token, user):
+    """Embed the user's current role claims in a token"""
+    token['username'] = user.username
+    token['role'] = user.role
+    token['role_version'] = user.role_version
+    token['is_superuser'] = user.is_superuser
+    token['is_staff'] = user.is_staff
+    return token
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """JWT pair serializer that embeds role claims for stateless permission checks"""
+    
+    @classmethod
+    def get_token(cls, user):
+        return add_role_claims(super().get_token(user), user)
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh serializer that reads role claims from the database instead of
+    copying them from the refresh token, so a downgrade made after login is
+    never carried into a new access token.
+    """
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = CustomUser.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        
+        data = {'access': str(add_role_claims(refresh.access_token, user))}
+        
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The blacklist app is not installed
+                    pass
+            add_role_claims(refresh, user)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        
+        return data
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import CustomUser
+from .authentication import user_cache, role_revocations
+
+# Larger than any role_version a real token can carry
+ALL_VERSIONS = 2 ** 31
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the cached auth user when the row changes or disappears"""
+    user_cache.invalidate(instance.pk)
+
+@receiver(post_save, sender=CustomUser)
+def revoke_downgraded_role_claims(sender, instance, **kwargs):
+    """Stop trusting role claims minted before a privilege downgrade"""
+    if getattr(instance, '_role_downgraded', False):
+        role_revocations.revoke(instance.pk, instance.role_version)
+        instance._role_downgraded = False
+
+@receiver(post_delete, sender=CustomUser)
+def revoke_deleted_user_claims(sender, instance, **kwargs):
+    """Tokens of deleted users must go back to the database (and fail there)"""
+    role_revocations.revoke(instance.pk, ALL_VERSIONS)
@@ -1,3 +1,148 @@
-from django.test import TestCase
+from unittest import mock
+from django.contrib.auth import authenticate
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from posts.circuit import cache
+from .models import CustomUser
+from .authentication import (
+    CachedJWTAuthentication, StatelessRoleJWTAuthentication, user_cache, role_revocations
+)
+from .serializers import RoleTokenObtainPairSerializer, RoleTokenRefreshSerializer
 
-# Create your tests here.
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username="cached", password="password", role="user"
+        )
+        self.factory = APIRequestFactory()
+        self.auth = CachedJWTAuthentication()
+        token = AccessToken.for_user(self.user)
+        self.header = f"Bearer {token}"
+    
+    def authenticate(self):
+        request = self.factory.get("/api/auth/me/", HTTP_AUTHORIZATION=self.header)
+        return self.auth.authenticate(request)[0]
+    
+    def test_second_request_skips_user_query(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+    
+    def test_role_change_invalidates_cache(self):
+        self.authenticate()
+        self.user.role = "admin"
+        self.user.save()
+        with self.assertNumQueries(1):
+            user = self.authenticate()
+        self.assertEqual(user.role, "admin")
+    
+    def test_deleted_user_is_not_served_from_cache(self):
+        self.authenticate()
+        self.user.delete()
+        with self.assertRaises(Exception):
+            self.authenticate()
+
+class StatelessRoleClaimTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        role_revocations.clear()
+        self.user = CustomUser.objects.create_user(
+            username="moderator", password="password", role="moderator"
+        )
+        self.factory = APIRequestFactory()
+        self.auth = StatelessRoleJWTAuthentication()
+        token = RoleTokenObtainPairSerializer.get_token(self.user).access_token
+        self.header = f"Bearer {token}"
+    
+    def authenticate(self):
+        request = self.factory.get("/api/auth/me/", HTTP_AUTHORIZATION=self.header)
+        return self.auth.authenticate(request)[0]
+    
+    def test_role_claims_need_no_query(self):
+        # The first request refreshes the shared revocation list
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual(user.role, "moderator")
+            self.assertFalse(user.is_admin())
+        self.assertEqual(user.pk, self.user.pk)
+    
+    def test_downgrade_revokes_role_claims(self):
+        self.user.role = "user"
+        self.user.save()
+        self.assertEqual(self.user.role_version, 1)
+        user = self.authenticate()
+        self.assertEqual(user.role, "user")
+    
+    def test_upgrade_keeps_role_claims(self):
+        self.user.role = "admin"
+        self.user.save()
+        self.assertEqual(self.user.role_version, 0)
+    
+    def test_refresh_after_downgrade_reads_role_from_database(self):
+        refresh = RoleTokenObtainPairSerializer.get_token(self.user)
+        self.user.role = "user"
+        self.user.save()
+        # Revocations from this worker are long gone, as after a restart
+        role_revocations.clear()
+        cache.clear()
+        
+        serializer = RoleTokenRefreshSerializer(data={"refresh": str(refresh)})
+        self.assertTrue(serializer.is_valid())
+        self.header = f"Bearer {serializer.validated_data['access']}"
+        user = self.authenticate()
+        self.assertEqual(user.role, "user")
+        self.assertEqual(user.role_version, 1)
+    
+    def test_revocations_outlive_refresh_tokens(self):
+        self.assertGreaterEqual(
+            role_revocations.lifetime, api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        )
+    
+    def test_revocations_of_different_users_are_kept(self):
+        other = CustomUser.objects.create_user(username="other", password="password", role="admin")
+        role_revocations.revoke(self.user.pk, 1)
+        role_revocations.revoke(other.pk, 3)
+        role_revocations.clear()
+        self.assertTrue(role_revocations.is_revoked(self.user.pk, 0))
+        self.assertTrue(role_revocations.is_revoked(other.pk, 2))
+        self.assertFalse(role_revocations.is_revoked(other.pk, 3))
+    
+    def test_failed_revocation_is_not_swallowed(self):
+        with mock.patch("django.core.cache.backends.db.DatabaseCache.set", side_effect=OSError("down")):
+            with self.assertRaises(OSError):
+                role_revocations.revoke(self.user.pk, 1)
+    
+    def test_unreadable_revocations_fall_back_to_database(self):
+        with mock.patch("django.core.cache.backends.db.DatabaseCache.get", side_effect=OSError("down")):
+            with self.assertNumQueries(1):
+                user = self.authenticate()
+        self.assertEqual(user.role, "moderator")
+
+@override_settings(
+    PASSWORD_HASH_POOL_SIZE=0, ARGON2_TIME_COST=1, ARGON2_MEMORY_COST=1024, ARGON2_PARALLELISM=1
+)
+class PasswordHashUpgradeTests(TestCase):
+    def test_login_upgrades_outdated_hash(self):
+        user = CustomUser.objects.create_user(username="hashed", password="Sup3rSecret!")
+        self.assertIn("t=1", user.password)
+        
+        with self.settings(ARGON2_TIME_COST=2):
+            self.assertEqual(authenticate(username="hashed", password="Sup3rSecret!"), user)
+            user.refresh_from_db()
+            self.assertIn("t=2", user.password)
+            self.assertIsNone(authenticate(username="hashed", password="wrong"))
+    
+    def test_email_login_hashes_in_the_pool(self):
+        user = CustomUser.objects.create_user(username="mailed", email="mailed@example.com", password="Sup3rSecret!")
+        inline = "django.contrib.auth.base_user.AbstractBaseUser.%s"
+        with mock.patch(inline % "check_password", side_effect=AssertionError("hashed inline")), \
+                mock.patch(inline % "set_password", side_effect=AssertionError("hashed inline")):
+            self.assertEqual(authenticate(email="mailed@example.com", password="Sup3rSecret!"), user)
+            self.assertIsNone(authenticate(email="mailed@example.com", password="wrong"))
+            self.assertIsNone(authenticate(email="nobody@example.com", password="wrong"))
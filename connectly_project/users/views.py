@@ -2,10 +2,13 @@ from django.shortcuts import render, get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+from posts.throttling import AuthTokenBucketThrottle
+from posts.pagination import EstimatedCountPagination
+from posts.object_cache import user_objects
 from django.contrib.auth import authenticate, login, logout
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -21,25 +24,10 @@ from .serializers import (
     UserListSerializer
 )
 
-class AuthRateThrottle(AnonRateThrottle):
+class AuthRateThrottle(AuthTokenBucketThrottle):
     scope = 'auth'
     rate = '5/minute'
 
-class StandardResultsPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-    
-    def get_paginated_response(self, data):
-        return Response(OrderedDict([
-            ('count', self.page.paginator.count),
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('current_page', self.page.number),
-            ('total_pages', self.page.paginator.num_pages),
-            ('results', data)
-        ]))
-
 @method_decorator(csrf_exempt, name='dispatch')
 class RegisterView(APIView):
     """
@@ -131,9 +119,10 @@ class UserProfileView(APIView):
         }
     )
     def get(self, request, user_id):
-        user = get_object_or_404(CustomUser, id=user_id)
-        serializer = UserDetailSerializer(user)
-        return Response(serializer.data)
+        user = user_objects.get(user_id)
+        if user is None:
+            raise NotFound("No CustomUser matches the given query.")
+        return Response(user)
     
     @swagger_auto_schema(
         request_body=UserUpdateSerializer,
@@ -193,8 +182,10 @@ class CurrentUserView(APIView):
         }
     )
     def get(self, request):
-        serializer = UserDetailSerializer(request.user)
-        return Response(serializer.data)
+        user = user_objects.get(request.user.id)
+        if user is None:
+            user = UserDetailSerializer(request.user).data
+        return Response(user)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class UserListView(APIView):
@@ -202,7 +193,7 @@ class UserListView(APIView):
     API endpoint for listing all users
     """
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsPagination
+    pagination_class = EstimatedCountPagination
     
     @swagger_auto_schema(
         operation_description="List all users",
@@ -212,6 +203,7 @@ class UserListView(APIView):
         manual_parameters=[
             openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
             openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of results per page", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('exact', openapi.IN_QUERY, description="Set to false to omit count and total_pages", type=openapi.TYPE_BOOLEAN),
         ]
     )
     def get(self, request):